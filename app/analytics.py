@@ -0,0 +1,109 @@
+"""Análise colunar das vendas com pandas.
+
+``load_frame`` lê as vendas filtradas direto da consulta de ``sales_query``,
+só com as colunas usadas e com tipos definidos (categorias para forma de
+pagamento, inteiros para centavos, datas com fuso). ``kpis`` agrupa por dia,
+operador, forma de pagamento e produto com operações vetorizadas;
+``kpi_tables`` os entrega prontos para a seção "Análise" do relatório avançado.
+``to_parquet`` grava o mesmo frame para o financeiro abrir no próprio ferramental.
+"""
+from collections.abc import Callable
+from typing import IO, Any
+
+import pandas as pd
+from sqlalchemy import exists
+from sqlmodel import Session, col
+
+from app.models import CashSession, PaymentMethodEnum, Sale, SaleCancellation
+from app.report_cache import cached
+from app.sales_query import SaleFilters, has_open_session, sales_query
+from app.users import user_names
+from app.utils import BRT_TZNAME, format_date_br, payment_label
+
+COLUNAS = ["id", "created_at", "data", "product_code", "amount_cents", "payment_method", "operator_id", "cancelada"]
+_FORMAS = pd.CategoricalDtype([forma.value for forma in PaymentMethodEnum])
+
+
+def frame_query(filtros: SaleFilters) -> Any:
+    """Consulta das vendas com a data do caixa e a marca de cancelamento, em ``COLUNAS``."""
+    return sales_query(
+        filtros,
+        Sale.id,
+        Sale.created_at,
+        CashSession.data,
+        Sale.product_code,
+        Sale.amount_cents,
+        Sale.payment_method,
+        Sale.operator_id,
+        exists().where(col(SaleCancellation.sale_id) == Sale.id).label("cancelada"),
+    ).join(CashSession, CashSession.id == Sale.cash_session_id)
+
+
+def load_frame(session: Session, filtros: SaleFilters) -> pd.DataFrame:
+    """Vendas filtradas como DataFrame tipado (uma linha por venda)."""
+    frame = pd.read_sql(frame_query(filtros), session.connection())
+    criado_em = pd.to_datetime(frame["created_at"])
+    if criado_em.dt.tz is None:
+        criado_em = criado_em.dt.tz_localize("UTC")  # gravado em UTC sem fuso
+    return frame[COLUNAS].assign(
+        id=frame["id"].astype("int64"),
+        created_at=criado_em.dt.tz_convert(BRT_TZNAME),
+        data=pd.to_datetime(frame["data"]),
+        product_code=frame["product_code"].astype("string"),
+        amount_cents=frame["amount_cents"].astype("int64"),
+        payment_method=frame["payment_method"].map(lambda forma: getattr(forma, "value", forma)).astype(_FORMAS),
+        operator_id=frame["operator_id"].astype("int32"),
+        cancelada=frame["cancelada"].astype("bool"),
+    )
+
+
+def _resumo(frame: pd.DataFrame, chave: str) -> pd.DataFrame:
+    grupos = frame.groupby(chave, observed=True)["amount_cents"].agg(qtd="count", total_cents="sum")
+    grupos["ticket_medio_cents"] = (grupos["total_cents"] // grupos["qtd"]).astype("int64")
+    return grupos.sort_values("total_cents", ascending=False)
+
+
+def kpis(frame: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """KPIs sem as canceladas: totais por dia, operador, forma de pagamento e produto."""
+    validas = frame[~frame["cancelada"]]
+    return {
+        "por_dia": _resumo(validas, "data").sort_index(),
+        "por_operador": _resumo(validas, "operator_id"),
+        "por_forma": _resumo(validas, "payment_method"),
+        "por_produto": _resumo(validas, "product_code"),
+    }
+
+
+# Linhas por tabela na seção "Análise" (dias, operadores e produtos com maior total)
+KPI_LINHAS = 10
+
+KpiLinha = tuple[str, int, int, int]  # rótulo, vendas, total e ticket médio (centavos)
+
+
+def kpi_tables(session: Session, filtros: SaleFilters, limite: int = KPI_LINHAS) -> dict[str, list[KpiLinha]]:
+    """``kpis`` do período com rótulos legíveis, pelo cache de relatórios."""
+
+    def calcular() -> dict[str, list[KpiLinha]]:
+        resultado = kpis(load_frame(session, filtros))
+        resultado["por_dia"] = resultado["por_dia"].sort_values("total_cents", ascending=False)
+        nomes = user_names(session, [int(operador) for operador in resultado["por_operador"].index])
+        rotulos: dict[str, Callable[[Any], str]] = {
+            "por_dia": lambda dia: format_date_br(dia.date()),
+            "por_operador": lambda operador: nomes.get(int(operador), f"#{operador}"),
+            "por_forma": payment_label,
+            "por_produto": str,
+        }
+        return {
+            nome: [
+                (rotulos[nome](chave), int(linha.qtd), int(linha.total_cents), int(linha.ticket_medio_cents))
+                for chave, linha in resultado[nome].head(limite).iterrows()
+            ]
+            for nome in rotulos
+        }
+
+    return cached(session, "kpis", (filtros, limite), not has_open_session(session, filtros), calcular)
+
+
+def to_parquet(frame: pd.DataFrame, destino: str | IO[bytes]) -> None:
+    """Grava o frame em Parquet (pyarrow, compressão zstd), preservando os tipos."""
+    frame.to_parquet(destino, engine="pyarrow", compression="zstd", index=False)
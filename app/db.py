@@ -1,34 +1,131 @@
 import os
+from collections.abc import Callable
+from typing import Any, Concatenate, ParamSpec, TypeVar
 
-from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession as _AsyncSession
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pdv.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+from app.sqlite_profile import install_sqlite_profile
+
+
+def normalize_url(url: str) -> str:
+    """PostgreSQL usa o driver psycopg (3), que atende tanto a engine síncrona quanto a assíncrona."""
+    for prefixo in ("postgres://", "postgresql://"):
+        if url.startswith(prefixo):
+            return "postgresql+psycopg://" + url[len(prefixo):]
+    return url
+
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class AsyncSession(_AsyncSession):
+    """``AsyncSession`` do SQLModel com ``run_sync`` tipado para as funções que recebem a ``Session`` do SQLModel.
+
+    A sessão síncrona por baixo já é a do SQLModel; só a anotação herdada do
+    SQLAlchemy é que exige ``Callable[[sqlalchemy.orm.Session], ...]``.
+    """
+
+    async def run_sync(self, fn: Callable[Concatenate[Session, P], T], *args: P.args, **kwargs: P.kwargs) -> T:
+        return await super().run_sync(fn, *args, **kwargs)  # type: ignore[arg-type]
+
+
+def upsert_insert(session: Session, tabela: Any) -> postgresql.Insert | sqlite.Insert:
+    """``INSERT`` do dialeto da sessão, que aceita ``on_conflict_do_update`` (PostgreSQL e SQLite)."""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(tabela)
+    return sqlite.insert(tabela)
+
+
+DATABASE_URL = normalize_url(os.getenv("DATABASE_URL", "sqlite:///./pdv.db"))
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _engine_kwargs(url: str) -> dict[str, Any]:
+    """Argumentos de engine por dialeto; pool por processo via DB_POOL_SIZE, DB_MAX_OVERFLOW e DB_POOL_TIMEOUT."""
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return {}  # banco em memória usa pool de conexão única
+    kwargs: dict[str, Any] = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    if not url.startswith("sqlite"):
+        # Servidor remoto: descarta conexões derrubadas (restart do banco, failover, timeout de rede)
+        kwargs["pool_pre_ping"] = True
+        kwargs["pool_recycle"] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    return kwargs
+
+
+def _async_url(url: str) -> str:
+    """Troca o driver síncrono pelo equivalente assíncrono (sqlite -> aiosqlite)."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **_engine_kwargs(DATABASE_URL),
+)
+
+ASYNC_DATABASE_URL = normalize_url(os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL)))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+
+if IS_SQLITE:
+    install_sqlite_profile(engine)
+    install_sqlite_profile(async_engine.sync_engine)
 
 
 def get_session():
+    """Sessão síncrona: só para rotas ``def`` (executadas no threadpool) e scripts."""
     with Session(engine) as session:
         yield session
 
 
-def init_db():
+async def get_async_session():
+    """Sessão assíncrona usada pelas rotas ``async def``.
+
+    ``expire_on_commit=False`` evita recarregar atributos preguiçosamente depois do
+    commit (o que exigiria I/O síncrono ao renderizar o template).
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def init_db() -> list[str]:
+    """Cria o esquema e, com MIGRATE_ON_STARTUP (padrão), aplica as migrações pendentes.
+
+    Retorna as migrações aplicadas (ou, com a opção desligada, as pendentes).
+    """
     from app import models  # noqa: F401
-    SQLModel.metadata.create_all(engine)
+    from app.migrations import MIGRATE_ON_STARTUP, pending_migrations, run_migrations
+    if MIGRATE_ON_STARTUP:
+        return run_migrations(engine)
+    return [f"{versao:04d}_{nome} (pendente)" for versao, nome in pending_migrations(engine)]
 
 
 def create_default_admin():
-    from passlib.hash import pbkdf2_sha256
-
     from app.models import RoleEnum, User
+    from app.passwords import hash_password_sync
     with Session(engine) as session:
         admin = session.exec(select(User).where(User.username == "admin")).first()
         if not admin:
             admin = User(
                 username="admin",
                 full_name="Administrador",
-                password_hash=pbkdf2_sha256.hash("admin123"),
+                password_hash=hash_password_sync("admin123"),
                 role=RoleEnum.admin,
                 active=True,
             )
             session.add(admin)
-            session.commit()
+            try:
+                session.commit()
+            except IntegrityError:
+                # Outra réplica criou o admin ao mesmo tempo
+                session.rollback()
@@ -2,17 +2,22 @@ import secrets
 from typing import Optional
 
 from fastapi import Depends, HTTPException, Request, status
-from sqlmodel import Session, select
+from sqlmodel import select
 
-from app.db import get_session
+from app.db import AsyncSession, get_async_session
 from app.models import User
+from app.users import cache_user, get_cached_user
 
 
-def get_current_user(request: Request, session: Session = Depends(get_session)) -> Optional[User]:
+async def get_current_user(request: Request, session: AsyncSession = Depends(get_async_session)) -> Optional[User]:
     user_id = request.session.get("user_id")
     if not user_id:
         return None
-    user = session.exec(select(User).where(User.id == user_id)).first()
+    user = get_cached_user(user_id)
+    if user is None:
+        user = (await session.exec(select(User).where(User.id == user_id))).first()
+        if user is not None:
+            user = cache_user(user)
     return user
 
 
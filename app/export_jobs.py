@@ -0,0 +1,188 @@
+"""Exportações pesadas em segundo plano, com arquivos guardados em disco.
+
+``submit_export`` grava os metadados do job (JSON) em ``EXPORT_DIR`` e gera o
+arquivo num pool de threads próprio (``EXPORT_WORKERS``), fora das threads das
+rotas. A página consulta o progresso e baixa o arquivo quando pronto. Como os
+metadados ficam no disco, qualquer worker que compartilhe o diretório responde
+pelo job.
+
+Quando o período só tem caixas fechados (e já passou), o conteúdo não muda mais:
+o id do job é derivado dos filtros e da versão das vendas de caixas fechados
+(``data_stamp``), então um pedido igual reaproveita o arquivo existente mesmo
+com vendas acontecendo no caixa do dia. Cancelar ou excluir uma venda de caixa
+fechado, ou fechar um caixa, incrementa essa versão e, com ela, muda o id. Um job que
+ficou na fila ou gerando sem atualização por ``EXPORT_STALE_MINUTES`` (worker
+reiniciado no meio) é refeito. Arquivos e metadados são apagados depois de
+``EXPORT_RETENTION_HOURS``.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from sqlmodel import Session
+
+from app.db import engine
+from app.exports import csv_chunks, parquet_file, pdf_file
+from app.report_cache import data_stamp
+from app.sales_query import SaleFilters, aggregate, has_open_session
+from app.utils import today_brt
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", Path(tempfile.gettempdir()) / "pdv-exports"))
+EXPORT_RETENTION_HOURS = float(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+EXPORT_STALE_MINUTES = float(os.getenv("EXPORT_STALE_MINUTES", "15"))
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("EXPORT_WORKERS", "1")), thread_name_prefix="export")
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "pdf": "application/pdf",
+    "parquet": "application/vnd.apache.parquet",
+}
+_ID_VALIDO = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _metadata_path(job_id: str) -> Path:
+    return EXPORT_DIR / f"{job_id}.json"
+
+
+def artifact_path(job: dict[str, Any]) -> Path:
+    return EXPORT_DIR / f"{job['id']}.{job['formato']}"
+
+
+def _salvar(job: dict[str, Any]) -> None:
+    # Escreve num temporário e renomeia: quem consulta nunca lê um JSON pela metade
+    destino = _metadata_path(job["id"])
+    parcial = destino.with_suffix(".json.tmp")
+    parcial.write_text(json.dumps(job), encoding="utf-8")
+    parcial.replace(destino)
+
+
+def get_job(job_id: str) -> dict[str, Any] | None:
+    """Metadados do job, ou None se o id é inválido, desconhecido ou expirou."""
+    if not _ID_VALIDO.match(job_id):
+        return None
+    try:
+        return dict(json.loads(_metadata_path(job_id).read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        return None
+
+
+def _imutavel(session: Session, filtros: SaleFilters) -> bool:
+    """Período encerrado e sem caixa aberto: o conteúdo da exportação não muda mais."""
+    return filtros.fim < today_brt() and not has_open_session(session, filtros)
+
+
+def _chave(formato: str, filtros: SaleFilters, versoes: tuple[int, ...]) -> str:
+    partes = [formato, filtros.inicio, filtros.fim, filtros.operador_id, filtros.forma, filtros.status_caixa,
+              filtros.cancelamento, *versoes]
+    return hashlib.sha256(repr(partes).encode("utf-8")).hexdigest()[:32]
+
+
+def _abandonado(job: dict[str, Any], agora: float | None = None) -> bool:
+    """Job na fila ou gerando sem atualização recente (metadados nem arquivo parcial)."""
+    if job["status"] not in ("na_fila", "gerando"):
+        return False
+    destino = artifact_path(job)
+    atualizado = 0.0
+    for caminho in (_metadata_path(job["id"]), destino.with_suffix(destino.suffix + ".part")):
+        try:
+            atualizado = max(atualizado, caminho.stat().st_mtime)
+        except OSError:
+            continue
+    return (agora or time.time()) - atualizado > EXPORT_STALE_MINUTES * 60
+
+
+def _reaproveitavel(job: dict[str, Any]) -> bool:
+    if job["status"] == "erro" or _abandonado(job):
+        return False
+    return job["status"] != "pronto" or artifact_path(job).exists()
+
+
+def submit_export(formato: str, filtros: SaleFilters, usuario_id: int | None = None) -> dict[str, Any]:
+    """Agenda a exportação (ou devolve o job reaproveitável já existente)."""
+    if formato not in FORMATOS:
+        raise ValueError(f"formato inválido: {formato}")
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    cleanup_expired()
+    with Session(engine) as session:
+        reutilizavel = _imutavel(session, filtros)
+        job_id = _chave(formato, filtros, data_stamp(session, True)) if reutilizavel else uuid.uuid4().hex
+        total = sum(qtd for qtd, _total in aggregate(session, filtros).values())
+    if reutilizavel:
+        existente = get_job(job_id)
+        if existente is not None and _reaproveitavel(existente):
+            return existente
+    job = {
+        "id": job_id,
+        "formato": formato,
+        "status": "na_fila",
+        "linhas": 0,
+        "total": total,
+        "reutilizavel": reutilizavel,
+        "usuario_id": usuario_id,
+        "nome": f"relatorio_{filtros.inicio}_a_{filtros.fim}.{formato}",
+        "criado_em": datetime.now(timezone.utc).isoformat(),
+        "concluido_em": None,
+        "tamanho": None,
+        "erro": None,
+    }
+    _salvar(job)
+    _executor.submit(_executar, job, filtros)
+    return job
+
+
+def _executar(job: dict[str, Any], filtros: SaleFilters) -> None:
+    job["status"] = "gerando"
+    _salvar(job)
+
+    def progresso(linhas: int) -> None:
+        job["linhas"] = linhas
+        _salvar(job)
+
+    destino = artifact_path(job)
+    parcial = destino.with_suffix(destino.suffix + ".part")
+    try:
+        with parcial.open("wb") as arquivo:
+            if job["formato"] == "csv":
+                for bloco in csv_chunks(filtros, progresso=progresso):
+                    arquivo.write(bloco)
+            elif job["formato"] == "pdf":
+                pdf_file(filtros, progresso=progresso, arquivo=arquivo)
+            else:
+                parquet_file(filtros, arquivo=arquivo)
+        parcial.replace(destino)
+    except Exception as exc:  # registra no job; a página mostra o erro
+        parcial.unlink(missing_ok=True)
+        job.update(status="erro", erro=str(exc))
+        _salvar(job)
+        return
+    job.update(
+        status="pronto",
+        linhas=job["total"],
+        tamanho=destino.stat().st_size,
+        concluido_em=datetime.now(timezone.utc).isoformat(),
+    )
+    _salvar(job)
+
+
+def cleanup_expired(agora: float | None = None) -> int:
+    """Apaga arquivos e metadados mais antigos que a retenção; retorna quantos removeu."""
+    if not EXPORT_DIR.exists():
+        return 0
+    limite = (agora or time.time()) - EXPORT_RETENTION_HOURS * 3600
+    removidos = 0
+    for caminho in EXPORT_DIR.iterdir():
+        try:
+            if caminho.stat().st_mtime < limite:
+                caminho.unlink()
+                removidos += 1
+        except OSError:
+            continue  # removido por outro worker
+    return removidos
@@ -0,0 +1,240 @@
+"""Geração de exportações de vendas em fluxo, com memória constante.
+
+As vendas são lidas com ``yield_per`` (cursor do lado do servidor no PostgreSQL)
+e cada bloco de linhas é codificado e entregue assim que fica pronto, então uma
+exportação de um ano ocupa a mesma memória que a de um dia. Os geradores abrem a
+própria sessão porque continuam rodando depois que a rota retornou.
+
+O PDF é desenhado página a página (uma tabela de tamanho fixo por página, então
+o layout não fica mais caro com o período). O ``Canvas`` do reportlab guarda as
+páginas prontas até ``save()`` (cerca de 13 KB cada) e grava o documento num
+arquivo temporário, que só vai para o disco acima de ``EXPORT_SPOOL_MAX_BYTES``
+e depois é enviado em blocos: memória e tempo crescem linearmente com o número
+de vendas.
+"""
+import csv
+import io
+import os
+import tempfile
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date
+from typing import IO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+from sqlmodel import Session
+
+from app.analytics import load_frame, to_parquet
+from app.db import engine
+from app.models import Sale
+from app.sales_query import SaleFilters, aggregate, sales_query
+from app.totals import CHAVES_TOTAIS
+from app.utils import brt_date, cents_to_reais, format_brt, format_date_br, payment_label
+
+# Linhas lidas por ida ao banco e escritas por bloco de saída
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+# Linhas de tabela por página do PDF (vendas + subtotais do dia)
+PDF_ROWS_PER_PAGE = int(os.getenv("PDF_ROWS_PER_PAGE", "40"))
+# Tamanho até o qual o PDF ou o Parquet fica em memória antes de ir para um arquivo temporário
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+# Comprime com gzip quando o cliente aceita (Accept-Encoding)
+GZIP = os.getenv("EXPORT_GZIP", "1").lower() in ("1", "true", "yes")
+
+Progresso = Callable[[int], None]
+
+CSV_HEADER = ["ID", "Data/Hora", "Código Produto", "Valor", "Forma Pagamento", "Operador ID"]
+_COLUNAS = (Sale.id, Sale.created_at, Sale.product_code, Sale.amount_cents, Sale.payment_method, Sale.operator_id)
+
+
+def iter_sales(
+    filtros: SaleFilters, linhas_por_bloco: int = CHUNK_ROWS, progresso: Progresso | None = None
+) -> Iterator[tuple]:
+    """Linhas (id, created_at, produto, centavos, forma, operador) em ordem, sem carregar tudo.
+
+    ``progresso`` recebe o número de linhas lidas a cada bloco.
+    """
+    with Session(engine) as session:
+        query = sales_query(filtros, *_COLUNAS).execution_options(yield_per=linhas_por_bloco)
+        for lidas, linha in enumerate(session.exec(query), start=1):
+            yield linha
+            if progresso is not None and lidas % linhas_por_bloco == 0:
+                progresso(lidas)
+
+
+def csv_chunks(
+    filtros: SaleFilters, linhas_por_bloco: int = CHUNK_ROWS, progresso: Progresso | None = None
+) -> Iterator[bytes]:
+    """CSV em blocos de ``linhas_por_bloco`` linhas, codificados em UTF-8."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    pendentes = 0
+    for venda_id, criado_em, produto, centavos, forma, operador_id in iter_sales(filtros, linhas_por_bloco, progresso):
+        writer.writerow([
+            venda_id,
+            format_brt(criado_em),
+            produto,
+            f"{cents_to_reais(centavos):.2f}",
+            payment_label(forma),
+            operador_id,
+        ])
+        pendentes += 1
+        if pendentes >= linhas_por_bloco:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(blocos: Iterable[bytes]) -> Iterator[bytes]:
+    """Comprime um fluxo de blocos em formato gzip sem juntar o conteúdo."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+    for bloco in blocos:
+        # SYNC_FLUSH entrega cada bloco já comprimido, sem esperar o fim do arquivo
+        yield compressor.compress(bloco) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    return GZIP and "gzip" in (accept_encoding or "").lower()
+
+
+def parquet_file(filtros: SaleFilters, arquivo: IO[bytes] | None = None) -> IO[bytes]:
+    """Vendas filtradas em Parquet, com os tipos do frame de ``app.analytics``."""
+    if arquivo is None:
+        arquivo = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    with Session(engine) as session:
+        to_parquet(load_frame(session, filtros), arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def file_chunks(arquivo: IO[bytes], tamanho: int = 64 * 1024) -> Iterator[bytes]:
+    """Lê o arquivo em blocos para ``StreamingResponse`` e o fecha no fim."""
+    try:
+        arquivo.seek(0)
+        while bloco := arquivo.read(tamanho):
+            yield bloco
+    finally:
+        arquivo.close()
+
+
+_ESTILO_TABELA = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("ALIGN", (3, 0), (3, -1), "RIGHT"),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+]
+_CABECALHO_PDF = ["ID", "Data/Hora", "Produto", "Valor", "Pagamento"]
+_LARGURAS = [2 * cm, 4 * cm, 5 * cm, 3 * cm, 3 * cm]
+
+
+class _PdfPages:
+    """Desenha as páginas do relatório uma a uma, cada uma com uma tabela de tamanho fixo.
+
+    O ``Canvas`` mantém as páginas prontas em memória até ``save()``.
+    """
+
+    def __init__(self, arquivo: IO[bytes], titulo: str) -> None:
+        self.pdf = canvas.Canvas(arquivo, pagesize=A4, pageCompression=1)
+        self.titulo = titulo
+        self.largura, self.altura = A4
+        self.pagina = 0
+
+    def _cabecalho(self) -> float:
+        self.pagina += 1
+        self.pdf.setFont("Helvetica-Bold", 12)
+        self.pdf.drawString(2 * cm, self.altura - 2 * cm, self.titulo)
+        self.pdf.setFont("Helvetica", 8)
+        self.pdf.drawRightString(self.largura - 2 * cm, self.altura - 2 * cm, f"Página {self.pagina}")
+        return float(self.altura - 2.8 * cm)
+
+    def table(self, linhas: list[list[str]], destaques: list[int], larguras: list[float] | None = None) -> None:
+        """Uma página com a tabela ``linhas`` (a primeira é o cabeçalho); ``destaques`` em negrito."""
+        topo = self._cabecalho()
+        estilo = list(_ESTILO_TABELA)
+        for i in destaques:
+            estilo.append(("FONTNAME", (0, i), (-1, i), "Helvetica-Bold"))
+            estilo.append(("BACKGROUND", (0, i), (-1, i), colors.lightgrey))
+        tabela = Table(linhas, colWidths=larguras or _LARGURAS)
+        tabela.setStyle(TableStyle(estilo))
+        _largura, altura = tabela.wrapOn(self.pdf, self.largura - 4 * cm, topo)
+        tabela.drawOn(self.pdf, 2 * cm, topo - altura)
+        self.pdf.showPage()
+
+    def save(self) -> None:
+        self.pdf.save()
+
+
+def _summary_rows(filtros: SaleFilters) -> list[list[str]]:
+    with Session(engine) as session:
+        agregados = aggregate(session, filtros)
+    linhas = [["Forma de pagamento", "Vendas", "Total"]]
+    for forma in CHAVES_TOTAIS:
+        qtd, total = agregados.get(forma, (0, 0))
+        linhas.append([payment_label(forma), str(qtd), f"R$ {cents_to_reais(total):.2f}"])
+    qtd_geral = sum(qtd for qtd, _total in agregados.values())
+    total_geral = sum(total for _qtd, total in agregados.values())
+    linhas.append(["Total geral", str(qtd_geral), f"R$ {cents_to_reais(total_geral):.2f}"])
+    return linhas
+
+
+def _pdf_rows(filtros: SaleFilters, progresso: Progresso | None = None) -> Iterator[tuple[list[str], bool]]:
+    """Linhas da listagem: vendas e, a cada troca de dia, o subtotal do dia (destacado)."""
+    dia: date | None = None
+    qtd = total = 0
+
+    def subtotal() -> tuple[list[str], bool]:
+        return ["", f"Subtotal {format_date_br(dia)}", f"{qtd} venda(s)", f"R$ {cents_to_reais(total):.2f}", ""], True
+
+    for venda_id, criado_em, produto, centavos, forma, _operador_id in iter_sales(filtros, progresso=progresso):
+        dia_venda = brt_date(criado_em)
+        if dia is not None and dia_venda != dia:
+            yield subtotal()
+            qtd = total = 0
+        dia = dia_venda
+        qtd += 1
+        total += centavos
+        yield [str(venda_id), format_brt(criado_em), produto[:25], f"R$ {cents_to_reais(centavos):.2f}", payment_label(forma)], False
+    if dia is not None:
+        yield subtotal()
+
+
+def pdf_file(
+    filtros: SaleFilters,
+    linhas_por_pagina: int = PDF_ROWS_PER_PAGE,
+    progresso: Progresso | None = None,
+    arquivo: IO[bytes] | None = None,
+) -> IO[bytes]:
+    """Renderiza o relatório em PDF: página de resumo (agregados) e a listagem paginada.
+
+    Sem ``arquivo``, escreve num arquivo temporário (em memória até ``EXPORT_SPOOL_MAX_BYTES``).
+    """
+    if arquivo is None:
+        arquivo = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    titulo = f"Relatório de Vendas - {format_date_br(filtros.inicio)} a {format_date_br(filtros.fim)}"
+    paginas = _PdfPages(arquivo, titulo)
+    resumo = _summary_rows(filtros)
+    paginas.table(resumo, [len(resumo) - 1], [7 * cm, 4 * cm, 6 * cm])
+
+    linhas: list[list[str]] = [_CABECALHO_PDF]
+    destaques: list[int] = []
+    for linha, destaque in _pdf_rows(filtros, progresso):
+        if destaque:
+            destaques.append(len(linhas))
+        linhas.append(linha)
+        if len(linhas) > linhas_por_pagina:
+            paginas.table(linhas, destaques)
+            linhas, destaques = [_CABECALHO_PDF], []
+    if len(linhas) > 1:
+        paginas.table(linhas, destaques)
+    paginas.save()
+    arquivo.seek(0)
+    return arquivo
@@ -0,0 +1,182 @@
+"""Totais do caixa aberto empurrados por SSE (server-sent events).
+
+``apply_sales`` registra em ``session.info`` o delta de cada caixa e forma de
+pagamento; depois do commit, o hook ``after_commit`` entrega os deltas ao event
+loop, que os aplica à cópia em memória dos totais daquele caixa, renderiza os
+trechos HTML uma vez e os distribui a todos os assinantes. Quem está com
+``/vendas/nova`` ou ``/caixa/fechar`` aberto recebe a atualização sem recarregar
+a página, e N telas custam uma única conta.
+
+A cópia só existe enquanto há assinantes. O caixa é registrado antes da primeira
+leitura, então um commit concorrente com ela não se perde: a leitura é refeita.
+A leitura é uma tarefa do caixa, não de quem a iniciou: se esse assinante
+desconectar no meio dela, os demais continuam esperando pelo resultado.
+Cada processo enxerga apenas as escritas feitas por ele: com vários workers, uma
+tarefa por caixa relê a cópia do banco a cada ``LIVE_RESYNC_SECONDS`` (uma
+leitura compartilhada pelos assinantes, com ou sem movimento nas filas).
+"""
+import asyncio
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from app.templating import env
+from app.utils import cents_to_reais
+
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+LIVE_RESYNC_SECONDS = float(os.getenv("LIVE_RESYNC_SECONDS", "30"))
+LIVE_LOAD_ATTEMPTS = int(os.getenv("LIVE_LOAD_ATTEMPTS", "3"))
+
+_DELTAS = "deltas_totais"  # chave em session.info: {(caixa_id, chave_template): centavos}
+
+
+@dataclass
+class _Caixa:
+    totais: dict[str, int] | None = None  # centavos por chave de template, mais "troco"; None até a 1ª leitura
+    assinantes: set["asyncio.Queue[str]"] = field(default_factory=set)
+    alteracoes: int = 0  # deltas recebidos: uma leitura do banco concorrente com eles pode não incluí-los
+    leitura: "asyncio.Task[None] | None" = None  # primeira leitura, compartilhada pelos assinantes
+    tarefa: "asyncio.Task[None] | None" = None
+
+
+_caixas: dict[int, _Caixa] = {}
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def record_totals_delta(session: OrmSession, deltas: dict[tuple[int, str], int]) -> None:
+    """Acumula deltas na transação; só são publicados se ela for confirmada."""
+    if not _caixas:
+        return
+    pendentes = session.info.setdefault(_DELTAS, {})
+    for chave, valor in deltas.items():
+        if chave[0] in _caixas:
+            pendentes[chave] = pendentes.get(chave, 0) + valor
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publicar_apos_commit(session: OrmSession) -> None:
+    deltas = session.info.pop(_DELTAS, None)
+    if deltas and _loop is not None and not _loop.is_closed():
+        # O commit pode ter ocorrido numa thread (run_sync, escritor em grupo)
+        _loop.call_soon_threadsafe(_aplicar, deltas)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _descartar_apos_rollback(session: OrmSession) -> None:
+    session.info.pop(_DELTAS, None)
+
+
+def render_events(totais_cents: dict[str, int]) -> str:
+    """Eventos SSE ``totais`` (tela de vendas) e ``esperados`` (fechamento) para os totais."""
+    totais: dict[str, Any] = {chave: cents_to_reais(valor) for chave, valor in totais_cents.items()}
+    totais["gaveta"] = cents_to_reais(totais_cents.get("troco", 0) + totais_cents.get("dinheiro", 0))
+    return "".join(
+        _evento(nome, env.get_template(template).render(totais=totais))
+        for nome, template in (("totais", "partials/totals.html"), ("esperados", "partials/expected_totals.html"))
+    )
+
+
+def _evento(nome: str, dados: str) -> str:
+    linhas = "".join(f"data: {linha}\n" for linha in dados.splitlines() or [""])
+    return f"event: {nome}\n{linhas}\n"
+
+
+def _aplicar(deltas: dict[tuple[int, str], int]) -> None:
+    alterados: set[int] = set()
+    for (caixa_id, chave), valor in deltas.items():
+        caixa = _caixas.get(caixa_id)
+        if caixa is None or not valor:
+            continue
+        caixa.alteracoes += 1
+        if caixa.totais is not None and caixa.leitura is not None and caixa.leitura.done():  # durante a 1ª, ela é refeita
+            caixa.totais[chave] = caixa.totais.get(chave, 0) + valor
+            alterados.add(caixa_id)
+    for caixa_id in alterados:
+        _distribuir(_caixas[caixa_id])
+
+
+def _distribuir(caixa: _Caixa) -> None:
+    mensagem = render_events(caixa.totais or {})
+    for fila in caixa.assinantes:
+        fila.put_nowait(mensagem)
+
+
+Carregar = Callable[[], Awaitable[dict[str, int]]]
+
+
+async def _primeira_leitura(caixa: _Caixa, carregar: Carregar) -> None:
+    """Lê os totais; refaz a leitura se chegou delta durante ela (até ``LIVE_LOAD_ATTEMPTS`` vezes)."""
+    for _tentativa in range(LIVE_LOAD_ATTEMPTS):
+        antes = caixa.alteracoes
+        caixa.totais = await carregar()
+        if caixa.alteracoes == antes:
+            return
+    # Movimento contínuo: fica com a última leitura, corrigida na próxima ressincronização
+
+
+async def _ressincronizar(caixa: _Caixa, carregar: Carregar) -> None:
+    """Relê os totais a cada ``LIVE_RESYNC_SECONDS`` enquanto o caixa tiver assinantes."""
+    while True:
+        await asyncio.sleep(LIVE_RESYNC_SECONDS)
+        antes = caixa.alteracoes
+        try:
+            atuais = await carregar()
+        except Exception:  # falha passageira do banco: tenta de novo no próximo ciclo
+            continue
+        # Com delta no meio da leitura, não se sabe se ela o incluiu: espera o próximo ciclo
+        if caixa.alteracoes == antes and atuais != caixa.totais:
+            caixa.totais = atuais
+            _distribuir(caixa)
+
+
+async def subscribe(caixa_id: int, carregar: Carregar) -> AsyncIterator[str]:
+    """Mensagens SSE para o caixa: o estado atual e depois cada alteração.
+
+    ``carregar`` lê os totais do banco (centavos, com ``troco``); só é chamada pela
+    primeira leitura do caixa e pela tarefa de ressincronização.
+    """
+    global _loop
+    _loop = asyncio.get_running_loop()
+    fila: asyncio.Queue[str] = asyncio.Queue()
+    caixa = _caixas.get(caixa_id)
+    if caixa is None:
+        # Registrado antes da leitura: record_totals_delta já acumula os commits concorrentes
+        caixa = _caixas[caixa_id] = _Caixa()
+        caixa.leitura = asyncio.create_task(_primeira_leitura(caixa, carregar))
+    assert caixa.leitura is not None
+    caixa.assinantes.add(fila)
+    try:
+        try:
+            # shield: cancelar este assinante não cancela a leitura dos demais
+            await asyncio.shield(caixa.leitura)
+        except Exception:
+            caixa.totais = None
+            if _caixas.get(caixa_id) is caixa:
+                del _caixas[caixa_id]  # o próximo assinante tenta de novo
+            raise
+        if caixa.tarefa is None:
+            caixa.tarefa = asyncio.create_task(_ressincronizar(caixa, carregar))
+        yield render_events(caixa.totais or {})
+        while True:
+            try:
+                yield await asyncio.wait_for(fila.get(), LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        caixa.assinantes.discard(fila)
+        if not caixa.assinantes:
+            for tarefa in (caixa.leitura, caixa.tarefa):
+                if tarefa is not None:
+                    tarefa.cancel()
+            if _caixas.get(caixa_id) is caixa:
+                del _caixas[caixa_id]
+
+
+def subscriber_count(caixa_id: int | None = None) -> int:
+    if caixa_id is not None:
+        return len(_caixas[caixa_id].assinantes) if caixa_id in _caixas else 0
+    return sum(len(caixa.assinantes) for caixa in _caixas.values())
@@ -1,17 +1,23 @@
+import asyncio
+import logging
 import os
 import secrets
 from pathlib import Path
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
-from app.db import create_default_admin, init_db
-from app.routers import admin, audit, auth, cash, dashboard, reports, sales
+from app import sqlite_profile, write_queue
+from app.db import IS_SQLITE, async_engine, create_default_admin, engine, init_db
+from app.routers import admin, audit, auth, cash, dashboard, reports, reports_advanced, sales
+from app.templating import precompile_templates
 
 app = FastAPI(title="PDV Caixa Diário")
+logger = logging.getLogger("uvicorn.error")
 
 # Session - usa SECRET_KEY do ambiente (gera chave efêmera se ausente)
 secret_key = os.getenv("SECRET_KEY") or secrets.token_urlsafe(32)
@@ -35,14 +41,43 @@ app.include_router(cash.router)
 app.include_router(sales.router)
 app.include_router(admin.router)
 app.include_router(reports.router)  # Relatórios simples (compatibilidade)
+app.include_router(reports_advanced.router)  # Filtros avançados e exportações
 app.include_router(dashboard.router)
 app.include_router(audit.router)
 
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    # Rotas síncronas (relatórios/exportações) rodam neste threadpool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE", "40"))
+    for migracao in init_db():
+        logger.info("Migração de esquema: %s", migracao)
     create_default_admin()
+    logger.info("Templates pré-compilados: %d", precompile_templates())
+    if write_queue.ENABLED:
+        write_queue.start_group_commit(engine)
+    if IS_SQLITE:
+        logger.info("SQLite: %s", sqlite_profile.active_settings(engine))
+        if sqlite_profile.OPTIMIZE_INTERVAL > 0:
+            app.state.optimize_task = asyncio.create_task(_otimizar_periodicamente(sqlite_profile.OPTIMIZE_INTERVAL))
+
+
+async def _otimizar_periodicamente(intervalo: int) -> None:
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await anyio.to_thread.run_sync(sqlite_profile.optimize, engine)
+        except Exception:
+            logger.exception("Falha ao executar PRAGMA optimize")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = getattr(app.state, "optimize_task", None)
+    if task:
+        task.cancel()
+    await write_queue.stop_group_commit()
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -0,0 +1,233 @@
+"""Migrações de esquema versionadas.
+
+``SQLModel.metadata.create_all`` cria as tabelas novas já no formato atual; as
+migrações abaixo levam bancos existentes até a mesma versão e ficam registradas
+na tabela ``schema_version``. Cada passo é idempotente (consulta o esquema antes de
+alterar), então bancos criados antes do versionamento passam por todos sem efeito
+colateral.
+
+Rode pela CLI (``python tools/migrate.py upgrade``) ou deixe ``MIGRATE_ON_STARTUP=1``
+(padrão) para aplicar na inicialização. Em bancos grandes prefira a CLI fora do
+horário de movimento: no PostgreSQL os índices são criados com ``CONCURRENTLY``
+(sem bloquear escritas); no SQLite a criação de índice segura o lock de escrita
+enquanto percorre a tabela.
+"""
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel
+
+from app.totals import rebuild_daily_summary, rebuild_hourly_sales
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Colunas monetárias convertidas de float (reais) para inteiro (centavos)
+MONEY_COLUMNS = {
+    "sale": ["amount"],
+    "cashsession": [
+        "opening_amount",
+        "reported_cash_drawer",
+        "reported_pix_total",
+        "reported_debit_total",
+        "reported_credit_total",
+        "diff_cash",
+        "diff_pix",
+        "diff_debit",
+        "diff_credit",
+        "diff_overall",
+    ],
+}
+# Colunas renomeadas junto com a conversão (antigo -> novo)
+RENAMED_MONEY_COLUMNS = {"cashsessiontotal": {"total_amount": "total_cents"}}
+
+# Chave arbitrária do advisory lock de migração (PostgreSQL)
+_SCHEMA_LOCK = 7_340_001
+
+
+def _money_to_cents(engine: Engine) -> None:
+    """Converte colunas float em reais para inteiros em centavos, preservando os dados."""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        tabelas = set(inspector.get_table_names())
+        pares: list[tuple[str, str, str]] = [
+            (tabela, coluna, f"{coluna}_cents") for tabela, colunas in MONEY_COLUMNS.items() for coluna in colunas
+        ]
+        pares += [(tabela, antigo, novo) for tabela, mapa in RENAMED_MONEY_COLUMNS.items() for antigo, novo in mapa.items()]
+        for tabela, antiga, nova in pares:
+            if tabela not in tabelas:
+                continue
+            colunas = {c["name"]: c for c in inspector.get_columns(tabela)}
+            if antiga not in colunas or nova in colunas:
+                continue
+            t, a, n = quote(tabela), quote(antiga), quote(nova)
+            if colunas[antiga]["nullable"]:
+                conn.execute(text(f"ALTER TABLE {t} ADD COLUMN {n} BIGINT"))
+            else:
+                conn.execute(text(f"ALTER TABLE {t} ADD COLUMN {n} BIGINT NOT NULL DEFAULT 0"))
+            conn.execute(text(f"UPDATE {t} SET {n} = CAST(ROUND({a} * 100) AS BIGINT) WHERE {a} IS NOT NULL"))
+            conn.execute(text(f"ALTER TABLE {t} DROP COLUMN {a}"))
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    """Adiciona colunas anuláveis que ainda não existem no banco (ALTER TABLE ADD COLUMN)."""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in SQLModel.metadata.sorted_tables:
+            existentes = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existentes or not column.nullable:
+                    continue
+                tipo = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {tipo}"))
+
+
+def _indexes(*nomes: str) -> Callable[[Engine], None]:
+    """Passo que cria os índices do modelo com esses nomes e atualiza as estatísticas das tabelas."""
+
+    def passo(engine: Engine) -> None:
+        por_nome: dict[str | None, Index] = {i.name: i for t in SQLModel.metadata.sorted_tables for i in t.indexes}
+        tabelas: set[str] = set()
+        for nome in nomes:
+            index = por_nome[nome]
+            _create_index(engine, index)
+            tabelas.add(index.table.name)  # type: ignore[union-attr]
+        _analyze(engine, sorted(tabelas))
+
+    return passo
+
+
+def _daily_summary(engine: Engine) -> None:
+    """Preenche o resumo diário com os caixas fechados antes da tabela existir."""
+    with Session(engine) as session:
+        rebuild_daily_summary(session)
+        session.commit()
+
+
+def _hourly_sales(engine: Engine) -> None:
+    """Preenche as vendas por hora com o histórico anterior à tabela."""
+    with Session(engine) as session:
+        rebuild_hourly_sales(session)
+        session.commit()
+
+
+def _create_index(engine: Engine, index: Index) -> None:
+    if engine.dialect.name != "postgresql":
+        index.create(engine, checkfirst=True)
+        return
+    # CONCURRENTLY não bloqueia escritas, mas exige autocommit; uma tentativa
+    # interrompida deixa o índice inválido, que é descartado e refeito
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalido = conn.execute(
+            text("SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :nome AND NOT i.indisvalid"),
+            {"nome": index.name},
+        ).first()
+        if invalido:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {conn.dialect.identifier_preparer.quote(str(index.name))}"))
+        index.dialect_kwargs["postgresql_concurrently"] = True
+        try:
+            index.create(conn, checkfirst=True)
+        finally:
+            index.dialect_kwargs["postgresql_concurrently"] = False
+
+
+def _analyze(engine: Engine, tabelas: list[str]) -> None:
+    with engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        if engine.dialect.name == "sqlite":
+            # Estatísticas por amostragem: tempo limitado mesmo com milhões de linhas
+            conn.execute(text("PRAGMA analysis_limit=1000"))
+        for tabela in tabelas:
+            conn.execute(text(f"ANALYZE {quote(tabela)}"))
+
+
+# (versão, nome, passo). Nunca altere um passo já publicado: acrescente um novo.
+MIGRATIONS: list[tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "money_to_cents", _money_to_cents),
+    (2, "nullable_columns", _add_missing_columns),
+    (3, "sale_session_and_idempotency_indexes", _indexes("ix_sale_cash_session_id", "ix_sale_idempotency_key")),
+    (4, "hot_path_composite_indexes", _indexes(
+        "ix_sale_session_method",
+        "ix_sale_operator_created",
+        "ix_sale_product_code",
+        "ix_cashsession_data_status",
+    )),
+    (5, "sale_keyset_index", _indexes("ix_sale_session_created")),
+    (6, "daily_summary_backfill", _daily_summary),
+    (7, "hourly_sales_backfill", _hourly_sales),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine: Engine) -> int:
+    schema_version.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return int(conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).scalar() or 0)
+
+
+def pending_migrations(engine: Engine) -> list[tuple[int, str]]:
+    atual = current_version(engine)
+    return [(versao, nome) for versao, nome, _passo in MIGRATIONS if versao > atual]
+
+
+def run_migrations(engine: Engine, alvo: int | None = None) -> list[str]:
+    """Cria tabelas novas e aplica as migrações pendentes até ``alvo``; retorna as aplicadas."""
+    aplicadas: list[str] = []
+    with _schema_lock(engine):
+        SQLModel.metadata.create_all(engine)
+        atual = current_version(engine)
+        for versao, nome, passo in MIGRATIONS:
+            if versao <= atual or (alvo is not None and versao > alvo):
+                continue
+            passo(engine)
+            _record(engine, versao, nome)
+            aplicadas.append(f"{versao:04d}_{nome}")
+    return aplicadas
+
+
+def _record(engine: Engine, versao: int, nome: str) -> None:
+    try:
+        with engine.begin() as conn:
+            conn.execute(schema_version.insert().values(version=versao, name=nome, applied_at=datetime.now(timezone.utc)))
+    except IntegrityError:
+        pass  # outro processo registrou a mesma versão (os passos são idempotentes)
+
+
+@contextmanager
+def _schema_lock(engine: Engine) -> Iterator[None]:
+    """No PostgreSQL, serializa migrações de réplicas que sobem ao mesmo tempo."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": _SCHEMA_LOCK})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": _SCHEMA_LOCK})
+
@@ -4,6 +4,7 @@ from datetime import date, datetime, timezone
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import BigInteger, Index
 from sqlmodel import Field, SQLModel
 
 
@@ -34,10 +35,14 @@ class User(SQLModel, table=True):
 
 
 class CashSession(SQLModel, table=True):
+    # caixa aberto do dia e filtros de período por status
+    __table_args__ = (Index("ix_cashsession_data_status", "data", "status"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     opened_by_id: int = Field(foreign_key="user.id")
     data: date = Field(index=True)
-    opening_amount: float = Field(default=0.0)
+    # valores monetários em centavos (inteiros) para somas exatas
+    opening_amount_cents: int = Field(default=0, sa_type=BigInteger)
     opened_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     # fechamento
@@ -45,33 +50,51 @@ class CashSession(SQLModel, table=True):
     status: StatusEnum = Field(default=StatusEnum.open, index=True)
 
     # valores informados no fechamento
-    reported_cash_drawer: Optional[float] = None
-    reported_pix_total: Optional[float] = None
-    reported_debit_total: Optional[float] = None
-    reported_credit_total: Optional[float] = None
+    reported_cash_drawer_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    reported_pix_total_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    reported_debit_total_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    reported_credit_total_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
 
     # diferenças calculadas no fechamento (esperado - informado)
-    diff_cash: Optional[float] = None
-    diff_pix: Optional[float] = None
-    diff_debit: Optional[float] = None
-    diff_credit: Optional[float] = None
-    diff_overall: Optional[float] = None
+    diff_cash_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    diff_pix_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    diff_debit_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    diff_credit_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
+    diff_overall_cents: Optional[int] = Field(default=None, sa_type=BigInteger)
 
     # Relacionamentos removidos para simplificar o mapeamento
 
 
 class Sale(SQLModel, table=True):
+    # Índices compostos no formato das consultas: totais/relatórios por caixa e forma de
+    # pagamento, listagem paginada por (created_at, id), ranking e filtro por operador
+    # no período, agrupamento por produto
+    __table_args__ = (
+        Index("ix_sale_session_method", "cash_session_id", "payment_method"),
+        Index("ix_sale_session_created", "cash_session_id", "created_at", "id"),
+        Index("ix_sale_operator_created", "operator_id", "created_at"),
+        Index("ix_sale_product_code", "product_code"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_code: str
-    amount: float
+    amount_cents: int = Field(sa_type=BigInteger)
     payment_method: PaymentMethodEnum
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
 
     operator_id: int = Field(foreign_key="user.id")
-    cash_session_id: int = Field(foreign_key="cashsession.id")
+    cash_session_id: int = Field(foreign_key="cashsession.id", index=True)
+
+    # Chave gerada pelo terminal para deduplicar reenvios do lote (/vendas/lote)
+    idempotency_key: Optional[str] = Field(default=None, unique=True, index=True, max_length=64)
 
     # Relacionamentos removidos para simplificar o mapeamento
 
+    @property
+    def amount(self) -> float:
+        """Valor em reais, para exibição."""
+        return self.amount_cents / 100
+
 
 class AuditLog(SQLModel, table=True):
     """Log de auditoria para rastrear ações importantes no sistema."""
@@ -91,3 +114,44 @@ class SaleCancellation(SQLModel, table=True):
     reason: str
     canceled_by_id: int = Field(foreign_key="user.id")
     canceled_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+
+class CashSessionTotal(SQLModel, table=True):
+    """Totais acumulados do caixa por forma de pagamento (líquidos de cancelamentos).
+
+    Atualizado na mesma transação do lançamento, cancelamento ou exclusão de venda.
+    """
+    cash_session_id: int = Field(foreign_key="cashsession.id", primary_key=True)
+    payment_method: PaymentMethodEnum = Field(primary_key=True)
+    sale_count: int = Field(default=0)
+    total_cents: int = Field(default=0, sa_type=BigInteger)
+
+
+class DailySummary(SQLModel, table=True):
+    """Resumo diário dos caixas fechados por forma de pagamento e operador (líquido de cancelamentos).
+
+    Gravado no fechamento do caixa e ajustado quando uma venda de dia fechado é
+    cancelada ou excluída; relatórios de período leem estas linhas em vez das vendas.
+    """
+    data: date = Field(primary_key=True)
+    payment_method: PaymentMethodEnum = Field(primary_key=True)
+    operator_id: int = Field(foreign_key="user.id", primary_key=True)
+    sale_count: int = Field(default=0)
+    total_cents: int = Field(default=0, sa_type=BigInteger)
+
+
+class HourlySales(SQLModel, table=True):
+    """Vendas por hora (fuso de São Paulo), líquidas de cancelamentos, de todos os caixas.
+
+    Ajustada por ``apply_sales`` a cada lançamento, cancelamento ou exclusão; as
+    séries do dashboard executivo leem estas linhas em vez das vendas.
+    """
+    hora: datetime = Field(primary_key=True)  # início da hora, horário local sem fuso
+    sale_count: int = Field(default=0)
+    total_cents: int = Field(default=0, sa_type=BigInteger)
+
+
+class CacheVersion(SQLModel, table=True):
+    """Contador de versão compartilhado entre processos para invalidar caches em memória."""
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
@@ -0,0 +1,59 @@
+"""Resolve o caixa aberto do dia com cache em memória por processo.
+
+O caixa aberto é consultado em quase todas as requisições (lançar venda, status,
+fechamento). O resultado fica em memória junto com a data de negócio e a versão
+do contador ``open_cash``; ``abrir_post`` e ``fechar_post`` incrementam esse
+contador, então todos os workers recarregam na próxima leitura.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session, select
+
+from app.models import CashSession, StatusEnum
+from app.utils import today_brt
+from app.versions import bump_version, current_version
+
+VERSION_KEY = "open_cash"
+
+
+@dataclass(frozen=True)
+class _Entry:
+    day: date
+    version: int
+    caixa: CashSession | None  # cópia desanexada de qualquer sessão
+
+
+_cache: _Entry | None = None
+
+
+def get_open_cash_session(session: Session) -> CashSession | None:
+    """Caixa aberto na data de hoje (BRT), anexado à ``session`` informada."""
+    global _cache
+    hoje = today_brt()
+    versao = current_version(session, VERSION_KEY)
+    entry = _cache
+    if entry is None or entry.day != hoje or entry.version != versao:
+        caixa = session.exec(
+            select(CashSession).where(CashSession.data == hoje, CashSession.status == StatusEnum.open)
+        ).first()
+        entry = _Entry(day=hoje, version=versao, caixa=_snapshot(caixa) if caixa else None)
+        _cache = entry
+        return caixa
+    if entry.caixa is None:
+        return None
+    return session.merge(entry.caixa, load=False)
+
+
+def invalidate_open_cash_session(session: Session) -> None:
+    """Marca o caixa aberto como alterado (chamar antes do commit de abertura/fechamento)."""
+    global _cache
+    bump_version(session, VERSION_KEY)
+    _cache = None
+
+
+def _snapshot(caixa: CashSession) -> CashSession:
+    copia = CashSession(**caixa.model_dump())
+    make_transient_to_detached(copia)
+    return copia
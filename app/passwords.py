@@ -0,0 +1,43 @@
+"""Hash e verificação de senhas fora do event loop.
+
+O PBKDF2 consome dezenas a centenas de ms de CPU por chamada. As funções assíncronas
+usam um pool de threads limitado (``PASSWORD_HASH_WORKERS``), então uma rajada de
+logins ocupa no máximo esse número de threads e não atrasa o lançamento de vendas.
+O número de rodadas vem de ``PASSWORD_HASH_ROUNDS``; hashes gravados com parâmetros
+antigos são refeitos no próximo login bem-sucedido.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.hash import pbkdf2_sha256
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+_hasher = pbkdf2_sha256.using(rounds=PASSWORD_HASH_ROUNDS)
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")), thread_name_prefix="password-hash"
+)
+
+
+def hash_password_sync(senha: str) -> str:
+    """Versão síncrona, para scripts e inicialização."""
+    return str(_hasher.hash(senha))
+
+
+def _verificar(senha: str, hash_atual: str) -> tuple[bool, str | None]:
+    try:
+        ok = bool(_hasher.verify(senha, hash_atual))
+    except (ValueError, TypeError):
+        return False, None
+    if ok and _hasher.needs_update(hash_atual):
+        return True, str(_hasher.hash(senha))
+    return ok, None
+
+
+async def hash_password(senha: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password_sync, senha)
+
+
+async def verify_password(senha: str, hash_atual: str) -> tuple[bool, str | None]:
+    """Retorna (senha confere, novo hash se o atual usa parâmetros desatualizados)."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, _verificar, senha, hash_atual)
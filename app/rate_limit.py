@@ -0,0 +1,102 @@
+"""Limite de tentativas de senha por usuário e por IP (token bucket em memória).
+
+Cada chave tem um balde com ``capacidade`` fichas que se recarrega a ``por_minuto``
+fichas por minuto. Cada tentativa de senha toma uma ficha de cada balde envolvido antes
+do hash, numa operação só (verificar e tomar sob o mesmo lock), e a devolve se a senha
+estiver correta: logins corretos não contam, e uma rajada de senhas erradas, mesmo
+concorrente, não passa de ``capacidade`` verificações no PBKDF2.
+O estado é por processo: com várias réplicas o limite efetivo é multiplicado.
+"""
+import os
+import time
+from threading import Lock
+
+# Acima deste número de chaves, baldes já cheios são descartados
+_MAX_CHAVES = 10_000
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacidade: float, por_minuto: float) -> None:
+        self.capacidade = capacidade
+        self.taxa = por_minuto / 60
+        self._baldes: dict[str, tuple[float, float]] = {}
+        self._lock = Lock()
+
+    def _fichas(self, chave: str, agora: float) -> float:
+        fichas, ultimo = self._baldes.get(chave, (self.capacidade, agora))
+        return min(self.capacidade, fichas + (agora - ultimo) * self.taxa)
+
+    def retry_after(self, chave: str) -> float:
+        """Segundos até haver uma ficha disponível (0 se já houver)."""
+        with self._lock:
+            fichas = self._fichas(chave, time.monotonic())
+        return 0.0 if fichas >= 1 else (1 - fichas) / self.taxa
+
+    def take(self, chave: str) -> float:
+        """Toma uma ficha se houver e retorna 0; senão não toma e retorna os segundos a aguardar."""
+        with self._lock:
+            agora = time.monotonic()
+            fichas = self._fichas(chave, agora)
+            if fichas < 1:
+                return (1 - fichas) / self.taxa
+            self._baldes[chave] = (fichas - 1, agora)
+            if len(self._baldes) > _MAX_CHAVES:
+                self._podar(agora)
+            return 0.0
+
+    def refund(self, chave: str) -> None:
+        """Devolve uma ficha tomada por ``take``."""
+        with self._lock:
+            agora = time.monotonic()
+            self._baldes[chave] = (min(self.capacidade, self._fichas(chave, agora) + 1), agora)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._baldes.clear()
+
+    def _podar(self, agora: float) -> None:
+        for chave in [c for c in self._baldes if self._fichas(c, agora) >= self.capacidade]:
+            del self._baldes[chave]
+
+
+por_usuario = TokenBucketLimiter(
+    float(os.getenv("LOGIN_USER_BURST", "5")), float(os.getenv("LOGIN_USER_PER_MINUTE", "5"))
+)
+por_ip = TokenBucketLimiter(
+    float(os.getenv("LOGIN_IP_BURST", "30")), float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+)
+
+
+def _chaves(username: str, ip: str | None) -> list[tuple[TokenBucketLimiter, str]]:
+    return [(por_usuario, f"user:{username.strip().lower()}"), (por_ip, f"ip:{ip or '-'}")]
+
+
+def password_attempt(username: str, ip: str | None) -> float:
+    """Reserva uma tentativa de senha para o usuário e o IP antes do hash.
+
+    Retorna 0 se a tentativa é permitida (as fichas já foram tomadas); senão os segundos
+    a aguardar, sem tomar nada.
+    """
+    espera = 0.0
+    tomadas: list[tuple[TokenBucketLimiter, str]] = []
+    for limiter, chave in _chaves(username, ip):
+        aguardar = limiter.take(chave)
+        if aguardar:
+            espera = max(espera, aguardar)
+        else:
+            tomadas.append((limiter, chave))
+    if espera:
+        for limiter, chave in tomadas:
+            limiter.refund(chave)
+    return espera
+
+
+def password_succeeded(username: str, ip: str | None) -> None:
+    """Senha correta: devolve as fichas reservadas por ``password_attempt``."""
+    for limiter, chave in _chaves(username, ip):
+        limiter.refund(chave)
+
+
+def reset_limits() -> None:
+    por_usuario.reset()
+    por_ip.reset()
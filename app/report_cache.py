@@ -0,0 +1,105 @@
+"""Cache em memória de resultados de relatório, invalidado por versão dos dados.
+
+Dois contadores em ``CacheVersion`` marcam as alterações: ``vendas`` muda a cada
+venda, cancelamento, exclusão ou fechamento; ``vendas_fechadas`` só quando um
+caixa fecha ou uma venda de caixa fechado é cancelada ou excluída. Um resultado
+cujo período não tem caixa aberto depende apenas do segundo e continua válido
+enquanto o movimento do dia acontece; os demais dependem dos dois.
+
+A chave é (nome do relatório, parâmetros normalizados, versões), com limite LRU
+de ``REPORT_CACHE_SIZE`` entradas por processo. Como os contadores estão no
+banco, um incremento feito por qualquer réplica invalida o cache de todas.
+Com ``ttl``, o último resultado é devolvido por alguns segundos sem ler as
+versões: telas que se atualizam sozinhas não chegam ao banco.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+from sqlmodel import Session
+
+from app.versions import bump_version, current_version
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "128"))
+
+SALES_VERSION = "vendas"
+CLOSED_SALES_VERSION = "vendas_fechadas"
+
+T = TypeVar("T")
+
+_entradas: OrderedDict[Hashable, Any] = OrderedDict()
+_lock = threading.Lock()  # rotas de relatório rodam no threadpool
+_recentes: dict[Hashable, tuple[float, Any]] = {}  # (nome, parâmetros) -> (expira, valor)
+_contadores = {"hits": 0, "misses": 0}
+
+
+def bump_sales_version(session: Session, caixa_fechado: bool = False) -> None:
+    """Marca alteração nas vendas (não faz commit; vale junto com a transação do chamador)."""
+    bump_version(session, SALES_VERSION)
+    if caixa_fechado:
+        bump_version(session, CLOSED_SALES_VERSION)
+
+
+def data_stamp(session: Session, somente_fechados: bool) -> tuple[int, ...]:
+    """Versões das quais um resultado depende."""
+    fechadas = current_version(session, CLOSED_SALES_VERSION)
+    if somente_fechados:
+        return (fechadas,)
+    return (fechadas, current_version(session, SALES_VERSION))
+
+
+def cached(
+    session: Session,
+    nome: str,
+    parametros: Hashable,
+    somente_fechados: bool,
+    calcular: Callable[[], T],
+    ttl: float = 0,
+) -> T:
+    """Resultado de ``calcular()`` guardado sob (nome, parâmetros, versões dos dados).
+
+    ``ttl`` > 0 devolve o último resultado sem consultar as versões durante ``ttl`` segundos.
+    """
+    recente = (nome, parametros, somente_fechados)
+    if ttl > 0:
+        with _lock:
+            entrada = _recentes.get(recente)
+            if entrada is not None and time.monotonic() < entrada[0]:
+                _contadores["hits"] += 1
+                return entrada[1]  # type: ignore[no-any-return]
+    chave = (*recente, data_stamp(session, somente_fechados))
+    with _lock:
+        if chave in _entradas:
+            _entradas.move_to_end(chave)
+            _contadores["hits"] += 1
+            guardado = _entradas[chave]
+            if ttl > 0:
+                _recentes[recente] = (time.monotonic() + ttl, guardado)
+            return guardado  # type: ignore[no-any-return]
+        _contadores["misses"] += 1
+    valor = calcular()
+    with _lock:
+        _entradas[chave] = valor
+        _entradas.move_to_end(chave)
+        while len(_entradas) > REPORT_CACHE_SIZE:
+            _entradas.popitem(last=False)
+        if ttl > 0:
+            if len(_recentes) >= REPORT_CACHE_SIZE:
+                _recentes.clear()
+            _recentes[recente] = (time.monotonic() + ttl, valor)
+    return valor
+
+
+def cache_stats() -> dict[str, int]:
+    with _lock:
+        return {**_contadores, "entradas": len(_entradas), "capacidade": REPORT_CACHE_SIZE}
+
+
+def clear_cache() -> None:
+    with _lock:
+        _entradas.clear()
+        _recentes.clear()
+        _contadores.update(hits=0, misses=0)
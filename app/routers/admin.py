@@ -1,20 +1,22 @@
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from passlib.hash import pbkdf2_sha256
-from sqlmodel import Session, select
+from sqlmodel import select
 
-from app.db import get_session
+from app.db import AsyncSession, get_async_session
 from app.deps import admin_required, csrf_protect, get_csrf_token
 from app.models import RoleEnum, User
+from app.passwords import hash_password
+from app.report_cache import cache_stats
+from app.templating import templates
+from app.users import invalidate_user
+from app.write_queue import group_commit_stats
 
 router = APIRouter(prefix="/administracao")
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/usuarios", response_class=HTMLResponse)
-async def lista_usuarios(request: Request, user: User = Depends(admin_required), session: Session = Depends(get_session)):
-    usuarios = session.exec(select(User)).all()
+async def lista_usuarios(request: Request, user: User = Depends(admin_required), session: AsyncSession = Depends(get_async_session)):
+    usuarios = (await session.exec(select(User))).all()
     return templates.TemplateResponse(
         "admin_users.html", {"request": request, "user": user, "usuarios": usuarios, "csrf_token": get_csrf_token(request)}
     )
@@ -30,19 +32,26 @@ async def criar_usuario(
     active: bool = Form(True),
     csrf_token: str = Form(alias="_csrf"),
     user: User = Depends(admin_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     csrf_protect(request, csrf_token)
-    exists = session.exec(select(User).where(User.username == username)).first()
+    exists = (await session.exec(select(User).where(User.username == username))).first()
     if exists:
         return RedirectResponse("/administracao/usuarios", status_code=302)
     novo = User(
         username=username.strip(),
         full_name=full_name.strip(),
-        password_hash=pbkdf2_sha256.hash(password),
+        password_hash=await hash_password(password),
         role=RoleEnum(role),
         active=active,
     )
     session.add(novo)
-    session.commit()
+    await session.commit()
+    invalidate_user(novo.id)
     return RedirectResponse("/administracao/usuarios", status_code=302)
+
+
+@router.get("/metricas")
+async def metricas(user: User = Depends(admin_required)):
+    """Contadores de cache e do escritor em grupo deste processo."""
+    return {"cache_relatorios": cache_stats(), "group_commit": group_commit_stats()}
@@ -2,23 +2,21 @@ from datetime import date, datetime
 
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import select
 
-from app.db import get_session
+from app.db import AsyncSession, get_async_session
 from app.deps import admin_required, get_csrf_token
 from app.models import AuditLog, User
-from app.utils import format_brt
+from app.templating import templates
 
 router = APIRouter(prefix="/auditoria", tags=["audit"])
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/", response_class=HTMLResponse)
 async def auditoria_index(
     request: Request,
     user: User = Depends(admin_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     usuario_id: int | None = Query(default=None),
     data_inicio: str | None = Query(default=None),
     data_fim: str | None = Query(default=None),
@@ -49,21 +47,19 @@ async def auditoria_index(
         query = query.where(AuditLog.created_at <= datetime.combine(dt_fim, datetime.max.time()))
 
     # Busca e ordena em memória por created_at desc
-    logs = list(session.exec(query).all())
+    logs = list((await session.exec(query)).all())
     logs.sort(key=lambda l: l.created_at, reverse=True)
     logs = logs[:100]
 
     # Lista de usuários para filtro
-    usuarios = list(session.exec(select(User)).all())
+    usuarios = list((await session.exec(select(User))).all())
 
-    # Enriquecer logs com nomes de usuários
-    logs_enriched = []
-    for log in logs:
-        usuario = session.get(User, log.user_id)
-        logs_enriched.append({
-            "log": log,
-            "usuario_nome": usuario.full_name if usuario else f"ID {log.user_id}"
-        })
+    # Enriquecer logs com nomes de usuários (a lista do filtro já traz todos)
+    nomes = {u.id: u.full_name for u in usuarios}
+    logs_enriched = [
+        {"log": log, "usuario_nome": nomes.get(log.user_id, f"ID {log.user_id}")}
+        for log in logs
+    ]
 
     return templates.TemplateResponse(
         "audit.html",
@@ -75,7 +71,6 @@ async def auditoria_index(
             "usuario_id": usuario_id,
             "data_inicio": data_inicio or "",
             "data_fim": data_fim or "",
-            "fmt_dt": format_brt,
             "csrf_token": get_csrf_token(request),
         },
     )
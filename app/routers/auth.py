@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from passlib.hash import pbkdf2_sha256
-from sqlmodel import Session, select
+from sqlmodel import select
 
-from app.db import get_session
+from app.db import AsyncSession, get_async_session
 from app.deps import csrf_protect, get_csrf_token, login_required
 from app.models import User
+from app.passwords import verify_password
+from app.rate_limit import password_attempt, password_succeeded
+from app.templating import templates
+from app.users import invalidate_user
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/entrar", response_class=HTMLResponse)
@@ -24,16 +25,37 @@ async def entrar_post(
     username: str = Form(...),
     password: str = Form(...),
     csrf_token: str = Form(alias="_csrf"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     csrf_protect(request, csrf_token)
-    user = session.exec(select(User).where(User.username == username)).first()
-    if not user or not pbkdf2_sha256.verify(password, user.password_hash) or not user.active:
+    ip = request.client.host if request.client else None
+    espera = password_attempt(username, ip)
+    if espera:
+        return templates.TemplateResponse(
+            "login.html",
+            {
+                "request": request,
+                "error": f"Muitas tentativas. Tente novamente em {int(espera) + 1} segundos.",
+                "csrf_token": get_csrf_token(request),
+            },
+            status_code=429,
+            headers={"Retry-After": str(int(espera) + 1)},
+        )
+    user = (await session.exec(select(User).where(User.username == username))).first()
+    ok, novo_hash = await verify_password(password, user.password_hash) if user else (False, None)
+    if not user or not ok or not user.active:
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "error": "Usuário ou senha inválidos", "csrf_token": get_csrf_token(request)},
             status_code=400,
         )
+    password_succeeded(username, ip)
+    if novo_hash:
+        # Hash gravado com parâmetros antigos: atualiza agora que temos a senha em claro
+        user.password_hash = novo_hash
+        session.add(user)
+        await session.commit()
+        invalidate_user(user.id)
     request.session["user_id"] = user.id
     return RedirectResponse(url="/painel", status_code=302)
 
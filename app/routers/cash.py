@@ -2,26 +2,34 @@ from datetime import date, datetime
 
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-import pytz
-from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select
 
-from app.db import get_session
+from app.db import AsyncSession, get_async_session
 from app.deps import csrf_protect, get_csrf_token, login_required
-from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum, User
-from app.utils import format_brt
+from app.models import CashSession, StatusEnum, User
+from app.open_cash import get_open_cash_session, invalidate_open_cash_session
+from app.templating import render_fragment, templates
+from app.totals import init_session_totals, rebuild_daily_summary, session_totals_cents
+from app.users import user_names
+from app.utils import cents_to_reais, parse_cents, today_brt
 
 router = APIRouter(prefix="/caixa")
-templates = Jinja2Templates(directory="app/templates")
+
+
+def _totais_esperados(session: Session, caixa: CashSession) -> dict[str, int]:
+    """Totais esperados em centavos (líquidos de cancelamentos), incluindo a gaveta (troco + dinheiro)."""
+    assert caixa.id is not None
+    totais = session_totals_cents(session, caixa.id)
+    return {**totais, "gaveta": caixa.opening_amount_cents + totais["dinheiro"]}
+
+
+def _em_reais(totais: dict[str, int]) -> dict[str, float]:
+    return {chave: cents_to_reais(valor) for chave, valor in totais.items()}
 
 
 @router.get("/status", response_class=HTMLResponse)
-async def caixa_status(request: Request, user: User = Depends(login_required), session: Session = Depends(get_session)):
-    tz = pytz.timezone("America/Sao_Paulo")
-    today = datetime.now(tz).date()
-    aberto = session.exec(
-        select(CashSession).where(CashSession.data == today, CashSession.status == StatusEnum.open)
-    ).first()
+async def caixa_status(request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    aberto = await session.run_sync(get_open_cash_session)
     return templates.TemplateResponse(
         "cash_status.html",
         {"request": request, "user": user, "aberto": aberto, "csrf_token": get_csrf_token(request)},
@@ -29,8 +37,7 @@ async def caixa_status(request: Request, user: User = Depends(login_required), s
 
 @router.get("/abrir", response_class=HTMLResponse)
 async def abrir_get(request: Request, user: User = Depends(login_required)):
-    tz = pytz.timezone("America/Sao_Paulo")
-    today = datetime.now(tz).date().isoformat()
+    today = today_brt().isoformat()
     return templates.TemplateResponse(
         "open_cash.html",
         {
@@ -45,18 +52,17 @@ async def abrir_get(request: Request, user: User = Depends(login_required)):
 @router.post("/abrir")
 async def abrir_post(
     request: Request,
-    troco_inicial: float = Form(...),
+    troco_inicial: str = Form(...),
     data: str = Form(...),
     csrf_token: str = Form(alias="_csrf"),
     user: User = Depends(login_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    tz = pytz.timezone("America/Sao_Paulo")
     csrf_protect(request, csrf_token)
     try:
         data_dt = datetime.strptime(data, "%Y-%m-%d").date()
         if not data:
-            data_dt = datetime.now(tz).date()
+            data_dt = today_brt()
     except Exception:
         return templates.TemplateResponse(
             "open_cash.html",
@@ -64,7 +70,23 @@ async def abrir_post(
             status_code=400,
         )
 
-    existente = session.exec(select(CashSession).where(CashSession.data == data_dt, CashSession.status == StatusEnum.open)).first()
+    troco_cents = parse_cents(troco_inicial)
+    if troco_cents is None or troco_cents < 0:
+        return templates.TemplateResponse(
+            "open_cash.html",
+            {
+                "request": request,
+                "user": user,
+                "error": "Troco inicial inválido. Use ponto ou vírgula como separador decimal.",
+                "today": data,
+                "csrf_token": get_csrf_token(request),
+            },
+            status_code=400,
+        )
+
+    existente = (
+        await session.exec(select(CashSession).where(CashSession.data == data_dt, CashSession.status == StatusEnum.open))
+    ).first()
     if existente:
         return templates.TemplateResponse(
             "open_cash.html",
@@ -79,43 +101,29 @@ async def abrir_post(
         )
 
     assert user.id is not None
-    caixa = CashSession(opened_by_id=int(user.id), data=data_dt, opening_amount=troco_inicial)
+    caixa = CashSession(opened_by_id=int(user.id), data=data_dt, opening_amount_cents=troco_cents)
     session.add(caixa)
-    session.commit()
+    await session.flush()
+    assert caixa.id is not None
+    await session.run_sync(init_session_totals, caixa.id)
+    await session.run_sync(invalidate_open_cash_session)
+    await session.commit()
     return RedirectResponse("/caixa/status", status_code=302)
 
 @router.get("/fechar", response_class=HTMLResponse)
-async def fechar_get(request: Request, user: User = Depends(login_required), session: Session = Depends(get_session)):
-    tz = pytz.timezone("America/Sao_Paulo")
-    today = datetime.now(tz).date()
-    caixa = session.exec(select(CashSession).where(CashSession.data == today, CashSession.status == StatusEnum.open)).first()
+async def fechar_get(request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    caixa = await session.run_sync(get_open_cash_session)
     if not caixa:
         return RedirectResponse("/caixa/status", status_code=302)
 
-    # calcula totais esperados por forma de pagamento
-    vendas = session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all()
-    # Excluir canceladas
-    from app.models import SaleCancellation
-    cancelados = {c.sale_id for c in session.exec(select(SaleCancellation)).all()}
-    total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO and v.id not in cancelados)
-    total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX and v.id not in cancelados)
-    total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO and v.id not in cancelados)
-    total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO and v.id not in cancelados)
-    esperado_gaveta = caixa.opening_amount + total_din
-
     return templates.TemplateResponse(
         "close_cash.html",
         {
             "request": request,
             "user": user,
             "caixa": caixa,
-            "totais": {
-                "dinheiro": total_din,
-                "pix": total_pix,
-                "debito": total_deb,
-                "credito": total_cred,
-                "gaveta": esperado_gaveta,
-            },
+            "totais": _em_reais(await session.run_sync(_totais_esperados, caixa)),
+            "error": None,
             "csrf_token": get_csrf_token(request),
         },
     )
@@ -124,87 +132,88 @@ async def fechar_get(request: Request, user: User = Depends(login_required), ses
 @router.post("/fechar")
 async def fechar_post(
     request: Request,
-    gaveta: float = Form(...),
-    pix: float = Form(...),
-    debito: float = Form(...),
-    credito: float = Form(...),
+    gaveta: str = Form(...),
+    pix: str = Form(...),
+    debito: str = Form(...),
+    credito: str = Form(...),
     csrf_token: str = Form(alias="_csrf"),
     user: User = Depends(login_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     csrf_protect(request, csrf_token)
-    tz = pytz.timezone("America/Sao_Paulo")
-    today = datetime.now(tz).date()
-    caixa = session.exec(select(CashSession).where(CashSession.data == today, CashSession.status == StatusEnum.open)).first()
+    caixa = await session.run_sync(get_open_cash_session)
     if not caixa:
         return RedirectResponse("/caixa/status", status_code=302)
 
-    vendas = session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all()
-    from app.models import SaleCancellation
-    cancelados = {c.sale_id for c in session.exec(select(SaleCancellation)).all()}
-    total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO and v.id not in cancelados)
-    total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX and v.id not in cancelados)
-    total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO and v.id not in cancelados)
-    total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO and v.id not in cancelados)
-    esperado_gaveta = caixa.opening_amount + total_din
-
-    caixa.reported_cash_drawer = gaveta
-    caixa.reported_pix_total = pix
-    caixa.reported_debit_total = debito
-    caixa.reported_credit_total = credito
-
-    caixa.diff_cash = round(esperado_gaveta - gaveta, 2)
-    caixa.diff_pix = round(total_pix - pix, 2)
-    caixa.diff_debit = round(total_deb - debito, 2)
-    caixa.diff_credit = round(total_cred - credito, 2)
-    caixa.diff_overall = round(
-        (esperado_gaveta + total_pix + total_deb + total_cred) - (gaveta + pix + debito + credito), 2
-    )
+    esperado = await session.run_sync(_totais_esperados, caixa)
+    lidos = {"gaveta": parse_cents(gaveta), "pix": parse_cents(pix), "debito": parse_cents(debito), "credito": parse_cents(credito)}
+    informado = {chave: valor for chave, valor in lidos.items() if valor is not None and valor >= 0}
+    if len(informado) < len(lidos):
+        return templates.TemplateResponse(
+            "close_cash.html",
+            {
+                "request": request,
+                "user": user,
+                "caixa": caixa,
+                "totais": _em_reais(esperado),
+                "error": "Valores apurados inválidos. Use ponto ou vírgula como separador decimal.",
+                "csrf_token": get_csrf_token(request),
+            },
+            status_code=400,
+        )
+
+    caixa.reported_cash_drawer_cents = informado["gaveta"]
+    caixa.reported_pix_total_cents = informado["pix"]
+    caixa.reported_debit_total_cents = informado["debito"]
+    caixa.reported_credit_total_cents = informado["credito"]
+
+    caixa.diff_cash_cents = esperado["gaveta"] - informado["gaveta"]
+    caixa.diff_pix_cents = esperado["pix"] - informado["pix"]
+    caixa.diff_debit_cents = esperado["debito"] - informado["debito"]
+    caixa.diff_credit_cents = esperado["credito"] - informado["credito"]
+    caixa.diff_overall_cents = sum(esperado[k] for k in informado) - sum(informado.values())
     caixa.status = StatusEnum.closed
     caixa.closed_at = datetime.utcnow()
 
     session.add(caixa)
-    session.commit()
+    await session.run_sync(rebuild_daily_summary, caixa.data, caixa.data)
+    await session.run_sync(invalidate_open_cash_session)
+    await session.commit()
 
     return RedirectResponse(f"/caixa/comprovante-fechamento/{caixa.id}", status_code=302)
 
 
 @router.get("/comprovante-fechamento/{caixa_id}", response_class=HTMLResponse)
-async def comprovante_fechamento(caixa_id: int, request: Request, user: User = Depends(login_required), session: Session = Depends(get_session)):
-    caixa = session.get(CashSession, caixa_id)
+async def comprovante_fechamento(caixa_id: int, request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    caixa = await session.get(CashSession, caixa_id)
     if not caixa:
         return RedirectResponse("/caixa/status", status_code=302)
 
-    vendas = session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all()
-    from app.models import SaleCancellation
-    cancelados = {c.sale_id for c in session.exec(select(SaleCancellation)).all()}
-    total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO and v.id not in cancelados)
-    total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX and v.id not in cancelados)
-    total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO and v.id not in cancelados)
-    total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO and v.id not in cancelados)
-    esperado_gaveta = caixa.opening_amount + total_din
-
     # Identifica usuários
-    opened_by = session.get(User, caixa.opened_by_id) if caixa.opened_by_id else None
-    opened_by_name = opened_by.full_name if opened_by else str(caixa.opened_by_id)
+    nomes = await session.run_sync(user_names, [caixa.opened_by_id])
+    opened_by_name = nomes.get(caixa.opened_by_id, str(caixa.opened_by_id))
     closed_by_name = user.full_name  # melhor esforço: usuário que está emitindo/fechou
+    totais = _em_reais(await session.run_sync(_totais_esperados, caixa))
+
+    # Caixa fechado: o corpo do comprovante só muda se os totais mudarem (cancelamento posterior)
+    chave = None
+    if caixa.status == StatusEnum.closed:
+        chave = (caixa.id, caixa.closed_at, tuple(sorted(totais.items())), opened_by_name, closed_by_name)
+    corpo = render_fragment(
+        "partials/receipt_close_body.html",
+        chave,
+        caixa=caixa,
+        totais=totais,
+        opened_by_name=opened_by_name,
+        closed_by_name=closed_by_name,
+    )
 
     return templates.TemplateResponse(
         "receipt_close.html",
         {
             "request": request,
             "user": user,
-            "caixa": caixa,
-            "totais": {
-                "dinheiro": total_din,
-                "pix": total_pix,
-                "debito": total_deb,
-                "credito": total_cred,
-                "gaveta": esperado_gaveta,
-            },
-            "opened_by_name": opened_by_name,
-            "closed_by_name": closed_by_name,
-            "fmt_dt": format_brt,
+            "corpo": corpo,
             "csrf_token": get_csrf_token(request),
         },
     )
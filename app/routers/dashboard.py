@@ -1,90 +1,166 @@
-from datetime import date
+import os
+from datetime import date, datetime, timezone
+from typing import Any
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlalchemy import func
+from sqlmodel import Session, col, select
 
 from app.db import get_session
 from app.deps import get_csrf_token, login_required
 from app.models import CashSession, PaymentMethodEnum, Sale, User
+from app.report_cache import cached
+from app.templating import templates
+from app.timeseries import DIAS_SEMANA, comparisons, heatmap, trailing_averages
+from app.totals import aggregate_by_method, not_cancelled
+from app.utils import brt_hour, cents_to_reais, today_brt
+
+DASHBOARD_CACHE_SECONDS = float(os.getenv("DASHBOARD_CACHE_SECONDS", "5"))
 
 router = APIRouter(prefix="/dashboard")
-templates = Jinja2Templates(directory="app/templates")
 
 
-@router.get("/", response_class=HTMLResponse)
-async def dashboard_index(
-    request: Request,
-    user: User = Depends(login_required),
-    session: Session = Depends(get_session),
-):
-    hoje = date.today()
-    inicio_mes = date(hoje.year, hoje.month, 1)
+def _indicadores(session: Session, hoje: date) -> dict[str, Any]:
+    """KPIs do mês corrente, top produtos, ranking de operadores e totais por forma.
 
-    # KPIs do mês
-    vendas_mes = session.exec(
-        select(Sale)
-        .join(CashSession)
-        .where(CashSession.data >= inicio_mes)
-    ).all()
+    Tudo agregado no banco, sem as vendas canceladas: uma consulta por agrupamento.
+    """
+    inicio_mes = date(hoje.year, hoje.month, 1)
+    do_mes = (
+        Sale.cash_session_id.in_(  # type: ignore[attr-defined]
+            select(CashSession.id).where(CashSession.data >= inicio_mes, CashSession.data <= hoje)
+        ),
+        not_cancelled(),
+    )
+    qtd = func.count(col(Sale.id))
+    total = func.sum(Sale.amount_cents)
 
-    total_vendas_mes = sum(v.amount for v in vendas_mes)
-    qtd_vendas_mes = len(vendas_mes)
+    # KPIs do mês (centavos) a partir dos totais por forma de pagamento
+    agregados = aggregate_by_method(session, *do_mes, excluir_cancelados=False)
+    total_mes_cents = sum(total for _qtd, total in agregados.values())
+    qtd_vendas_mes = sum(qtd for qtd, _total in agregados.values())
     dias_mes = (hoje - inicio_mes).days + 1
-    media_diaria = total_vendas_mes / dias_mes if dias_mes > 0 else 0
-    ticket_medio = total_vendas_mes / qtd_vendas_mes if qtd_vendas_mes > 0 else 0
 
-    # Top 10 produtos
-    from collections import Counter
-    produtos_counter = Counter(v.product_code for v in vendas_mes)
     top_produtos = [
-        {"codigo": k, "qtd": v, "total": sum(venda.amount for venda in vendas_mes if venda.product_code == k)}
-        for k, v in produtos_counter.most_common(10)
+        {"codigo": codigo, "qtd": qtd_produto, "total": cents_to_reais(total_produto)}
+        for codigo, qtd_produto, total_produto in session.exec(
+            select(Sale.product_code, qtd, total)
+            .where(*do_mes)
+            .group_by(Sale.product_code)
+            .order_by(qtd.desc(), Sale.product_code)
+            .limit(10)
+        ).all()
+    ]
+
+    # Nome do operador vem no próprio JOIN
+    ranking_operadores = [
+        {"nome": nome, "qtd": qtd_operador, "total": cents_to_reais(total_operador)}
+        for nome, qtd_operador, total_operador in session.exec(
+            select(User.full_name, qtd, total)
+            .join(User, User.id == Sale.operator_id)  # type: ignore[arg-type]
+            .where(*do_mes)
+            .group_by(col(User.id), User.full_name)
+            .order_by(total.desc(), User.full_name)
+            .limit(10)
+        ).all()
     ]
 
-    # Ranking operadores
-    operadores_stats: dict[int, dict[str, float]] = {}
-    for venda in vendas_mes:
-        if venda.operator_id not in operadores_stats:
-            operadores_stats[venda.operator_id] = {"qtd": 0.0, "total": 0.0}
-        operadores_stats[venda.operator_id]["qtd"] += 1
-        operadores_stats[venda.operator_id]["total"] += venda.amount
-
-    ranking_operadores: list[dict[str, object]] = []
-    for op_id, stats in operadores_stats.items():
-        operador = session.get(User, op_id)
-        if operador:
-            ranking_operadores.append({
-                "nome": operador.full_name,
-                "qtd": stats["qtd"],
-                "total": stats["total"]
-            })
-    ranking_operadores.sort(key=lambda x: -float(x.get("total", 0)), reverse=False)  # type: ignore[arg-type]
-
-    # Vendas por forma de pagamento
     vendas_por_forma = {
-        "DINHEIRO": sum(v.amount for v in vendas_mes if v.payment_method == PaymentMethodEnum.DINHEIRO),
-        "PIX": sum(v.amount for v in vendas_mes if v.payment_method == PaymentMethodEnum.PIX),
-        "DEBITO": sum(v.amount for v in vendas_mes if v.payment_method == PaymentMethodEnum.DEBITO),
-        "CREDITO": sum(v.amount for v in vendas_mes if v.payment_method == PaymentMethodEnum.CREDITO),
+        forma.value: cents_to_reais(agregados.get(forma, (0, 0))[1]) for forma in PaymentMethodEnum
     }
 
+    return {
+        "kpis": {
+            "total_mes": cents_to_reais(total_mes_cents),
+            "qtd_vendas": qtd_vendas_mes,
+            "media_diaria": cents_to_reais(total_mes_cents // dias_mes),
+            "ticket_medio": cents_to_reais(total_mes_cents // qtd_vendas_mes) if qtd_vendas_mes else 0,
+        },
+        "top_produtos": top_produtos,
+        "ranking_operadores": ranking_operadores,
+        "vendas_por_forma": vendas_por_forma,
+        "mes_referencia": inicio_mes.strftime("%B/%Y"),
+    }
+
+
+# Rota síncrona (def): o FastAPI a executa no threadpool, então relatórios pesados
+# não travam o event loop que atende /vendas/nova.
+@router.get("/", response_class=HTMLResponse)
+def dashboard_index(
+    request: Request,
+    user: User = Depends(login_required),
+    session: Session = Depends(get_session),
+):
+    hoje = today_brt()
+    # O mês corrente quase sempre tem caixa aberto: a entrada vale até a próxima venda, e
+    # durante DASHBOARD_CACHE_SECONDS é servida sem nem consultar as versões no banco
+    indicadores = cached(
+        session, "dashboard", hoje, False, lambda: _indicadores(session, hoje), ttl=DASHBOARD_CACHE_SECONDS
+    )
     return templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
             "user": user,
-            "kpis": {
-                "total_mes": total_vendas_mes,
-                "qtd_vendas": qtd_vendas_mes,
-                "media_diaria": media_diaria,
-                "ticket_medio": ticket_medio,
-            },
-            "top_produtos": top_produtos,
-            "ranking_operadores": ranking_operadores[:10],
-            "vendas_por_forma": vendas_por_forma,
-            "mes_referencia": inicio_mes.strftime("%B/%Y"),
+            **indicadores,
+            "csrf_token": get_csrf_token(request),
+        },
+    )
+
+
+ROTULOS_PERIODO = {"dia": "Hoje × ontem", "semana": "Semana × anterior", "mes": "Mês × anterior", "ano": "Ano × anterior"}
+
+
+def _series(session: Session, agora: datetime) -> dict[str, Any]:
+    """Comparações, mapa de calor e médias móveis, a partir das vendas por hora."""
+    comparacoes = [
+        {
+            "rotulo": ROTULOS_PERIODO[item["periodo"]],
+            "total": cents_to_reais(item["total_cents"]),
+            "anterior": cents_to_reais(item["total_anterior_cents"]),
+            "variacao": item["variacao"],
+        }
+        for item in comparisons(session, agora)
+    ]
+    matriz = heatmap(session, agora.date())
+    maior = max(max(linha) for linha in matriz) or 1
+    mapa_calor = [
+        {"dia": DIAS_SEMANA[dia], "celulas": [(cents_to_reais(total), round(total / maior, 2)) for total in linha]}
+        for dia, linha in enumerate(matriz)
+    ]
+    medias = [
+        {
+            "data": item["data"],
+            "total": cents_to_reais(item["total_cents"]),
+            "media_7": cents_to_reais(item["media_7"]),
+            "media_28": cents_to_reais(item["media_28"]),
+        }
+        for item in trailing_averages(session, agora.date())
+    ]
+    return {"comparacoes": comparacoes, "mapa_calor": mapa_calor, "medias_moveis": medias}
+
+
+@router.get("/executivo", response_class=HTMLResponse)
+def dashboard_executivo(
+    request: Request,
+    user: User = Depends(login_required),
+    session: Session = Depends(get_session),
+):
+    agora = brt_hour(datetime.now(timezone.utc))
+    hoje = agora.date()
+    # Chave própria: a entrada (e o TTL) não se mistura com a da página principal
+    indicadores = cached(
+        session, "dashboard_executivo", hoje, False, lambda: _indicadores(session, hoje), ttl=DASHBOARD_CACHE_SECONDS
+    )
+    series = cached(session, "executivo", agora, False, lambda: _series(session, agora), ttl=DASHBOARD_CACHE_SECONDS)
+    return templates.TemplateResponse(
+        "dashboard_executive.html",
+        {
+            "request": request,
+            "user": user,
+            **indicadores,
+            **series,
             "csrf_token": get_csrf_token(request),
         },
     )
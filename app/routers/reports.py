@@ -1,21 +1,31 @@
-from datetime import date, datetime
+from dataclasses import replace
 
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import Session
 
 from app.db import get_session
 from app.deps import get_csrf_token, login_required
-from app.models import CashSession, PaymentMethodEnum, Sale, SaleCancellation, StatusEnum, User
-from app.utils import format_brt, format_date_br, payment_label
+from app.models import User
+from app.sales_query import (
+    VALIDAS,
+    cached_aggregate,
+    parse_filters,
+    query_string,
+    sales_page,
+    sessions_in_period,
+)
+from app.templating import templates
+from app.totals import by_method_to_totals, cancelled_ids
+from app.utils import cents_to_reais
 
 router = APIRouter(prefix="/relatorios")
-templates = Jinja2Templates(directory="app/templates")
 
 
+# Rota síncrona (def): o FastAPI a executa no threadpool, então relatórios pesados
+# não travam o event loop que atende /vendas/nova.
 @router.get("/", response_class=HTMLResponse)
-async def relatorios_index(
+def relatorios_index(
     request: Request,
     user: User = Depends(login_required),
     session: Session = Depends(get_session),
@@ -23,45 +33,26 @@ async def relatorios_index(
     data_fim: str | None = Query(default=None),
 ):
     # período no formato YYYY-MM-DD; default hoje->hoje
-    try:
-        dt_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date() if data_inicio else date.today()
-    except Exception:
-        dt_inicio = date.today()
-    try:
-        dt_fim = datetime.strptime(data_fim, "%Y-%m-%d").date() if data_fim else dt_inicio
-    except Exception:
-        dt_fim = dt_inicio
+    filtros = parse_filters(data_inicio, data_fim)
+    dt_inicio, dt_fim = filtros.inicio, filtros.fim
 
     # Recupera caixas no período (inclusive)
-    caixas = list(session.exec(select(CashSession).where(CashSession.data >= dt_inicio, CashSession.data <= dt_fim)).all())
+    caixas = sessions_in_period(session, filtros)
     caixa_unico = caixas[0] if len(caixas) == 1 else None
 
-    # Vendas do período
-    vendas: list[Sale] = []
-    if caixas:
-        ids = [c.id for c in caixas if c.id]
-        if ids:
-            # Busca todas e filtra em memória (simples e suficiente para este PDV)
-            vendas_todas = list(session.exec(select(Sale)).all())
-            vendas = [v for v in vendas_todas if v.cash_session_id in ids]
+    # Primeira página das vendas do período, inclusive as canceladas (marcadas na lista)
+    vendas, proximo_cursor = sales_page(session, filtros)
+    cancelados_ids = cancelled_ids(session, vendas)
 
-    # Cancelamentos
-    cancelamentos = list(session.exec(select(SaleCancellation)).all())
-    cancelados_ids: set[int] = {c.sale_id for c in cancelamentos}
-
-    # KPIs do período
-    vendas_validas = [v for v in vendas if v.id not in cancelados_ids]
-    total_geral = sum(v.amount for v in vendas_validas)
-    qtd_vendas = len(vendas_validas)
+    # KPIs do período: agregados no banco, em centavos, sem as canceladas
+    agregados = cached_aggregate(session, replace(filtros, cancelamento=VALIDAS))
+    por_forma = by_method_to_totals(agregados)
+    total_geral = cents_to_reais(sum(por_forma.values()))
+    qtd_vendas = sum(qtd for qtd, _total in agregados.values())
     dias = (dt_fim - dt_inicio).days + 1
     media_diaria = (total_geral / dias) if dias > 0 else 0.0
     ticket_medio = (total_geral / qtd_vendas) if qtd_vendas > 0 else 0.0
 
-    total_din = sum(v.amount for v in vendas_validas if v.payment_method == PaymentMethodEnum.DINHEIRO)
-    total_pix = sum(v.amount for v in vendas_validas if v.payment_method == PaymentMethodEnum.PIX)
-    total_deb = sum(v.amount for v in vendas_validas if v.payment_method == PaymentMethodEnum.DEBITO)
-    total_cred = sum(v.amount for v in vendas_validas if v.payment_method == PaymentMethodEnum.CREDITO)
-
     return templates.TemplateResponse(
         "reports.html",
         {
@@ -72,20 +63,41 @@ async def relatorios_index(
             "caixa": caixa_unico,
             "caixas": caixas,
             "vendas": vendas,
+            "proximo_cursor": proximo_cursor,
+            "filtros_qs": query_string(filtros),
             "totais": {
                 "geral": total_geral,
                 "qtd": qtd_vendas,
                 "media_diaria": media_diaria,
                 "ticket_medio": ticket_medio,
-                "dinheiro": total_din,
-                "pix": total_pix,
-                "debito": total_deb,
-                "credito": total_cred,
+                **{chave: cents_to_reais(valor) for chave, valor in por_forma.items()},
             },
-            "fmt_dt": format_brt,
-            "fmt_date": format_date_br,
-            "payment_label": payment_label,
             "cancelados_ids": cancelados_ids,
             "csrf_token": get_csrf_token(request),
         },
     )
+
+
+@router.get("/vendas", response_class=HTMLResponse)
+def relatorios_vendas(
+    request: Request,
+    user: User = Depends(login_required),
+    session: Session = Depends(get_session),
+    data_inicio: str | None = Query(default=None),
+    data_fim: str | None = Query(default=None),
+    depois_de: str | None = Query(default=None),
+):
+    """Próxima página da lista de vendas do relatório (linhas da tabela, para hx-swap)."""
+    filtros = parse_filters(data_inicio, data_fim)
+    vendas, proximo_cursor = sales_page(session, filtros, depois_de)
+    return templates.TemplateResponse(
+        "partials/report_rows.html",
+        {
+            "request": request,
+            "user": user,
+            "vendas": vendas,
+            "proximo_cursor": proximo_cursor,
+            "filtros_qs": query_string(filtros),
+            "cancelados_ids": cancelled_ids(session, vendas),
+        },
+    )
@@ -1,88 +1,48 @@
-import csv
-import io
-from datetime import date, datetime
-
-from fastapi import APIRouter, Depends, Query, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import cm
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from sqlmodel import Session, select
 
+from app.analytics import kpi_tables
 from app.db import get_session
-from app.deps import get_csrf_token, login_required
-from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum, User
-from app.utils import format_brt, format_date_br, payment_label
+from app.deps import csrf_protect, get_csrf_token, login_required
+from app.export_jobs import FORMATOS, artifact_path, get_job, submit_export
+from app.exports import accepts_gzip, csv_chunks, file_chunks, gzip_chunks, parquet_file, pdf_file
+from app.models import User
+from app.sales_query import cached_aggregate, parse_filters, query_string, sales_page
+from app.templating import templates
+from app.totals import by_method_to_totals
+from app.utils import cents_to_reais
 
 router = APIRouter(prefix="/relatorios")
-templates = Jinja2Templates(directory="app/templates")
 
 
-@router.get("/", response_class=HTMLResponse)
-async def relatorios_index(
+# Rota síncrona (def): o FastAPI a executa no threadpool, então relatórios pesados
+# não travam o event loop que atende /vendas/nova.
+@router.get("/avancado", response_class=HTMLResponse)
+def relatorios_index(
     request: Request,
     user: User = Depends(login_required),
     session: Session = Depends(get_session),
     data_inicio: str | None = Query(default=None),
     data_fim: str | None = Query(default=None),
-    operador_id: int | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
     forma_pagamento: str | None = Query(default=None),
     status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
 ):
     """Relatórios com filtros avançados."""
-    # Parse datas
-    try:
-        dt_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date() if data_inicio else date.today()
-    except Exception:
-        dt_inicio = date.today()
-
-    try:
-        dt_fim = datetime.strptime(data_fim, "%Y-%m-%d").date() if data_fim else dt_inicio
-    except Exception:
-        dt_fim = dt_inicio
-
-    # Busca caixas no período
-    query_caixas = select(CashSession).where(
-        CashSession.data >= dt_inicio,
-        CashSession.data <= dt_fim
-    )
-
-    if status_caixa:
-        query_caixas = query_caixas.where(CashSession.status == StatusEnum(status_caixa))
-
-    caixas = session.exec(query_caixas).all()
-    caixas_ids = [c.id for c in caixas if c.id]
-
-    # Busca vendas
-    vendas: list[Sale] = []
-    if caixas_ids:
-        # Busca todas as vendas e filtra em memória (simples e funcional para PDV)
-        vendas_todas = list(session.exec(select(Sale)).all())
-        vendas = [v for v in vendas_todas if v.cash_session_id in caixas_ids]
-
-        if operador_id:
-            vendas = [v for v in vendas if v.operator_id == operador_id]
-
-        if forma_pagamento:
-            vendas = [v for v in vendas if v.payment_method == PaymentMethodEnum(forma_pagamento)]
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    dt_inicio, dt_fim = filtros.inicio, filtros.fim
 
-    # Totais
-    total_geral = sum(v.amount for v in vendas)
-    total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO)
-    total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX)
-    total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO)
-    total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO)
+    # Primeira página das vendas; os totais vêm do agregado, independentes da página
+    vendas, proximo_cursor = sales_page(session, filtros)
+    agregados = cached_aggregate(session, filtros)
+    por_forma = by_method_to_totals(agregados)
 
     totais = {
-        "geral": total_geral,
-        "dinheiro": total_din,
-        "pix": total_pix,
-        "debito": total_deb,
-        "credito": total_cred,
-        "qtd_vendas": len(vendas),
+        "geral": cents_to_reais(sum(por_forma.values())),
+        **{chave: cents_to_reais(valor) for chave, valor in por_forma.items()},
+        "qtd_vendas": sum(qtd for qtd, _total in agregados.values()),
     }
 
     # Lista de operadores para filtro
@@ -96,170 +56,163 @@ async def relatorios_index(
             "dt_inicio": dt_inicio,
             "dt_fim": dt_fim,
             "vendas": vendas,
+            "proximo_cursor": proximo_cursor,
             "totais": totais,
             "operadores": operadores,
-            "filtro_operador_id": operador_id,
+            "filtro_operador_id": filtros.operador_id,
             "filtro_forma": forma_pagamento,
             "filtro_status": status_caixa,
-            "fmt_dt": format_brt,
-            "fmt_date": format_date_br,
-            "payment_label": payment_label,
+            "filtro_cancelamento": filtros.cancelamento,
+            "filtros_qs": query_string(filtros),
             "csrf_token": get_csrf_token(request),
         },
     )
 
 
-@router.get("/exportar/csv")
-async def exportar_csv(
+@router.get("/avancado/vendas", response_class=HTMLResponse)
+def relatorios_vendas(
+    request: Request,
     user: User = Depends(login_required),
     session: Session = Depends(get_session),
     data_inicio: str | None = Query(default=None),
     data_fim: str | None = Query(default=None),
-    operador_id: int | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
     forma_pagamento: str | None = Query(default=None),
+    status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
+    depois_de: str | None = Query(default=None),
 ):
-    """Exporta relatório em CSV."""
-    # Parse datas
-    try:
-        dt_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date() if data_inicio else date.today()
-    except Exception:
-        dt_inicio = date.today()
-
-    try:
-        dt_fim = datetime.strptime(data_fim, "%Y-%m-%d").date() if data_fim else dt_inicio
-    except Exception:
-        dt_fim = dt_inicio
-
-    # Busca vendas (mesma lógica do relatório)
-    query_caixas = select(CashSession).where(
-        CashSession.data >= dt_inicio,
-        CashSession.data <= dt_fim
+    """Próxima página da lista de vendas (linhas da tabela, para hx-swap)."""
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    vendas, proximo_cursor = sales_page(session, filtros, depois_de)
+    return templates.TemplateResponse(
+        "partials/report_advanced_rows.html",
+        {
+            "request": request,
+            "user": user,
+            "vendas": vendas,
+            "proximo_cursor": proximo_cursor,
+            "filtros_qs": query_string(filtros),
+        },
     )
-    caixas = session.exec(query_caixas).all()
-    caixas_ids = [c.id for c in caixas if c.id]
 
-    vendas: list[Sale] = []
-    if caixas_ids:
-        vendas_todas = list(session.exec(select(Sale)).all())
-        vendas = [v for v in vendas_todas if v.cash_session_id in caixas_ids]
 
-        if operador_id:
-            vendas = [v for v in vendas if v.operator_id == operador_id]
+@router.get("/avancado/analise", response_class=HTMLResponse)
+def relatorios_analise(
+    request: Request,
+    user: User = Depends(login_required),
+    session: Session = Depends(get_session),
+    data_inicio: str | None = Query(default=None),
+    data_fim: str | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
+    forma_pagamento: str | None = Query(default=None),
+    status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
+):
+    """KPIs do período por dia, operador, forma de pagamento e produto (carregados após a página)."""
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    return templates.TemplateResponse(
+        "partials/report_analytics.html",
+        {"request": request, "user": user, "tabelas": kpi_tables(session, filtros)},
+    )
 
-        if forma_pagamento:
-            vendas = [v for v in vendas if v.payment_method == PaymentMethodEnum(forma_pagamento)]
 
-    # Gera CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Data/Hora", "Código Produto", "Valor", "Forma Pagamento", "Operador ID"])
+@router.get("/exportar/csv")
+def exportar_csv(
+    request: Request,
+    user: User = Depends(login_required),
+    data_inicio: str | None = Query(default=None),
+    data_fim: str | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
+    forma_pagamento: str | None = Query(default=None),
+    status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
+):
+    """Exporta relatório em CSV, em fluxo (gzip quando o cliente aceita)."""
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    headers = {
+        "Content-Disposition": f"attachment; filename=relatorio_{filtros.inicio}_a_{filtros.fim}.csv",
+        "Vary": "Accept-Encoding",
+    }
+    blocos = csv_chunks(filtros)
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        blocos = gzip_chunks(blocos)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(blocos, media_type="text/csv; charset=utf-8", headers=headers)
 
-    for venda in vendas:
-        writer.writerow([
-            venda.id,
-            format_brt(venda.created_at),
-            venda.product_code,
-            f"{venda.amount:.2f}",
-            payment_label(venda.payment_method),
-            venda.operator_id,
-        ])
 
-    output.seek(0)
+@router.get("/exportar/pdf")
+def exportar_pdf(
+    user: User = Depends(login_required),
+    data_inicio: str | None = Query(default=None),
+    data_fim: str | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
+    forma_pagamento: str | None = Query(default=None),
+    status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
+):
+    """Exporta relatório em PDF (resumo, listagem por página e subtotais por dia)."""
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=relatorio_{dt_inicio}_a_{dt_fim}.csv"}
+        file_chunks(pdf_file(filtros)),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=relatorio_{filtros.inicio}_a_{filtros.fim}.pdf"},
     )
 
 
-@router.get("/exportar/pdf")
-async def exportar_pdf(
+@router.get("/exportar/parquet")
+def exportar_parquet(
     user: User = Depends(login_required),
-    session: Session = Depends(get_session),
     data_inicio: str | None = Query(default=None),
     data_fim: str | None = Query(default=None),
-    operador_id: int | None = Query(default=None),
+    operador_id: str | None = Query(default=None),
     forma_pagamento: str | None = Query(default=None),
+    status_caixa: str | None = Query(default=None),
+    cancelamento: str | None = Query(default=None),
 ):
-    """Exporta relatório em PDF."""
-    # Parse datas
-    try:
-        dt_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date() if data_inicio else date.today()
-    except Exception:
-        dt_inicio = date.today()
-
-    try:
-        dt_fim = datetime.strptime(data_fim, "%Y-%m-%d").date() if data_fim else dt_inicio
-    except Exception:
-        dt_fim = dt_inicio
-
-    # Busca vendas
-    query_caixas = select(CashSession).where(
-        CashSession.data >= dt_inicio,
-        CashSession.data <= dt_fim
+    """Exporta as vendas em Parquet (colunas tipadas, para análise no financeiro)."""
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    return StreamingResponse(
+        file_chunks(parquet_file(filtros)),
+        media_type=FORMATOS["parquet"],
+        headers={"Content-Disposition": f"attachment; filename=relatorio_{filtros.inicio}_a_{filtros.fim}.parquet"},
     )
-    caixas = session.exec(query_caixas).all()
-    caixas_ids = [c.id for c in caixas if c.id]
-
-    vendas: list[Sale] = []
-    if caixas_ids:
-        vendas_todas = list(session.exec(select(Sale)).all())
-        vendas = [v for v in vendas_todas if v.cash_session_id in caixas_ids]
-
-        if operador_id:
-            vendas = [v for v in vendas if v.operator_id == operador_id]
-
-        if forma_pagamento:
-            vendas = [v for v in vendas if v.payment_method == PaymentMethodEnum(forma_pagamento)]
-
-    # Totais
-    total_geral = sum(v.amount for v in vendas)
-
-    # Gera PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-
-    # Título
-    title = Paragraph(f"<b>Relatório de Vendas</b><br/>Período: {format_date_br(dt_inicio)} a {format_date_br(dt_fim)}", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 0.5*cm))
-
-    # Tabela de vendas
-    data_table = [["ID", "Data/Hora", "Produto", "Valor", "Pagamento"]]
-    for venda in vendas:
-        data_table.append([
-            str(venda.id),
-            format_brt(venda.created_at),
-            venda.product_code[:15],
-            f"R$ {venda.amount:.2f}",
-            payment_label(venda.payment_method),
-        ])
 
-    # Total
-    data_table.append(["", "", "", f"R$ {total_geral:.2f}", ""])
 
-    table = Table(data_table, colWidths=[1.5*cm, 4*cm, 4*cm, 3*cm, 3*cm])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-    ]))
-
-    story.append(table)
-    doc.build(story)
-
-    buffer.seek(0)
-    return StreamingResponse(
-        iter([buffer.getvalue()]),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=relatorio_{dt_inicio}_a_{dt_fim}.pdf"}
-    )
+# Exportações em segundo plano: o arquivo é gerado fora da requisição e a página
+# acompanha o progresso pelo HTMX até o download ficar disponível.
+@router.post("/exportacoes", response_class=HTMLResponse)
+def exportacao_criar(
+    request: Request,
+    formato: str = Form(...),
+    csrf_token: str = Form(alias="_csrf"),
+    user: User = Depends(login_required),
+    data_inicio: str | None = Form(default=None),
+    data_fim: str | None = Form(default=None),
+    operador_id: str | None = Form(default=None),
+    forma_pagamento: str | None = Form(default=None),
+    status_caixa: str | None = Form(default=None),
+    cancelamento: str | None = Form(default=None),
+):
+    csrf_protect(request, csrf_token)
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato de exportação inválido")
+    filtros = parse_filters(data_inicio, data_fim, operador_id, forma_pagamento, status_caixa, cancelamento)
+    job = submit_export(formato, filtros, user.id)
+    return templates.TemplateResponse("partials/export_job.html", {"request": request, "user": user, "job": job})
+
+
+@router.get("/exportacoes/{job_id}", response_class=HTMLResponse)
+def exportacao_status(job_id: str, request: Request, user: User = Depends(login_required)):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada ou expirada")
+    return templates.TemplateResponse("partials/export_job.html", {"request": request, "user": user, "job": job})
+
+
+@router.get("/exportacoes/{job_id}/arquivo")
+def exportacao_arquivo(job_id: str, user: User = Depends(login_required)):
+    job = get_job(job_id)
+    if job is None or job["status"] != "pronto" or not artifact_path(job).exists():
+        raise HTTPException(status_code=404, detail="Exportação não encontrada ou expirada")
+    return FileResponse(artifact_path(job), media_type=FORMATOS[job["formato"]], filename=job["nome"])
@@ -1,44 +1,140 @@
-from datetime import date, datetime
-import pytz
+import json
+from collections.abc import AsyncIterator
+from functools import partial
+from typing import Any
 
-from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+import anyio.to_thread
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, col, select
 
-from app.db import get_session
+from app.db import AsyncSession, engine, get_async_session
 from app.deps import admin_required, csrf_protect, get_csrf_token, login_required
-from passlib.hash import pbkdf2_sha256
-from app.models import AuditLog, CashSession, PaymentMethodEnum, Sale, SaleCancellation, StatusEnum, User
-from app.utils import format_brt, payment_label
+from app.live_totals import subscribe
+from app.models import (
+    AuditLog,
+    CashSession,
+    PaymentMethodEnum,
+    Sale,
+    SaleCancellation,
+    StatusEnum,
+    User,
+)
+from app.open_cash import get_open_cash_session
+from app.passwords import verify_password
+from app.rate_limit import password_attempt, password_succeeded
+from app.report_cache import bump_sales_version
+from app.templating import templates
+from app.totals import apply_sale, apply_sales, cancelled_ids, session_totals, session_totals_cents
+from app.users import user_names
+from app.utils import parse_cents
+from app.write_queue import run_write
 
 router = APIRouter(prefix="/vendas")
-templates = Jinja2Templates(directory="app/templates")
+
+# Quantidade de vendas por página na lista "Vendas do Dia"
+PAGINA_VENDAS = 50
+# Máximo de vendas aceitas por chamada de /vendas/lote
+LOTE_MAXIMO = 500
+
+
+def _pagina_vendas(session: Session, caixa_id: int, antes_de: int | None = None) -> tuple[list[Sale], int | None]:
+    """Vendas do caixa, mais recentes primeiro, paginadas por id (usa o índice de cash_session_id).
+
+    Retorna a página e o id a partir do qual buscar a próxima (ou None se acabou).
+    """
+    query = select(Sale).where(Sale.cash_session_id == caixa_id)
+    if antes_de:
+        query = query.where(col(Sale.id) < antes_de)
+    vendas = list(session.exec(query.order_by(Sale.id.desc()).limit(PAGINA_VENDAS + 1)).all())  # type: ignore[union-attr]
+    if len(vendas) <= PAGINA_VENDAS:
+        return vendas, None
+    vendas = vendas[:PAGINA_VENDAS]
+    return vendas, vendas[-1].id
+
+
+# Escritas: funções síncronas executadas por ``run_write`` (escritor em grupo ou sessão da requisição).
+# Recebem só dados simples e montam os objetos, pois podem ser reexecutadas em outra transação.
+
+
+def _gravar_venda(session: Session, **dados: Any) -> Sale:
+    venda = Sale(**dados)
+    session.add(venda)
+    apply_sale(session, venda)
+    return venda
+
+
+def _gravar_cancelamento(session: Session, venda_id: int, motivo: str, usuario_id: int) -> bool:
+    venda = session.get(Sale, venda_id)
+    if not venda or session.exec(select(SaleCancellation.id).where(SaleCancellation.sale_id == venda_id)).first():
+        return False
+    session.add(SaleCancellation(sale_id=venda_id, reason=motivo, canceled_by_id=usuario_id))
+    apply_sale(session, venda, sinal=-1)
+    session.add(
+        AuditLog(
+            action="cancel_sale",
+            entity_type="sale",
+            entity_id=venda_id,
+            user_id=usuario_id,
+            details=json.dumps({
+                "reason": motivo,
+                "product_code": venda.product_code,
+                "amount": venda.amount,
+                "payment_method": str(venda.payment_method),
+                "operator_id": venda.operator_id,
+            }),
+        )
+    )
+    return True
+
+
+def _excluir_venda(session: Session, venda_id: int, usuario_id: int) -> bool:
+    venda = session.get(Sale, venda_id)
+    if not venda:
+        return False
+    # Registra auditoria antes de excluir
+    session.add(
+        AuditLog(
+            action="delete_sale",
+            entity_type="sale",
+            entity_id=venda_id,
+            user_id=usuario_id,
+            details=json.dumps({
+                "product_code": venda.product_code,
+                "amount": venda.amount,
+                "payment_method": str(venda.payment_method),
+                "operator_id": venda.operator_id,
+            }),
+        )
+    )
+    cancelamento = session.exec(select(SaleCancellation).where(SaleCancellation.sale_id == venda_id)).first()
+    if cancelamento is not None:
+        # Já fora dos totais, mas ainda listada nos relatórios com canceladas; o
+        # cancelamento sai junto (chave estrangeira) e fica registrado na auditoria
+        caixa = session.get(CashSession, venda.cash_session_id)
+        bump_sales_version(session, caixa_fechado=caixa is not None and caixa.status == StatusEnum.closed)
+        session.delete(cancelamento)
+        session.flush()  # sem relationship, o flush não ordena os DELETEs pela chave estrangeira
+    else:
+        apply_sale(session, venda, sinal=-1)
+    session.delete(venda)
+    return True
 
 
 @router.get("/nova", response_class=HTMLResponse)
-async def nova_venda_get(request: Request, user: User = Depends(login_required), session: Session = Depends(get_session)):
-    tz = pytz.timezone("America/Sao_Paulo")
-    hoje = datetime.now(tz).date()
-    caixa = session.exec(select(CashSession).where(CashSession.data == hoje, CashSession.status == StatusEnum.open)).first()
+async def nova_venda_get(request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    caixa = await session.run_sync(get_open_cash_session)
     vendas: list[Sale] = []
+    proximo_id = None
     totais = None
     cancelados_ids: set[int] = set()
     if caixa:
-        vendas = list(session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all())
-        # cancelar: obter ids cancelados e filtrar totais
-        cancelamentos = list(session.exec(select(SaleCancellation)).all())
-        cancelados_ids = {c.sale_id for c in cancelamentos}
-        total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO)
-        total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX)
-        total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO)
-        total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO)
-        # Excluir canceladas dos totais
-        total_din -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.DINHEIRO)
-        total_pix -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.PIX)
-        total_deb -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.DEBITO)
-        total_cred -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.CREDITO)
-        totais = {"dinheiro": total_din, "pix": total_pix, "debito": total_deb, "credito": total_cred}
+        assert caixa.id is not None
+        vendas, proximo_id = await session.run_sync(_pagina_vendas, caixa.id)
+        cancelados_ids = await session.run_sync(cancelled_ids, vendas)
+        totais = await session.run_sync(session_totals, caixa.id)
     return templates.TemplateResponse(
         "add_sale.html",
         {
@@ -46,15 +142,67 @@ async def nova_venda_get(request: Request, user: User = Depends(login_required),
             "user": user,
             "caixa": caixa,
             "vendas": vendas,
+            "proximo_id": proximo_id,
             "totais": totais,
-            "fmt_dt": format_brt,
-            "payment_label": payment_label,
             "cancelados_ids": cancelados_ids,
             "csrf_token": get_csrf_token(request),
         },
     )
 
 
+@router.get("/eventos")
+async def eventos_totais(request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    """SSE com os totais do caixa aberto (extensão sse do HTMX: eventos ``totais`` e ``esperados``)."""
+    caixa = await session.run_sync(get_open_cash_session)
+    if not caixa or caixa.id is None:
+        return HTMLResponse(status_code=204)  # sem caixa aberto o cliente para de reconectar
+    caixa_id, troco = int(caixa.id), caixa.opening_amount_cents
+
+    async def carregar() -> dict[str, int]:
+        # A sessão da requisição já foi encerrada quando o stream começa
+        with Session(engine) as nova:
+            totais = await anyio.to_thread.run_sync(session_totals_cents, nova, caixa_id)
+        return {**totais, "troco": troco}
+
+    async def mensagens() -> AsyncIterator[str]:
+        async for mensagem in subscribe(caixa_id, carregar):
+            if await request.is_disconnected():
+                break
+            yield mensagem
+
+    return StreamingResponse(
+        mensagens(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/lista", response_class=HTMLResponse)
+async def lista_vendas(
+    request: Request,
+    antes_de: int | None = Query(default=None),
+    user: User = Depends(login_required),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Próxima página da lista "Vendas do Dia" (linhas da tabela, para hx-swap)."""
+    caixa = await session.run_sync(get_open_cash_session)
+    vendas: list[Sale] = []
+    proximo_id = None
+    if caixa and caixa.id:
+        vendas, proximo_id = await session.run_sync(_pagina_vendas, caixa.id, antes_de)
+    cancelados_ids = await session.run_sync(cancelled_ids, vendas)
+    return templates.TemplateResponse(
+        "partials/sales_rows.html",
+        {
+            "request": request,
+            "user": user,
+            "vendas": vendas,
+            "proximo_id": proximo_id,
+            "cancelados_ids": cancelados_ids,
+        },
+    )
+
+
 @router.post("/nova", response_class=HTMLResponse)
 async def nova_venda_post(
     request: Request,
@@ -63,30 +211,20 @@ async def nova_venda_post(
     payment_method: str = Form(...),
     csrf_token: str = Form(alias="_csrf"),
     user: User = Depends(login_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     csrf_protect(request, csrf_token)
-    tz = pytz.timezone("America/Sao_Paulo")
-    hoje = datetime.now(tz).date()
-    caixa = session.exec(select(CashSession).where(CashSession.data == hoje, CashSession.status == StatusEnum.open)).first()
+    caixa = await session.run_sync(get_open_cash_session)
     if not caixa:
         # sem caixa aberto hoje
         return RedirectResponse("/caixa/status", status_code=302)
 
-    # converte valor, aceitando vírgula ou ponto
-    try:
-        amount_val = round(float(str(amount).replace(',', '.').strip()), 2)
-    except Exception:
-        amount_val = None
+    amount_cents = parse_cents(amount)
 
-    if not amount_val or amount_val <= 0:
+    if not amount_cents or amount_cents <= 0:
         # retorna tela com erro
-        vendas = session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all() if caixa else []
-        total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO)
-        total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX)
-        total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO)
-        total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO)
-        totais = {"dinheiro": total_din, "pix": total_pix, "debito": total_deb, "credito": total_cred}
+        assert caixa.id is not None
+        vendas, proximo_id = await session.run_sync(_pagina_vendas, caixa.id)
         return templates.TemplateResponse(
             "add_sale.html",
             {
@@ -94,9 +232,9 @@ async def nova_venda_post(
                 "user": user,
                 "caixa": caixa,
                 "vendas": vendas,
-                "totais": totais,
-                "fmt_dt": format_brt,
-                "payment_label": payment_label,
+                "proximo_id": proximo_id,
+                "totais": await session.run_sync(session_totals, caixa.id),
+                "cancelados_ids": await session.run_sync(cancelled_ids, vendas),
                 "error": "Valor inválido. Use ponto ou vírgula como separador decimal.",
                 "csrf_token": get_csrf_token(request),
             },
@@ -105,57 +243,179 @@ async def nova_venda_post(
 
     assert user.id is not None
     assert caixa.id is not None
-    venda = Sale(
-        product_code=product_code.strip(),
-        amount=amount_val,
-        payment_method=PaymentMethodEnum(payment_method),
-        operator_id=int(user.id),
-        cash_session_id=int(caixa.id),
+    venda = await run_write(
+        session,
+        partial(
+            _gravar_venda,
+            product_code=product_code.strip(),
+            amount_cents=amount_cents,
+            payment_method=PaymentMethodEnum(payment_method),
+            operator_id=int(user.id),
+            cash_session_id=int(caixa.id),
+        ),
     )
-    session.add(venda)
-    session.commit()
 
-    # Se HTMX, devolve atualização de totais (target) + OOB para lista e aciona modal de impressão
+    # Se HTMX, devolve totais (target) + apenas a nova linha via OOB e aciona modal de impressão
     if request.headers.get("HX-Request"):
-        vendas = session.exec(select(Sale).where(Sale.cash_session_id == caixa.id)).all()
-        cancelamentos = list(session.exec(select(SaleCancellation)).all())
-        cancelados_ids = {c.sale_id for c in cancelamentos}
-        total_din = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DINHEIRO)
-        total_pix = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.PIX)
-        total_deb = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.DEBITO)
-        total_cred = sum(v.amount for v in vendas if v.payment_method == PaymentMethodEnum.CREDITO)
-        total_din -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.DINHEIRO)
-        total_pix -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.PIX)
-        total_deb -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.DEBITO)
-        total_cred -= sum(v.amount for v in vendas if v.id in cancelados_ids and v.payment_method == PaymentMethodEnum.CREDITO)
         return templates.TemplateResponse(
             "partials/after_sale_updates.html",
             {
                 "request": request,
-                "totais": {"dinheiro": total_din, "pix": total_pix, "debito": total_deb, "credito": total_cred},
-                "vendas": vendas,
+                "user": user,
+                "totais": await session.run_sync(session_totals, int(caixa.id)),
+                "venda": venda,
                 "recibo_url": f"/vendas/recibo/{venda.id}",
-                "fmt_dt": format_brt,
-                "payment_label": payment_label,
-                "cancelados_ids": cancelados_ids,
             },
         )
     # Fallback sem HTMX: volta para lançar venda (mantém fluxo)
     return RedirectResponse("/vendas/nova", status_code=302)
 
 
+class VendaLoteItem(BaseModel):
+    idempotency_key: str
+    product_code: str
+    amount: str | float
+    payment_method: str
+
+
+class VendaLote(BaseModel):
+    vendas: list[VendaLoteItem]
+
+
+def _ingerir_lote(
+    session: Session, caixa_id: int, operador_id: int, itens: list[VendaLoteItem], por_item: bool = False
+) -> list[dict[str, object]]:
+    """Valida e insere as vendas do lote sem commit; retorna o resultado de cada item.
+
+    As chaves já gravadas são obtidas numa única consulta IN; o índice único em
+    ``Sale.idempotency_key`` garante a deduplicação mesmo com reenvios concorrentes.
+    Com ``por_item`` cada venda é gravada num savepoint próprio, e a que falhar
+    (chave gravada por outro reenvio, valor recusado pelo banco) é marcada no seu
+    resultado sem derrubar as demais.
+    """
+    chaves = {item.idempotency_key.strip() for item in itens}
+    existentes: dict[str, int | None] = {
+        chave: venda_id
+        for chave, venda_id in session.exec(
+            select(Sale.idempotency_key, Sale.id).where(Sale.idempotency_key.in_(chaves))  # type: ignore[union-attr]
+        ).all()
+        if chave
+    }
+    novas: dict[str, Sale] = {}
+    resultados: list[dict[str, object]] = []
+    for item in itens:
+        chave = item.idempotency_key.strip()
+        resultado: dict[str, object] = {"idempotency_key": chave}
+        resultados.append(resultado)
+        if chave in existentes or chave in novas:
+            resultado["status"] = "duplicada"
+            continue
+        valor = parse_cents(item.amount)
+        erro = None
+        if not chave or len(chave) > 64:
+            erro = "Chave de idempotência inválida"
+        elif not item.product_code.strip():
+            erro = "Código do produto obrigatório"
+        elif not valor or valor <= 0:
+            erro = "Valor inválido"
+        elif item.payment_method not in PaymentMethodEnum.__members__:
+            erro = "Forma de pagamento inválida"
+        if erro:
+            resultado.update(status="invalida", erro=erro)
+            continue
+        novas[chave] = Sale(
+            product_code=item.product_code.strip(),
+            amount_cents=valor,
+            payment_method=PaymentMethodEnum(item.payment_method),
+            operator_id=operador_id,
+            cash_session_id=caixa_id,
+            idempotency_key=chave,
+        )
+        resultado["status"] = "criada"
+    if por_item:
+        _gravar_um_a_um(session, novas, existentes, resultados)
+    else:
+        session.add_all(novas.values())
+        apply_sales(session, novas.values())
+        session.flush()
+    for resultado in resultados:
+        chave = str(resultado["idempotency_key"])
+        if chave in novas:
+            resultado["sale_id"] = novas[chave].id
+        elif chave in existentes:
+            resultado["sale_id"] = existentes[chave]
+    return resultados
+
+
+def _gravar_um_a_um(
+    session: Session, novas: dict[str, Sale], existentes: dict[str, int | None], resultados: list[dict[str, object]]
+) -> None:
+    """Grava cada venda num savepoint; as que falham saem de ``novas`` com o motivo no resultado."""
+    por_chave = {str(r["idempotency_key"]): r for r in resultados if r["status"] == "criada"}
+    for chave, venda in list(novas.items()):
+        try:
+            with session.begin_nested():
+                session.add(venda)
+                session.flush()
+                apply_sales(session, [venda])
+        except (SQLAlchemyError, OverflowError):
+            del novas[chave]
+            gravada = session.exec(select(Sale.id).where(Sale.idempotency_key == chave)).first()
+            if gravada is not None:
+                existentes[chave] = gravada
+                por_chave[chave]["status"] = "duplicada"
+            else:
+                por_chave[chave].update(status="invalida", erro="Não foi possível gravar a venda")
+
+
+@router.post("/lote")
+async def lote_vendas(
+    request: Request,
+    lote: VendaLote,
+    x_csrf_token: str = Header(default=""),
+    user: User = Depends(login_required),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Recebe vendas enfileiradas pelo terminal (JSON) e grava todas numa única transação."""
+    csrf_protect(request, x_csrf_token)
+    if len(lote.vendas) > LOTE_MAXIMO:
+        raise HTTPException(status_code=413, detail=f"Lote limitado a {LOTE_MAXIMO} vendas")
+    caixa = await session.run_sync(get_open_cash_session)
+    if not caixa:
+        raise HTTPException(status_code=409, detail="Nenhum caixa aberto hoje")
+    assert caixa.id is not None
+    assert user.id is not None
+    caixa_id, operador_id = int(caixa.id), int(user.id)
+    try:
+        resultados = await session.run_sync(_ingerir_lote, caixa_id, operador_id, lote.vendas)
+        await session.commit()
+    except (SQLAlchemyError, OverflowError):
+        # Outro reenvio gravou alguma chave entre a consulta e o commit (ou o banco recusou um
+        # valor): refaz com as chaves atualizadas, isolando cada venda para apontar a que falhou
+        await session.rollback()
+        resultados = await session.run_sync(_ingerir_lote, caixa_id, operador_id, lote.vendas, True)
+        await session.commit()
+    return {
+        "caixa_id": caixa_id,
+        "criadas": sum(1 for r in resultados if r["status"] == "criada"),
+        "duplicadas": sum(1 for r in resultados if r["status"] == "duplicada"),
+        "invalidas": sum(1 for r in resultados if r["status"] == "invalida"),
+        "resultados": resultados,
+    }
+
+
 @router.get("/cancelar/{venda_id}", response_class=HTMLResponse)
 async def cancelar_venda_get(
     venda_id: int,
     request: Request,
     user: User = Depends(admin_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    venda = session.get(Sale, venda_id)
+    venda = await session.get(Sale, venda_id)
     if not venda:
         return RedirectResponse("/vendas/nova", status_code=302)
     # Verifica se já foi cancelada
-    existente = session.exec(select(SaleCancellation).where(SaleCancellation.sale_id == venda_id)).first()
+    existente = (await session.exec(select(SaleCancellation).where(SaleCancellation.sale_id == venda_id))).first()
     if existente:
         return RedirectResponse("/vendas/nova", status_code=302)
     return templates.TemplateResponse(
@@ -164,8 +424,6 @@ async def cancelar_venda_get(
             "request": request,
             "user": user,
             "venda": venda,
-            "payment_label": payment_label,
-            "fmt_dt": format_brt,
             "csrf_token": get_csrf_token(request),
         },
     )
@@ -179,68 +437,54 @@ async def cancelar_venda_post(
     senha: str = Form(...),
     csrf_token: str = Form(alias="_csrf"),
     user: User = Depends(admin_required),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     csrf_protect(request, csrf_token)
-    venda = session.get(Sale, venda_id)
+    venda = await session.get(Sale, venda_id)
     if not venda:
         return RedirectResponse("/vendas/nova", status_code=302)
     # Impede duplicidade
-    existente = session.exec(select(SaleCancellation).where(SaleCancellation.sale_id == venda_id)).first()
+    existente = (await session.exec(select(SaleCancellation).where(SaleCancellation.sale_id == venda_id))).first()
     if existente:
         return RedirectResponse("/vendas/nova", status_code=302)
-    # Confirma senha do admin logado
-    usuario = session.get(User, user.id) if user.id else None
-    if not usuario or not pbkdf2_sha256.verify(senha, usuario.password_hash):
+    # Confirma senha do admin logado (mesmo limite de tentativas do login)
+    usuario = await session.get(User, user.id) if user.id else None
+    ip = request.client.host if request.client else None
+    espera = password_attempt(user.username, ip)
+    senha_ok = False
+    if usuario and not espera:
+        senha_ok, _novo_hash = await verify_password(senha, usuario.password_hash)
+        if senha_ok:
+            password_succeeded(user.username, ip)
+    if not senha_ok:
         return templates.TemplateResponse(
             "cancel_sale.html",
             {
                 "request": request,
                 "user": user,
                 "venda": venda,
-                "payment_label": payment_label,
-                "fmt_dt": format_brt,
-                "error": "Senha inválida",
+                "error": "Muitas tentativas. Aguarde e tente novamente." if espera else "Senha inválida",
                 "csrf_token": get_csrf_token(request),
             },
-            status_code=400,
+            status_code=429 if espera else 400,
         )
-    # Registra cancelamento
+    # Registra cancelamento (com auditoria)
     assert user.id is not None
-    cancel = SaleCancellation(sale_id=venda_id, reason=motivo.strip(), canceled_by_id=int(user.id))
-    session.add(cancel)
-    # Auditoria
-    import json
-    session.add(
-        AuditLog(
-            action="cancel_sale",
-            entity_type="sale",
-            entity_id=venda_id,
-            user_id=int(user.id),
-            details=json.dumps({
-                "reason": motivo.strip(),
-                "product_code": venda.product_code,
-                "amount": venda.amount,
-                "payment_method": str(venda.payment_method),
-                "operator_id": venda.operator_id,
-            }),
-        )
-    )
-    session.commit()
+    await run_write(session, partial(_gravar_cancelamento, venda_id=venda_id, motivo=motivo.strip(), usuario_id=int(user.id)))
     return RedirectResponse("/vendas/nova", status_code=302)
 
 
 @router.get("/recibo/{venda_id}", response_class=HTMLResponse)
-async def recibo_venda(venda_id: int, request: Request, user: User = Depends(login_required), session: Session = Depends(get_session)):
-    venda = session.get(Sale, venda_id)
+async def recibo_venda(venda_id: int, request: Request, user: User = Depends(login_required), session: AsyncSession = Depends(get_async_session)):
+    venda = await session.get(Sale, venda_id)
     if not venda:
         return RedirectResponse("/vendas/nova", status_code=302)
     # Caixa e responsáveis
-    caixa = session.get(CashSession, venda.cash_session_id) if venda.cash_session_id else None
+    caixa = await session.get(CashSession, venda.cash_session_id) if venda.cash_session_id else None
     opened_by_name = None
     if caixa:
-        opened_user = session.get(User, caixa.opened_by_id) if caixa.opened_by_id else None
-        opened_by_name = opened_user.full_name if opened_user else str(caixa.opened_by_id)
+        nomes = await session.run_sync(user_names, [caixa.opened_by_id])
+        opened_by_name = nomes.get(caixa.opened_by_id, str(caixa.opened_by_id))
     return templates.TemplateResponse(
         "receipt_sale.html",
         {
@@ -248,35 +492,15 @@ async def recibo_venda(venda_id: int, request: Request, user: User = Depends(log
             "user": user,
             "venda": venda,
             "opened_by_name": opened_by_name,
-            "payment_label": payment_label,
-            "fmt_dt": format_brt,
             "csrf_token": get_csrf_token(request),
         },
     )
 
 
 @router.post("/excluir/{venda_id}")
-async def excluir_venda(venda_id: int, request: Request, user: User = Depends(admin_required), session: Session = Depends(get_session), csrf_token: str = Form(alias="_csrf")):
+async def excluir_venda(venda_id: int, request: Request, user: User = Depends(admin_required), session: AsyncSession = Depends(get_async_session), csrf_token: str = Form(alias="_csrf")):
     csrf_protect(request, csrf_token)
-    venda = session.get(Sale, venda_id)
-    if venda:
-        # Registra auditoria antes de excluir
-        import json
-        audit = AuditLog(
-            action="delete_sale",
-            entity_type="sale",
-            entity_id=venda_id,
-            user_id=int(user.id) if user.id else 0,
-            details=json.dumps({
-                "product_code": venda.product_code,
-                "amount": venda.amount,
-                "payment_method": str(venda.payment_method),
-                "operator_id": venda.operator_id,
-            })
-        )
-        session.add(audit)
-        session.delete(venda)
-        session.commit()
+    await run_write(session, partial(_excluir_venda, venda_id=venda_id, usuario_id=int(user.id) if user.id else 0))
     if request.headers.get("HX-Request"):
         return HTMLResponse(status_code=200)
     return RedirectResponse("/vendas/nova", status_code=302)
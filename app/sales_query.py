@@ -0,0 +1,225 @@
+"""Filtros de relatório compilados para uma única consulta SQL.
+
+Relatórios e exportações recebem os mesmos filtros (período, operador, forma de
+pagamento, status do caixa e situação de cancelamento). ``parse_filters`` os
+normaliza a partir da query string e ``sales_query``/``aggregate`` geram a
+consulta de vendas e o ``GROUP BY`` por forma de pagamento. O período entra como
+subconsulta sobre ``ix_cashsession_data_status`` e as vendas são lidas pelo
+índice de ``cash_session_id``, então um relatório de um dia não depende do
+tamanho do histórico. Totais sem canceladas de caixas fechados vêm do resumo
+diário (``DailySummary``).
+"""
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from typing import Any
+from urllib.parse import urlencode
+
+from sqlalchemy import and_, exists, or_
+from sqlmodel import Session, col, select
+
+from app.models import (
+    CashSession,
+    DailySummary,
+    PaymentMethodEnum,
+    Sale,
+    SaleCancellation,
+    StatusEnum,
+)
+from app.report_cache import cached
+from app.totals import aggregate_by_method, not_cancelled, summary_by_method
+from app.utils import today_brt
+
+# Situação de cancelamento aceita no parâmetro ``cancelamento``
+TODAS = "todas"
+VALIDAS = "validas"
+CANCELADAS = "canceladas"
+CANCELAMENTOS = (TODAS, VALIDAS, CANCELADAS)
+
+# Vendas por página nas listagens de relatório; os totais vêm de ``aggregate``
+PAGINA_RELATORIO = 100
+
+
+@dataclass(frozen=True)
+class SaleFilters:
+    inicio: date
+    fim: date
+    operador_id: int | None = None
+    forma: PaymentMethodEnum | None = None
+    status_caixa: StatusEnum | None = None
+    cancelamento: str = TODAS
+
+
+def _parse_date(valor: str | None, padrao: date) -> date:
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date() if valor else padrao
+    except ValueError:
+        return padrao
+
+
+def _parse_id(valor: str | None) -> int | None:
+    # O formulário manda "operador_id=" na opção "Todos"
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def parse_filters(
+    data_inicio: str | None = None,
+    data_fim: str | None = None,
+    operador_id: str | None = None,
+    forma_pagamento: str | None = None,
+    status_caixa: str | None = None,
+    cancelamento: str | None = None,
+    padrao_cancelamento: str = TODAS,
+) -> SaleFilters:
+    """Normaliza os parâmetros da query string; valores inválidos viram "sem filtro"."""
+    inicio = _parse_date(data_inicio, today_brt())
+    fim = _parse_date(data_fim, inicio)
+    try:
+        forma = PaymentMethodEnum(forma_pagamento) if forma_pagamento else None
+    except ValueError:
+        forma = None
+    try:
+        status = StatusEnum(status_caixa) if status_caixa else None
+    except ValueError:
+        status = None
+    if cancelamento not in CANCELAMENTOS:
+        cancelamento = padrao_cancelamento
+    return SaleFilters(
+        inicio=inicio,
+        fim=fim,
+        operador_id=_parse_id(operador_id),
+        forma=forma,
+        status_caixa=status,
+        cancelamento=cancelamento,
+    )
+
+
+def query_string(filtros: SaleFilters) -> str:
+    """Filtros de volta no formato da query string (links de exportação e de paginação)."""
+    valores = {
+        "data_inicio": filtros.inicio.isoformat(),
+        "data_fim": filtros.fim.isoformat(),
+        "operador_id": filtros.operador_id,
+        "forma_pagamento": filtros.forma.value if filtros.forma else None,
+        "status_caixa": filtros.status_caixa.value if filtros.status_caixa else None,
+        "cancelamento": filtros.cancelamento,
+    }
+    return urlencode({chave: valor for chave, valor in valores.items() if valor})
+
+
+def session_criteria(filtros: SaleFilters) -> list[Any]:
+    """Critérios sobre ``CashSession`` (período e status)."""
+    criterios = [CashSession.data >= filtros.inicio, CashSession.data <= filtros.fim]
+    if filtros.status_caixa is not None:
+        criterios.append(CashSession.status == filtros.status_caixa)
+    return criterios
+
+
+def sale_criteria(filtros: SaleFilters) -> list[Any]:
+    """Critérios sobre ``Sale`` equivalentes aos filtros, prontos para ``.where``."""
+    caixas = select(CashSession.id).where(*session_criteria(filtros))
+    criterios: list[Any] = [col(Sale.cash_session_id).in_(caixas)]
+    if filtros.operador_id is not None:
+        criterios.append(Sale.operator_id == filtros.operador_id)
+    if filtros.forma is not None:
+        criterios.append(Sale.payment_method == filtros.forma)
+    if filtros.cancelamento == VALIDAS:
+        criterios.append(not_cancelled())
+    elif filtros.cancelamento == CANCELADAS:
+        criterios.append(exists().where(col(SaleCancellation.sale_id) == Sale.id))
+    return criterios
+
+
+def sales_query(filtros: SaleFilters, *colunas: Any) -> Any:
+    """``SELECT`` das vendas filtradas, em ordem cronológica (created_at, id).
+
+    Com ``colunas``, seleciona só essas colunas em vez da entidade ``Sale``.
+    """
+    query = select(*colunas) if colunas else select(Sale)
+    return query.where(*sale_criteria(filtros)).order_by(Sale.created_at, Sale.id)
+
+
+def encode_cursor(venda: Sale) -> str:
+    """Cursor da página seguinte: posição (created_at, id) da última venda exibida."""
+    return f"{venda.created_at.isoformat()}_{venda.id}"
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """Inverso de ``encode_cursor``; cursor malformado volta para a primeira página."""
+    if not cursor:
+        return None
+    instante, _sep, venda_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(instante), int(venda_id)
+    except ValueError:
+        return None
+
+
+def sales_page(
+    session: Session, filtros: SaleFilters, depois_de: str | None = None, tamanho: int = PAGINA_RELATORIO
+) -> tuple[list[Sale], str | None]:
+    """Página de vendas após o cursor, por keyset em (created_at, id) sem OFFSET.
+
+    Retorna a página e o cursor da próxima (ou None se acabou).
+    """
+    query = sales_query(filtros)
+    posicao = decode_cursor(depois_de)
+    if posicao is not None:
+        instante, venda_id = posicao
+        query = query.where(
+            or_(col(Sale.created_at) > instante, and_(col(Sale.created_at) == instante, col(Sale.id) > venda_id))
+        )
+    vendas = list(session.exec(query.limit(tamanho + 1)).all())
+    if len(vendas) <= tamanho:
+        return vendas, None
+    vendas = vendas[:tamanho]
+    return vendas, encode_cursor(vendas[-1])
+
+
+def has_open_session(session: Session, filtros: SaleFilters) -> bool:
+    """Há caixa aberto no período? Sem nenhum, o resultado só muda por cancelamento/exclusão."""
+    if filtros.status_caixa == StatusEnum.closed:
+        return False
+    return session.exec(
+        select(CashSession.id).where(*session_criteria(filtros), CashSession.status == StatusEnum.open)
+    ).first() is not None
+
+
+def sessions_in_period(session: Session, filtros: SaleFilters) -> list[CashSession]:
+    """Caixas do período e status filtrados, por data."""
+    return list(session.exec(select(CashSession).where(*session_criteria(filtros)).order_by(CashSession.data)).all())  # type: ignore[arg-type]
+
+
+def aggregate(session: Session, filtros: SaleFilters) -> dict[PaymentMethodEnum, tuple[int, int]]:
+    """Quantidade e soma (centavos) por forma de pagamento com os mesmos filtros.
+
+    Sem as canceladas, os caixas fechados vêm do resumo diário e só os abertos são
+    somados a partir das vendas.
+    """
+    if filtros.cancelamento != VALIDAS:
+        return aggregate_by_method(session, *sale_criteria(filtros), excluir_cancelados=False)
+    agregados: dict[PaymentMethodEnum, tuple[int, int]] = {}
+    if filtros.status_caixa != StatusEnum.open:
+        criterios = [DailySummary.data >= filtros.inicio, DailySummary.data <= filtros.fim]
+        if filtros.operador_id is not None:
+            criterios.append(DailySummary.operator_id == filtros.operador_id)
+        if filtros.forma is not None:
+            criterios.append(DailySummary.payment_method == filtros.forma)
+        agregados = summary_by_method(session, *criterios)
+    if filtros.status_caixa != StatusEnum.closed:
+        abertos = aggregate_by_method(
+            session, *sale_criteria(replace(filtros, status_caixa=StatusEnum.open)), excluir_cancelados=False
+        )
+        for forma, (qtd, total) in abertos.items():
+            qtd_resumo, total_resumo = agregados.get(forma, (0, 0))
+            agregados[forma] = (qtd_resumo + qtd, total_resumo + total)
+    return agregados
+
+
+def cached_aggregate(session: Session, filtros: SaleFilters) -> dict[PaymentMethodEnum, tuple[int, int]]:
+    """``aggregate`` pelo cache de relatórios (períodos só com caixas fechados não expiram)."""
+    return cached(
+        session, "aggregate", filtros, not has_open_session(session, filtros), lambda: aggregate(session, filtros)
+    )
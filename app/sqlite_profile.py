@@ -0,0 +1,70 @@
+"""Perfil de ajuste do SQLite aplicado a cada nova conexão.
+
+Os valores vêm de variáveis de ambiente (com padrões pensados para um PDV com
+várias abas lançando vendas enquanto relatórios são consultados):
+
+- ``SQLITE_JOURNAL_MODE`` (WAL): leitores não bloqueiam o escritor.
+- ``SQLITE_SYNCHRONOUS`` (NORMAL): seguro em WAL, com menos fsync por commit.
+- ``SQLITE_BUSY_TIMEOUT_MS`` (5000): espera o lock em vez de "database is locked".
+- ``SQLITE_CACHE_SIZE`` (-20000): negativo = KiB de cache de páginas por conexão.
+- ``SQLITE_MMAP_SIZE`` (268435456): bytes do arquivo lidos via mmap.
+- ``SQLITE_TEMP_STORE`` (MEMORY): tabelas temporárias de ORDER BY/GROUP BY em memória.
+- ``SQLITE_OPTIMIZE_INTERVAL`` (3600): segundos entre execuções de ``PRAGMA optimize`` (0 desliga).
+"""
+import os
+from typing import Any
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+_VALORES_VALIDOS = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+OPTIMIZE_INTERVAL = int(os.getenv("SQLITE_OPTIMIZE_INTERVAL", "3600"))
+
+
+def sqlite_pragmas() -> dict[str, str]:
+    """PRAGMAs configurados, na ordem em que são aplicados (busy_timeout primeiro)."""
+    pragmas = {
+        "busy_timeout": str(int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))),
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper(),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        "cache_size": str(int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))),
+        "mmap_size": str(int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY").upper(),
+    }
+    for nome, validos in _VALORES_VALIDOS.items():
+        if pragmas[nome] not in validos:
+            raise ValueError(f"Valor inválido para SQLITE_{nome.upper()}: {pragmas[nome]}")
+    return pragmas
+
+
+def install_sqlite_profile(engine: Engine) -> None:
+    """Registra o perfil no evento ``connect`` (para engines assíncronas, passe ``.sync_engine``)."""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _aplicar(dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
+
+
+def active_settings(engine: Engine) -> dict[str, Any]:
+    """Valores efetivos lidos de uma conexão do pool (para log na inicialização)."""
+    with engine.connect() as conn:
+        ativos: dict[str, Any] = {nome: conn.execute(text(f"PRAGMA {nome}")).scalar() for nome in sqlite_pragmas()}
+    pool = engine.pool
+    ativos["pool"] = pool.status() if hasattr(pool, "status") else type(pool).__name__
+    return ativos
+
+
+def optimize(engine: Engine) -> None:
+    """Executa ``PRAGMA optimize`` (atualiza estatísticas do planner quando necessário)."""
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+        conn.commit()
@@ -0,0 +1,69 @@
+"""Ambiente Jinja compartilhado por todos os routers.
+
+Um único ``Jinja2Templates`` (um cache de templates por processo), com cache de
+bytecode em disco para que workers novos não recompilem tudo, e os helpers de
+formatação registrados como globais. ``precompile_templates`` carrega todos os
+templates na inicialização; ``render_fragment`` guarda trechos renderizados de
+conteúdo imutável (ex.: comprovante de caixa fechado).
+"""
+import os
+import tempfile
+from collections import OrderedDict
+from collections.abc import Hashable
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from app.utils import format_brt, format_date_br, payment_label
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+BYTECODE_DIR = Path(os.getenv("TEMPLATE_BYTECODE_DIR", Path(tempfile.gettempdir()) / "pdv-jinja-cache"))
+# Em produção os templates não mudam com o processo rodando; TEMPLATE_AUTO_RELOAD=1 para desenvolvimento
+AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "0").lower() in ("1", "true", "yes")
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))
+
+BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(),
+    bytecode_cache=FileSystemBytecodeCache(str(BYTECODE_DIR)),
+    auto_reload=AUTO_RELOAD,
+)
+env.globals.update(fmt_dt=format_brt, fmt_date=format_date_br, payment_label=payment_label)
+templates = Jinja2Templates(env=env)
+
+
+def precompile_templates() -> int:
+    """Compila (ou lê do cache de bytecode) todos os templates; retorna quantos."""
+    nomes = env.list_templates(extensions=["html"])
+    for nome in nomes:
+        env.get_template(nome)
+    return len(nomes)
+
+
+_fragmentos: "OrderedDict[tuple[str, Hashable], Markup]" = OrderedDict()
+_fragmentos_lock = Lock()
+
+
+def render_fragment(nome: str, chave: Hashable | None, **contexto: Any) -> Markup:
+    """Renderiza ``nome``; com ``chave`` o resultado fica em cache (LRU).
+
+    A chave deve identificar tudo o que entra no trecho, pois ele nunca é recalculado.
+    """
+    if chave is None:
+        return Markup(env.get_template(nome).render(**contexto))
+    with _fragmentos_lock:
+        html = _fragmentos.get((nome, chave))
+        if html is not None:
+            _fragmentos.move_to_end((nome, chave))
+            return html
+    html = Markup(env.get_template(nome).render(**contexto))
+    with _fragmentos_lock:
+        _fragmentos[(nome, chave)] = html
+        while len(_fragmentos) > FRAGMENT_CACHE_SIZE:
+            _fragmentos.popitem(last=False)
+    return html
@@ -0,0 +1,118 @@
+"""Séries temporais do dashboard executivo, lidas de ``HourlySales``.
+
+Todas as contas partem das linhas por hora (no máximo 24 por dia), nunca das
+vendas: comparação com o período anterior até o mesmo ponto (dia, semana, mês,
+ano), mapa de calor dia da semana × hora e médias móveis dos totais diários.
+Horas são locais (São Paulo) e sem fuso, como gravadas na tabela.
+"""
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+
+from app.models import HourlySales
+
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+
+def hourly_rows(session: Session, inicio: datetime, fim: datetime) -> list[tuple[datetime, int, int]]:
+    """(hora, quantidade, centavos) das horas em [inicio, fim)."""
+    return [
+        (hora, int(qtd), int(total))
+        for hora, qtd, total in session.exec(
+            select(HourlySales.hora, HourlySales.sale_count, HourlySales.total_cents)
+            .where(HourlySales.hora >= inicio, HourlySales.hora < fim)
+            .order_by(col(HourlySales.hora))
+        ).all()
+    ]
+
+
+def period_total(session: Session, inicio: datetime, fim: datetime) -> tuple[int, int]:
+    """Quantidade e centavos vendidos em [inicio, fim)."""
+    qtd, total = session.exec(
+        select(func.coalesce(func.sum(HourlySales.sale_count), 0), func.coalesce(func.sum(HourlySales.total_cents), 0))
+        .where(HourlySales.hora >= inicio, HourlySales.hora < fim)
+    ).one()
+    return int(qtd), int(total)
+
+
+def _inicio_periodo(periodo: str, dia: date) -> date:
+    if periodo == "dia":
+        return dia
+    if periodo == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if periodo == "mes":
+        return dia.replace(day=1)
+    return dia.replace(month=1, day=1)
+
+
+def _periodo_anterior(periodo: str, inicio: date) -> date:
+    if periodo == "dia":
+        return inicio - timedelta(days=1)
+    if periodo == "semana":
+        return inicio - timedelta(days=7)
+    if periodo == "mes":
+        return (inicio - timedelta(days=1)).replace(day=1)
+    return inicio.replace(year=inicio.year - 1)
+
+
+def comparisons(session: Session, agora: datetime) -> list[dict[str, Any]]:
+    """Período corrente até a hora de ``agora`` contra o anterior até o mesmo ponto.
+
+    Ex.: mês até hoje às 14h contra o mês passado até o mesmo dia e hora.
+    """
+    fim = agora.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    resultado: list[dict[str, Any]] = []
+    for periodo in ("dia", "semana", "mes", "ano"):
+        inicio = datetime.combine(_inicio_periodo(periodo, agora.date()), time())
+        anterior = datetime.combine(_periodo_anterior(periodo, inicio.date()), time())
+        # Meses e anos têm tamanhos diferentes: o anterior nunca passa do início do atual
+        fim_anterior = min(anterior + (fim - inicio), inicio)
+        qtd, total = period_total(session, inicio, fim)
+        qtd_anterior, total_anterior = period_total(session, anterior, fim_anterior)
+        resultado.append({
+            "periodo": periodo,
+            "qtd": qtd,
+            "total_cents": total,
+            "qtd_anterior": qtd_anterior,
+            "total_anterior_cents": total_anterior,
+            "variacao": round((total - total_anterior) * 100 / total_anterior, 1) if total_anterior else None,
+        })
+    return resultado
+
+
+def heatmap(session: Session, fim: date, semanas: int = 8) -> list[list[int]]:
+    """Centavos vendidos por dia da semana (0 = segunda) e hora nas ``semanas`` até ``fim``."""
+    matriz = [[0] * 24 for _ in range(7)]
+    ate = datetime.combine(fim + timedelta(days=1), time())
+    for hora, _qtd, total in hourly_rows(session, ate - timedelta(weeks=semanas), ate):
+        matriz[hora.weekday()][hora.hour] += total
+    return matriz
+
+
+def daily_totals(linhas: Iterable[tuple[datetime, int, int]]) -> dict[date, int]:
+    """Soma as horas por dia."""
+    por_dia: dict[date, int] = {}
+    for hora, _qtd, total in linhas:
+        por_dia[hora.date()] = por_dia.get(hora.date(), 0) + total
+    return por_dia
+
+
+def trailing_averages(session: Session, fim: date, dias: int = 14, janelas: tuple[int, ...] = (7, 28)) -> list[dict[str, Any]]:
+    """Total de cada um dos últimos ``dias`` dias e a média dos N dias até ele (dias sem venda contam zero)."""
+    maior = max(janelas)
+    inicio = fim - timedelta(days=dias + maior - 2)
+    por_dia = daily_totals(
+        hourly_rows(session, datetime.combine(inicio, time()), datetime.combine(fim + timedelta(days=1), time()))
+    )
+    serie = [por_dia.get(inicio + timedelta(days=i), 0) for i in range((fim - inicio).days + 1)]
+    linhas: list[dict[str, Any]] = []
+    for i in range(len(serie) - dias, len(serie)):
+        linhas.append({
+            "data": inicio + timedelta(days=i),
+            "total_cents": serie[i],
+            **{f"media_{n}": sum(serie[i - n + 1:i + 1]) // n for n in janelas},
+        })
+    return linhas
@@ -0,0 +1,298 @@
+"""Totais acumulados por caixa e forma de pagamento.
+
+Cada lançamento, cancelamento ou exclusão de venda ajusta a linha correspondente
+em ``CashSessionTotal`` dentro da mesma transação, então a tela de vendas lê os
+totais com uma única consulta em vez de somar todas as vendas do dia.
+
+Os dias com caixa fechado também têm um resumo em ``DailySummary`` (data, forma
+de pagamento e operador), gravado no fechamento e ajustado pelos mesmos pontos
+quando uma venda de dia fechado é cancelada ou excluída. ``HourlySales`` guarda
+as vendas por hora de todos os caixas e é ajustada a cada alteração.
+"""
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from sqlalchemy import delete, exists, func, insert, update
+from sqlalchemy import select as sa_select
+from sqlmodel import Session, col, select
+
+from app.db import upsert_insert
+from app.live_totals import record_totals_delta
+from app.models import (
+    CashSession,
+    CashSessionTotal,
+    DailySummary,
+    HourlySales,
+    PaymentMethodEnum,
+    Sale,
+    SaleCancellation,
+    StatusEnum,
+)
+from app.report_cache import bump_sales_version
+from app.utils import brt_hour, brt_to_utc, cents_to_reais
+
+# Chave usada nos templates para cada forma de pagamento
+CHAVES_TOTAIS = {
+    PaymentMethodEnum.DINHEIRO: "dinheiro",
+    PaymentMethodEnum.PIX: "pix",
+    PaymentMethodEnum.DEBITO: "debito",
+    PaymentMethodEnum.CREDITO: "credito",
+}
+
+
+def init_session_totals(session: Session, caixa_id: int) -> None:
+    """Cria as linhas zeradas de um caixa recém-aberto (não faz commit)."""
+    for forma in PaymentMethodEnum:
+        session.add(CashSessionTotal(cash_session_id=caixa_id, payment_method=forma))
+
+
+def apply_sale(session: Session, venda: Sale, sinal: int = 1) -> None:
+    """Soma (sinal=1) ou subtrai (sinal=-1) a venda dos totais do caixa.
+
+    Deve ser chamada depois de ``session.add``/``session.delete`` e antes do commit.
+    """
+    apply_sales(session, [venda], sinal)
+
+
+def apply_sales(session: Session, vendas: Iterable[Sale], sinal: int = 1) -> None:
+    """Versão em lote de ``apply_sale``: um UPDATE por caixa e forma de pagamento.
+
+    O incremento é feito no próprio UPDATE para não perder atualizações concorrentes.
+    """
+    grupos: dict[tuple[int, PaymentMethodEnum], tuple[int, int]] = {}
+    por_operador: dict[tuple[int, PaymentMethodEnum, int], tuple[int, int]] = {}
+    por_hora: dict[datetime, tuple[int, int]] = {}
+    for venda in vendas:
+        chave = (venda.cash_session_id, venda.payment_method)
+        qtd, total = grupos.get(chave, (0, 0))
+        grupos[chave] = (qtd + 1, total + venda.amount_cents)
+        hora = brt_hour(venda.created_at)
+        qtd, total = por_hora.get(hora, (0, 0))
+        por_hora[hora] = (qtd + 1, total + venda.amount_cents)
+        chave_operador = (venda.cash_session_id, venda.payment_method, venda.operator_id)
+        qtd, total = por_operador.get(chave_operador, (0, 0))
+        por_operador[chave_operador] = (qtd + 1, total + venda.amount_cents)
+    reconstruidos: set[int] = set()
+    for (caixa_id, forma), (qtd, total) in grupos.items():
+        if caixa_id in reconstruidos:
+            continue
+        result = session.execute(
+            update(CashSessionTotal)
+            .where(col(CashSessionTotal.cash_session_id) == caixa_id, col(CashSessionTotal.payment_method) == forma)
+            .values(
+                sale_count=CashSessionTotal.sale_count + sinal * qtd,
+                total_cents=CashSessionTotal.total_cents + sinal * total,
+            )
+        )
+        if result.rowcount == 0:  # type: ignore[attr-defined]
+            # Caixa anterior à tabela de totais: recalcula a partir das vendas
+            rebuild_session_totals(session, caixa_id)
+            reconstruidos.add(caixa_id)
+    fechado = _apply_to_daily_summary(session, por_operador, sinal)
+    _apply_to_hourly_sales(session, por_hora, sinal)
+    bump_sales_version(session, caixa_fechado=fechado)
+    record_totals_delta(
+        session, {(caixa_id, CHAVES_TOTAIS[forma]): sinal * total for (caixa_id, forma), (_qtd, total) in grupos.items()}
+    )
+
+
+def _apply_to_daily_summary(
+    session: Session, grupos: dict[tuple[int, PaymentMethodEnum, int], tuple[int, int]], sinal: int
+) -> bool:
+    """Ajusta o resumo diário quando a venda pertence a um caixa já fechado (retorna se havia algum)."""
+    caixa_ids = {caixa_id for caixa_id, _forma, _operador in grupos}
+    if not caixa_ids:
+        return False
+    fechados = dict(
+        session.exec(
+            select(col(CashSession.id), col(CashSession.data)).where(
+                col(CashSession.id).in_(caixa_ids), CashSession.status == StatusEnum.closed
+            )
+        ).all()
+    )
+    reconstruidos: set[date] = set()
+    for (caixa_id, forma, operador_id), (qtd, total) in grupos.items():
+        dia = fechados.get(caixa_id)
+        if dia is None or dia in reconstruidos:
+            continue
+        result = session.execute(
+            update(DailySummary)
+            .where(
+                col(DailySummary.data) == dia,
+                col(DailySummary.payment_method) == forma,
+                col(DailySummary.operator_id) == operador_id,
+            )
+            .values(
+                sale_count=DailySummary.sale_count + sinal * qtd,
+                total_cents=DailySummary.total_cents + sinal * total,
+            )
+        )
+        if result.rowcount == 0:  # type: ignore[attr-defined]
+            rebuild_daily_summary(session, dia, dia)
+            reconstruidos.add(dia)
+    return bool(fechados)
+
+
+def _apply_to_hourly_sales(session: Session, grupos: dict[datetime, tuple[int, int]], sinal: int) -> None:
+    """Soma as vendas às horas correspondentes (upsert: a primeira venda da hora cria a linha)."""
+    for hora, (qtd, total) in grupos.items():
+        session.execute(
+            upsert_insert(session, HourlySales)
+            .values(hora=hora, sale_count=sinal * qtd, total_cents=sinal * total)
+            .on_conflict_do_update(
+                index_elements=["hora"],
+                set_={
+                    "sale_count": HourlySales.sale_count + sinal * qtd,
+                    "total_cents": HourlySales.total_cents + sinal * total,
+                },
+            )
+        )
+
+
+def rebuild_hourly_sales(session: Session, inicio: date | None = None, fim: date | None = None) -> int:
+    """Recalcula as vendas por hora no intervalo de datas locais (tudo, sem datas); não faz commit.
+
+    O fuso é aplicado em Python, então as vendas do período são lidas em blocos,
+    só com as colunas necessárias. Retorna quantas horas foram gravadas.
+    """
+    session.flush()
+    periodo_horas: list[Any] = []
+    periodo_vendas: list[Any] = [not_cancelled()]
+    if inicio is not None:
+        periodo_horas.append(HourlySales.hora >= datetime.combine(inicio, time()))
+        periodo_vendas.append(Sale.created_at >= brt_to_utc(datetime.combine(inicio, time())))
+    if fim is not None:
+        periodo_horas.append(HourlySales.hora < datetime.combine(fim + timedelta(days=1), time()))
+        periodo_vendas.append(Sale.created_at < brt_to_utc(datetime.combine(fim + timedelta(days=1), time())))
+    session.execute(delete(HourlySales).where(*periodo_horas))
+    por_hora: dict[datetime, tuple[int, int]] = {}
+    vendas = session.execute(
+        select(Sale.created_at, Sale.amount_cents).where(*periodo_vendas).execution_options(yield_per=5000)
+    )
+    for criado_em, valor in vendas:
+        hora = brt_hour(criado_em)
+        qtd, total = por_hora.get(hora, (0, 0))
+        por_hora[hora] = (qtd + 1, total + valor)
+    if por_hora:
+        session.execute(
+            insert(HourlySales),
+            [{"hora": hora, "sale_count": qtd, "total_cents": total} for hora, (qtd, total) in por_hora.items()],
+        )
+    bump_sales_version(session)
+    return len(por_hora)
+
+
+def rebuild_daily_summary(session: Session, inicio: date | None = None, fim: date | None = None) -> int:
+    """Recalcula o resumo diário dos caixas fechados no intervalo (tudo, sem datas); não faz commit.
+
+    Um DELETE e um INSERT ... SELECT agrupado por data, forma de pagamento e
+    operador. Retorna quantas linhas de resumo foram gravadas.
+    """
+    session.flush()
+    periodo_resumo: list[Any] = []
+    periodo_caixas: list[Any] = [CashSession.status == StatusEnum.closed, not_cancelled()]
+    if inicio is not None:
+        periodo_resumo.append(DailySummary.data >= inicio)
+        periodo_caixas.append(CashSession.data >= inicio)
+    if fim is not None:
+        periodo_resumo.append(DailySummary.data <= fim)
+        periodo_caixas.append(CashSession.data <= fim)
+    session.execute(delete(DailySummary).where(*periodo_resumo))
+    agrupado = (
+        sa_select(  # cinco colunas: além das sobrecargas do select do SQLModel
+            col(CashSession.data),
+            col(Sale.payment_method),
+            col(Sale.operator_id),
+            func.count(col(Sale.id)),
+            func.sum(Sale.amount_cents),
+        )
+        .join(CashSession, col(CashSession.id) == Sale.cash_session_id)
+        .where(*periodo_caixas)
+        .group_by(col(CashSession.data), Sale.payment_method, col(Sale.operator_id))
+    )
+    result = session.execute(
+        insert(DailySummary).from_select(
+            ["data", "payment_method", "operator_id", "sale_count", "total_cents"], agrupado
+        )
+    )
+    bump_sales_version(session, caixa_fechado=True)
+    return int(result.rowcount or 0)  # type: ignore[attr-defined]
+
+
+def summary_by_method(session: Session, *criterios: Any) -> dict[PaymentMethodEnum, tuple[int, int]]:
+    """Mesmo formato de ``aggregate_by_method``, lido do resumo diário (só caixas fechados)."""
+    linhas = session.exec(
+        select(DailySummary.payment_method, func.sum(DailySummary.sale_count), func.sum(DailySummary.total_cents))
+        .where(*criterios)
+        .group_by(DailySummary.payment_method)
+    ).all()
+    return {PaymentMethodEnum(forma): (int(qtd), int(total)) for forma, qtd, total in linhas if qtd}
+
+
+def rebuild_session_totals(session: Session, caixa_id: int) -> None:
+    """Recalcula os totais do caixa a partir das vendas (não faz commit)."""
+    session.flush()
+    agregados = aggregate_by_method(session, Sale.cash_session_id == caixa_id)
+    for forma in PaymentMethodEnum:
+        qtd, total = agregados.get(forma, (0, 0))
+        linha = session.get(CashSessionTotal, (caixa_id, forma))
+        if linha is None:
+            linha = CashSessionTotal(cash_session_id=caixa_id, payment_method=forma)
+        linha.sale_count = qtd
+        linha.total_cents = total
+        session.add(linha)
+    session.flush()
+
+
+def aggregate_by_method(
+    session: Session, *criterios: Any, excluir_cancelados: bool = True
+) -> dict[PaymentMethodEnum, tuple[int, int]]:
+    """Quantidade e soma (centavos) das vendas, agrupadas no banco por forma de pagamento."""
+    if excluir_cancelados:
+        criterios = (*criterios, not_cancelled())
+    linhas = session.exec(
+        select(Sale.payment_method, func.count(col(Sale.id)), func.coalesce(func.sum(Sale.amount_cents), 0))
+        .where(*criterios)
+        .group_by(Sale.payment_method)
+    ).all()
+    return {PaymentMethodEnum(forma): (int(qtd), int(total)) for forma, qtd, total in linhas}
+
+
+def not_cancelled() -> Any:
+    """Critério NOT EXISTS correlacionado: usa o índice de SaleCancellation.sale_id por venda."""
+    return ~exists().where(col(SaleCancellation.sale_id) == Sale.id)
+
+
+def by_method_to_totals(agregados: dict[PaymentMethodEnum, tuple[int, int]]) -> dict[str, int]:
+    """Converte o resultado de ``aggregate_by_method`` para o dicionário por chave de template."""
+    totais = {chave: 0 for chave in CHAVES_TOTAIS.values()}
+    for forma, (_qtd, total) in agregados.items():
+        totais[CHAVES_TOTAIS[forma]] = total
+    return totais
+
+
+def session_totals_cents(session: Session, caixa_id: int) -> dict[str, int]:
+    """Totais do caixa em centavos, lidos da tabela de totais acumulados."""
+    linhas = list(session.exec(select(CashSessionTotal).where(CashSessionTotal.cash_session_id == caixa_id)).all())
+    if not linhas:
+        rebuild_session_totals(session, caixa_id)
+        session.commit()
+        linhas = list(session.exec(select(CashSessionTotal).where(CashSessionTotal.cash_session_id == caixa_id)).all())
+    totais = {chave: 0 for chave in CHAVES_TOTAIS.values()}
+    for linha in linhas:
+        totais[CHAVES_TOTAIS[linha.payment_method]] = linha.total_cents
+    return totais
+
+
+def session_totals(session: Session, caixa_id: int) -> dict[str, float]:
+    """Retorna os totais do caixa em reais, no formato usado por ``partials/totals.html``."""
+    return {chave: cents_to_reais(total) for chave, total in session_totals_cents(session, caixa_id).items()}
+
+
+def cancelled_ids(session: Session, vendas: Iterable[Sale]) -> set[int]:
+    """Ids cancelados entre as vendas informadas (consulta IN no índice de sale_id)."""
+    ids = [v.id for v in vendas if v.id]
+    if not ids:
+        return set()
+    return set(session.exec(select(SaleCancellation.sale_id).where(SaleCancellation.sale_id.in_(ids))).all())  # type: ignore[attr-defined]
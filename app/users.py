@@ -0,0 +1,68 @@
+"""Cache de usuários por processo e resolução de nomes em lote.
+
+``get_current_user`` roda em toda requisição autenticada; com o cache a identidade
+vem da memória e só volta ao banco depois de ``USER_CACHE_TTL`` segundos. As rotas
+de administração chamam ``invalidate_user`` ao alterar usuários; outros workers
+enxergam a mudança quando a entrada expira.
+
+Os objetos devolvidos são cópias desanexadas compartilhadas entre requisições:
+devem ser tratados como somente leitura.
+"""
+import os
+import time
+from collections.abc import Iterable
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session, select
+
+from app.models import User
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+_cache: dict[int, tuple[float, User]] = {}
+
+
+def get_cached_user(user_id: int) -> User | None:
+    entrada = _cache.get(user_id)
+    if entrada is None:
+        return None
+    expira, usuario = entrada
+    if time.monotonic() >= expira:
+        _cache.pop(user_id, None)
+        return None
+    return usuario
+
+
+def cache_user(usuario: User) -> User:
+    """Guarda uma cópia desanexada do usuário e a devolve."""
+    assert usuario.id is not None
+    copia = User(**usuario.model_dump())
+    make_transient_to_detached(copia)
+    _cache[usuario.id] = (time.monotonic() + USER_CACHE_TTL, copia)
+    return copia
+
+
+def invalidate_user(user_id: int | None = None) -> None:
+    """Remove um usuário do cache (ou todos, sem argumento)."""
+    if user_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(user_id, None)
+
+
+def user_names(session: Session, ids: Iterable[int | None]) -> dict[int, str]:
+    """Nome completo por id: usa o cache e busca os demais numa única consulta IN."""
+    nomes: dict[int, str] = {}
+    faltando: set[int] = set()
+    for user_id in ids:
+        if user_id is None or user_id in nomes:
+            continue
+        usuario = get_cached_user(user_id)
+        if usuario is None:
+            faltando.add(user_id)
+        else:
+            nomes[user_id] = usuario.full_name
+    if faltando:
+        for usuario in session.exec(select(User).where(User.id.in_(faltando))).all():  # type: ignore[union-attr]
+            nomes[int(usuario.id)] = cache_user(usuario).full_name  # type: ignore[arg-type]
+    return nomes
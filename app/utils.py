@@ -1,4 +1,5 @@
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 
 try:
     from zoneinfo import ZoneInfo
@@ -7,22 +8,55 @@ except ImportError:
 
 BRT_TZNAME = "America/Sao_Paulo"
 
+BRT: tzinfo | None
+try:
+    BRT = ZoneInfo(BRT_TZNAME) if ZoneInfo is not None else None
+except Exception:  # sem tzdata
+    BRT = None
+
+
+def today_brt() -> date:
+    """Data de negócio atual no fuso de São Paulo."""
+    if BRT is None:
+        return datetime.now(timezone(timedelta(hours=-3))).date()
+    return datetime.now(BRT).date()
+
 
 def format_brt(dt: datetime | None) -> str:
     if not dt:
         return ""
     # Se zoneinfo ou tzdata não estiverem disponíveis, faz fallback seguro
     try:
-        if ZoneInfo is None:
+        if BRT is None:
             raise RuntimeError("zoneinfo indisponível")
-        tz = ZoneInfo(BRT_TZNAME)  # pode lançar ZoneInfoNotFoundError sem tzdata
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(tz).strftime("%d/%m/%Y %H:%M")
+        return dt.astimezone(BRT).strftime("%d/%m/%Y %H:%M")
     except Exception:
         return dt.strftime("%d/%m/%Y %H:%M")
 
 
+def brt_date(dt: datetime) -> date:
+    """Data (fuso de São Paulo) de um instante gravado em UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(BRT or timezone(timedelta(hours=-3))).date()
+
+
+def brt_hour(dt: datetime) -> datetime:
+    """Início da hora (fuso de São Paulo, sem tzinfo) de um instante gravado em UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    local = dt.astimezone(BRT or timezone(timedelta(hours=-3)))
+    return local.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def brt_to_utc(local: datetime) -> datetime:
+    """Horário local de São Paulo (sem tzinfo) -> UTC sem tzinfo, como gravado no banco."""
+    utc = local.replace(tzinfo=BRT or timezone(timedelta(hours=-3))).astimezone(timezone.utc)
+    return utc.replace(tzinfo=None)
+
+
 def payment_label(method: object) -> str:
     """Converte PaymentMethodEnum/str para rótulo amigável em pt-BR.
 
@@ -48,3 +82,25 @@ def format_date_br(d: date | None) -> str:
     if not d:
         return ""
     return d.strftime("%d/%m/%Y")
+
+
+# Maior valor aceito (R$ 10 bilhões): somas de muitas vendas continuam cabendo em BIGINT
+MAX_CENTS = 10**12
+
+
+def parse_cents(value: str | float | int | None) -> int | None:
+    """Converte valor em reais (aceita vírgula ou ponto) para centavos; None se inválido ou fora da faixa."""
+    if value is None:
+        return None
+    try:
+        reais = Decimal(str(value).replace(",", ".").strip())
+    except InvalidOperation:
+        return None
+    if not reais.is_finite() or abs(reais) * 100 > MAX_CENTS:
+        return None
+    return int((reais * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def cents_to_reais(cents: int | None) -> float:
+    """Centavos -> reais (float), apenas para exibição."""
+    return (cents or 0) / 100
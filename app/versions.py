@@ -0,0 +1,27 @@
+"""Contadores de versão usados para invalidar caches entre processos.
+
+Cada worker guarda em memória a versão que usou para montar seu cache; quando
+outro processo incrementa o contador (na mesma transação da alteração), a
+próxima leitura percebe a diferença e recarrega.
+"""
+from sqlmodel import Session, select
+
+from app.db import upsert_insert
+from app.models import CacheVersion
+
+
+def current_version(session: Session, name: str) -> int:
+    version = session.exec(select(CacheVersion.version).where(CacheVersion.name == name)).first()
+    return int(version or 0)
+
+
+def bump_version(session: Session, name: str) -> None:
+    """Incrementa o contador (não faz commit; vale junto com a transação do chamador).
+
+    Usa upsert para que dois processos criando o contador ao mesmo tempo não colidam.
+    """
+    session.execute(
+        upsert_insert(session, CacheVersion)
+        .values(name=name, version=1)
+        .on_conflict_do_update(index_elements=["name"], set_={"version": CacheVersion.version + 1})
+    )
@@ -0,0 +1,146 @@
+"""Escritor em grupo (group commit) opcional para vendas, cancelamentos e auditoria.
+
+Com ``GROUP_COMMIT=1`` as escritas que chegam dentro de ``GROUP_COMMIT_WINDOW_MS``
+(até ``GROUP_COMMIT_MAX_BATCH`` por lote) são gravadas numa única transação, com um
+só commit/fsync. Cada requisição só recebe a resposta depois do commit do seu lote.
+
+Uma escrita é uma função síncrona ``op(session) -> resultado`` que monta os objetos a
+partir de dados simples (pode ser reexecutada). Se alguma escrita do lote falhar, o
+lote é desfeito e as escritas são refeitas uma a uma, isolando o erro na requisição
+que o causou. Sem o escritor ativo, ``run_write`` executa a mesma função na sessão
+da requisição, com commit próprio.
+"""
+import asyncio
+import os
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+import anyio.to_thread
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app.db import AsyncSession
+
+T = TypeVar("T")
+Op = Callable[[Session], Any]
+
+ENABLED = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "100"))
+
+
+class GroupCommitWriter:
+    def __init__(self, engine: Engine, janela_ms: float = WINDOW_MS, maximo: int = MAX_BATCH) -> None:
+        self.engine = engine
+        self.janela = janela_ms / 1000
+        self.maximo = maximo
+        self.lotes = 0
+        self.escritas = 0
+        self._fila: asyncio.Queue[tuple[Op, asyncio.Future[Any]] | None] | None = None
+        self._tarefa: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        """Inicia a tarefa de gravação no event loop corrente."""
+        self._fila = asyncio.Queue()
+        self._tarefa = asyncio.create_task(self._executar())
+
+    async def stop(self) -> None:
+        """Grava o que já está na fila e encerra a tarefa."""
+        if self._fila is None or self._tarefa is None:
+            return
+        await self._fila.put(None)
+        await self._tarefa
+        self._fila = self._tarefa = None
+
+    async def submit(self, op: Callable[[Session], T]) -> T:
+        """Enfileira a escrita e aguarda o commit do lote em que ela entrou."""
+        assert self._fila is not None, "escritor não iniciado"
+        futuro: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        await self._fila.put((op, futuro))
+        return await futuro
+
+    async def _executar(self) -> None:
+        assert self._fila is not None
+        loop = asyncio.get_running_loop()
+        encerrar = False
+        while not encerrar:
+            item = await self._fila.get()
+            if item is None:
+                return
+            lote = [item]
+            limite = loop.time() + self.janela
+            while len(lote) < self.maximo:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    proximo = await asyncio.wait_for(self._fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                if proximo is None:
+                    encerrar = True
+                    break
+                lote.append(proximo)
+            resultados = await anyio.to_thread.run_sync(self._gravar, [op for op, _futuro in lote])
+            for (_op, futuro), (ok, valor) in zip(lote, resultados, strict=True):
+                if futuro.cancelled():
+                    continue
+                if ok:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
+
+    def _gravar(self, ops: list[Op]) -> list[tuple[bool, Any]]:
+        """Executa o lote numa transação; em caso de erro refaz cada escrita isoladamente."""
+        try:
+            resultados = self._transacao(ops)
+        except Exception:
+            return [self._gravar_uma(op) for op in ops]
+        return [(True, r) for r in resultados]
+
+    def _gravar_uma(self, op: Op) -> tuple[bool, Any]:
+        try:
+            return True, self._transacao([op])[0]
+        except Exception as erro:
+            return False, erro
+
+    def _transacao(self, ops: list[Op]) -> list[Any]:
+        with Session(self.engine, expire_on_commit=False) as session:
+            resultados = [op(session) for op in ops]
+            session.commit()
+        self.lotes += 1
+        self.escritas += len(ops)
+        return resultados
+
+
+_writer: GroupCommitWriter | None = None
+
+
+def start_group_commit(engine: Engine) -> GroupCommitWriter:
+    """Ativa o escritor em grupo no event loop corrente (chamar no startup)."""
+    global _writer
+    _writer = GroupCommitWriter(engine)
+    _writer.start()
+    return _writer
+
+
+async def stop_group_commit() -> None:
+    global _writer
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+
+
+async def run_write(session: AsyncSession, op: Callable[[Session], T]) -> T:
+    """Executa a escrita pelo escritor em grupo, se ativo, ou na sessão da requisição (com commit)."""
+    if _writer is not None:
+        return await _writer.submit(op)
+    resultado = await session.run_sync(op)
+    await session.commit()
+    return resultado
+
+
+def group_commit_stats() -> dict[str, Any]:
+    if _writer is None:
+        return {"ativo": False}
+    return {"ativo": True, "lotes": _writer.lotes, "escritas": _writer.escritas}
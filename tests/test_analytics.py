@@ -0,0 +1,87 @@
+import io
+import re
+from datetime import date
+
+import pandas as pd
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.analytics import kpis, load_frame
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, SaleCancellation, StatusEnum
+from app.sales_query import parse_filters
+
+DIA = date(2023, 9, 20)
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _popular() -> None:
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=DIA, status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        vendas = [
+            Sale(product_code="CAFE", amount_cents=500, payment_method=PaymentMethodEnum.PIX, operator_id=1, cash_session_id=caixa.id),
+            Sale(product_code="CAFE", amount_cents=700, payment_method=PaymentMethodEnum.PIX, operator_id=1, cash_session_id=caixa.id),
+            Sale(product_code="PAO", amount_cents=300, payment_method=PaymentMethodEnum.DINHEIRO, operator_id=1, cash_session_id=caixa.id),
+        ]
+        session.add_all(vendas)
+        session.flush()
+        session.add(SaleCancellation(sale_id=vendas[2].id, reason="teste", canceled_by_id=1))
+        session.commit()
+
+
+def test_frame_is_typed_and_kpis_exclude_cancelled():
+    init_db()
+    create_default_admin()
+    _popular()
+    with Session(engine) as session:
+        frame = load_frame(session, parse_filters(DIA.isoformat()))
+    assert len(frame) == 3
+    assert frame["amount_cents"].dtype == "int64"
+    assert isinstance(frame["payment_method"].dtype, pd.CategoricalDtype)
+    assert str(frame["created_at"].dt.tz) == "America/Sao_Paulo"
+    assert frame["cancelada"].sum() == 1
+
+    resultado = kpis(frame)
+    assert resultado["por_produto"].loc["CAFE"].tolist() == [2, 1200, 600]
+    assert "PAO" not in resultado["por_produto"].index
+    assert resultado["por_forma"].loc["PIX", "total_cents"] == 1200
+    assert resultado["por_dia"]["qtd"].tolist() == [2]
+
+
+def test_parquet_export_round_trips():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    r = client.get(f"/relatorios/exportar/parquet?data_inicio={DIA.isoformat()}&cancelamento=validas")
+    assert r.status_code == 200
+    frame = pd.read_parquet(io.BytesIO(r.content))
+    assert sorted(frame["product_code"]) == ["CAFE", "CAFE"]
+    assert frame["amount_cents"].sum() == 1200
+
+
+def test_advanced_report_shows_kpis():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    r = client.get(f"/relatorios/avancado?data_inicio={DIA.isoformat()}")
+    m = re.search(r'hx-get="(/relatorios/avancado/analise\?[^"]+)"', r.text)
+    assert m, "seção de análise ausente"
+    r = client.get(m.group(1).replace("&amp;", "&"))
+    assert r.status_code == 200
+    assert "20/09/2023" in r.text and "Administrador" in r.text
+    assert "CAFE" in r.text and "PAO" not in r.text  # cancelada fica de fora
+    assert "R$ 12.00" in r.text and "R$ 6.00" in r.text
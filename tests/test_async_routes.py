@@ -0,0 +1,68 @@
+import re
+import time
+
+import anyio
+import httpx
+
+from app.db import create_default_admin, init_db
+from app.main import app
+from app.routers import reports
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m
+    return m.group(1)
+
+
+def test_slow_report_does_not_block_sale_post(monkeypatch):
+    init_db()
+    create_default_admin()
+    agregar = reports.cached_aggregate
+
+    def agregar_lento(*args, **kwargs):
+        time.sleep(1.0)
+        return agregar(*args, **kwargs)
+
+    monkeypatch.setattr(reports, "cached_aggregate", agregar_lento)
+
+    async def main() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.get("/entrar")
+            await client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": _csrf(r.text)})
+            r = await client.get("/caixa/abrir")
+            await client.post("/caixa/abrir", data={"troco_inicial": "0", "data": today_brt().isoformat(), "_csrf": _csrf(r.text)})
+            r = await client.get("/vendas/nova")
+            csrf = _csrf(r.text)
+
+            duracao = 0.0
+
+            async def relatorio() -> None:
+                resp = await client.get("/relatorios/")
+                assert resp.status_code == 200
+
+            async def venda() -> None:
+                nonlocal duracao
+                inicio = time.perf_counter()
+                await anyio.sleep(0.2)  # relatório já em andamento
+                resp = await client.post(
+                    "/vendas/nova",
+                    data={"product_code": "ASYNC", "amount": "1,00", "payment_method": "PIX", "_csrf": csrf},
+                    headers={"HX-Request": "true"},
+                )
+                duracao = time.perf_counter() - inicio
+                assert resp.status_code == 200
+
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(relatorio)
+                tg.start_soon(venda)
+
+            await client.get("/caixa/fechar")
+            await client.post("/caixa/fechar", data={"gaveta": "0", "pix": "1", "debito": "0", "credito": "0", "_csrf": csrf})
+            return duracao
+
+    # Com o relatório rodando no event loop, a venda só terminaria depois de ~1s
+    assert anyio.run(main) < 0.7
+
@@ -0,0 +1,58 @@
+from datetime import date
+
+from sqlmodel import Session, select
+
+from app.db import create_default_admin, engine, init_db
+from app.models import CashSession, DailySummary, PaymentMethodEnum, Sale, StatusEnum
+from app.routers.sales import _excluir_venda, _gravar_cancelamento, _gravar_venda
+from app.sales_query import VALIDAS, aggregate, parse_filters
+from app.totals import aggregate_by_method, init_session_totals, rebuild_daily_summary
+
+DIA = date(2023, 6, 1)
+
+
+def _resumo(session: Session) -> dict[tuple[PaymentMethodEnum, int], tuple[int, int]]:
+    linhas = session.exec(select(DailySummary).where(DailySummary.data == DIA)).all()
+    return {(r.payment_method, r.operator_id): (r.sale_count, r.total_cents) for r in linhas if r.sale_count}
+
+
+def test_summary_written_on_close_and_follows_cancel_and_delete():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=DIA)
+        session.add(caixa)
+        session.flush()
+        assert caixa.id is not None
+        init_session_totals(session, caixa.id)
+        ids = []
+        for centavos, forma in ((1000, PaymentMethodEnum.PIX), (300, PaymentMethodEnum.PIX), (450, PaymentMethodEnum.DINHEIRO)):
+            venda = _gravar_venda(session, product_code="DS", amount_cents=centavos, payment_method=forma,
+                                  operator_id=1, cash_session_id=caixa.id)
+            session.flush()
+            ids.append(venda.id)
+        session.commit()
+        assert _resumo(session) == {}  # caixa aberto: ainda sem resumo
+
+        # Fechamento (mesmos passos de fechar_post)
+        caixa.status = StatusEnum.closed
+        session.add(caixa)
+        rebuild_daily_summary(session, DIA, DIA)
+        session.commit()
+        assert _resumo(session) == {(PaymentMethodEnum.PIX, 1): (2, 1300), (PaymentMethodEnum.DINHEIRO, 1): (1, 450)}
+
+        assert _gravar_cancelamento(session, ids[0], "teste", 1)
+        session.commit()
+        assert _excluir_venda(session, ids[2], 1)
+        session.commit()
+        assert _resumo(session) == {(PaymentMethodEnum.PIX, 1): (1, 300)}
+
+        # O relatório de período lê o resumo e bate com a soma das vendas
+        filtros = parse_filters(DIA.isoformat(), DIA.isoformat(), cancelamento=VALIDAS)
+        assert aggregate(session, filtros) == aggregate_by_method(session, Sale.cash_session_id == caixa.id)
+
+        # Reconstrução pela CLI chega ao mesmo resultado
+        esperado = _resumo(session)
+        rebuild_daily_summary(session)
+        session.commit()
+        assert _resumo(session) == esperado
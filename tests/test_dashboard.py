@@ -0,0 +1,64 @@
+import re
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, SaleCancellation, StatusEnum
+from app.report_cache import cache_stats, clear_cache
+from app.routers.dashboard import _indicadores
+
+HOJE = date(2024, 2, 10)
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def test_indicators_are_net_of_cancellations():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2024, 2, 3), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        vendas = [
+            Sale(product_code=codigo, amount_cents=valor, payment_method=forma, operator_id=1, cash_session_id=caixa.id)
+            for codigo, valor, forma in [
+                ("DASH1", 1000, PaymentMethodEnum.PIX),
+                ("DASH1", 1000, PaymentMethodEnum.PIX),
+                ("DASH2", 500, PaymentMethodEnum.DINHEIRO),
+                ("DASH3", 9900, PaymentMethodEnum.PIX),
+            ]
+        ]
+        session.add_all(vendas)
+        session.flush()
+        session.add(SaleCancellation(sale_id=vendas[3].id, reason="teste", canceled_by_id=1))
+        session.commit()
+
+        indicadores = _indicadores(session, HOJE)
+    assert indicadores["kpis"]["qtd_vendas"] == 3
+    assert indicadores["kpis"]["total_mes"] == 25.0
+    assert indicadores["vendas_por_forma"]["PIX"] == 20.0
+    assert [p["codigo"] for p in indicadores["top_produtos"]] == ["DASH1", "DASH2"]
+    assert indicadores["ranking_operadores"][0]["nome"] == "Administrador"
+    assert indicadores["ranking_operadores"][0]["total"] == 25.0
+
+
+def test_dashboard_is_served_from_memory_within_ttl():
+    init_db()
+    create_default_admin()
+    clear_cache()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    assert client.get("/dashboard/").status_code == 200
+    assert client.get("/dashboard/").status_code == 200
+    assert cache_stats()["misses"] == 1 and cache_stats()["hits"] == 1
+    # O painel executivo tem entradas próprias (indicadores e séries)
+    assert client.get("/dashboard/executivo").status_code == 200
+    assert cache_stats()["misses"] == 3 and cache_stats()["hits"] == 1
@@ -0,0 +1,162 @@
+import os
+import re
+import time
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import export_jobs
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum
+from app.routers.sales import _excluir_venda, _gravar_cancelamento
+from app.sales_query import parse_filters
+from app.totals import apply_sales, rebuild_daily_summary
+from app.utils import today_brt
+
+DIA = date(2023, 8, 14)
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _aguardar(job_id: str) -> dict:
+    for _ in range(100):
+        job = export_jobs.get_job(job_id)
+        assert job is not None
+        if job["status"] in ("pronto", "erro"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("exportação não terminou")
+
+
+def _dia_fechado() -> list[int]:
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=DIA, status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        vendas = [
+            Sale(product_code=f"JOB{i}", amount_cents=500, payment_method=PaymentMethodEnum.PIX,
+                 operator_id=1, cash_session_id=caixa.id)
+            for i in range(3)
+        ]
+        session.add_all(vendas)
+        rebuild_daily_summary(session, DIA, DIA)
+        session.commit()
+        return [v.id for v in vendas if v.id]
+
+
+def test_closed_period_export_is_reused_until_data_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    init_db()
+    create_default_admin()
+    ids = _dia_fechado()
+    filtros = parse_filters(DIA.isoformat())
+
+    job = _aguardar(export_jobs.submit_export("csv", filtros)["id"])
+    assert job["status"] == "pronto" and job["reutilizavel"] and job["total"] == 3
+    assert "JOB2" in export_jobs.artifact_path(job).read_text(encoding="utf-8")
+    assert export_jobs.submit_export("csv", filtros)["id"] == job["id"]
+
+    # Cancelamento em dia fechado muda o resumo diário e, com ele, o arquivo
+    with Session(engine) as session:
+        assert _gravar_cancelamento(session, ids[0], "teste", 1)
+        session.commit()
+    novo = _aguardar(export_jobs.submit_export("csv", filtros)["id"])
+    assert novo["id"] != job["id"]
+
+    # Excluir a venda já cancelada não mexe no resumo diário, mas muda o arquivo
+    with Session(engine) as session:
+        assert _excluir_venda(session, ids[0], 1)
+        session.commit()
+    sem_cancelada = _aguardar(export_jobs.submit_export("csv", filtros)["id"])
+    assert sem_cancelada["id"] != novo["id"]
+    assert "JOB0" not in export_jobs.artifact_path(sem_cancelada).read_text(encoding="utf-8")
+
+    # Período com caixa aberto nunca é reaproveitado
+    aberto = parse_filters(today_brt().isoformat())
+    assert not export_jobs.submit_export("pdf", aberto)["reutilizavel"]
+
+    assert export_jobs.cleanup_expired(agora=time.time() + 7 * 24 * 3600) > 0
+    assert export_jobs.get_job(job["id"]) is None
+
+
+def test_sale_in_open_session_keeps_closed_period_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    init_db()
+    create_default_admin()
+    _dia_fechado()
+    filtros = parse_filters(DIA.isoformat(), forma_pagamento="PIX")
+    job = _aguardar(export_jobs.submit_export("csv", filtros)["id"])
+
+    # Movimento do caixa aberto (outro dia) não muda o conteúdo do período fechado
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 8, 20), status=StatusEnum.open)
+        session.add(caixa)
+        session.flush()
+        venda = Sale(product_code="JOBX", amount_cents=700, payment_method=PaymentMethodEnum.PIX,
+                     operator_id=1, cash_session_id=caixa.id)
+        session.add(venda)
+        session.flush()
+        apply_sales(session, [venda])
+        session.commit()
+        caixa_id = caixa.id
+
+    mesmo = export_jobs.submit_export("csv", filtros)
+    assert mesmo["id"] == job["id"] and mesmo["status"] == "pronto"
+
+    # Não deixa caixa aberto para os demais testes
+    with Session(engine) as session:
+        caixa = session.get(CashSession, caixa_id)
+        caixa.status = StatusEnum.closed
+        session.commit()
+
+
+def test_abandoned_job_is_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    init_db()
+    create_default_admin()
+    _dia_fechado()
+    filtros = parse_filters(DIA.isoformat(), cancelamento="validas")
+    job = _aguardar(export_jobs.submit_export("parquet", filtros)["id"])
+
+    # Worker morreu no meio: o job ficou "gerando" e não é mais atualizado
+    job.update(status="gerando")
+    export_jobs._salvar(job)
+    export_jobs.artifact_path(job).unlink()
+    assert export_jobs.submit_export("parquet", filtros)["status"] == "gerando"
+    antigo = time.time() - (export_jobs.EXPORT_STALE_MINUTES + 1) * 60
+    os.utime(export_jobs._metadata_path(job["id"]), (antigo, antigo))
+
+    refeito = _aguardar(export_jobs.submit_export("parquet", filtros)["id"])
+    assert refeito["id"] == job["id"] and refeito["status"] == "pronto"
+    assert export_jobs.artifact_path(refeito).exists()
+
+
+def test_export_job_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    csrf = _csrf(client.get(f"/relatorios/avancado?data_inicio={DIA.isoformat()}").text)
+
+    r = client.post("/relatorios/exportacoes", data={"formato": "pdf", "data_inicio": DIA.isoformat(), "_csrf": csrf})
+    assert r.status_code == 200
+    m = re.search(r'id="exportacao-([0-9a-f]{32})"', r.text)
+    assert m
+    _aguardar(m.group(1))
+
+    r = client.get(f"/relatorios/exportacoes/{m.group(1)}")
+    assert "Baixar" in r.text
+    r = client.get(f"/relatorios/exportacoes/{m.group(1)}/arquivo")
+    assert r.status_code == 200 and r.content.startswith(b"%PDF")
+
+    assert client.get("/relatorios/exportacoes/../../etc/passwd").status_code == 404
+    r = client.post("/relatorios/exportacoes", data={"formato": "xls", "_csrf": csrf})
+    assert r.status_code == 400
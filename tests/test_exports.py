@@ -0,0 +1,117 @@
+import csv
+import gzip
+import io
+import re
+from datetime import date, datetime
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.db import create_default_admin, engine, init_db
+from app.exports import _pdf_rows, csv_chunks, file_chunks, gzip_chunks, pdf_file
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum
+from app.sales_query import parse_filters
+
+DIA = date(2023, 7, 3)
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _popular(qtd: int) -> None:
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=DIA, status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        session.add_all([
+            Sale(product_code=f"EX{i:04d}", amount_cents=199, payment_method=PaymentMethodEnum.DEBITO,
+                 operator_id=1, cash_session_id=caixa.id)
+            for i in range(qtd)
+        ])
+        session.commit()
+
+
+def test_csv_is_streamed_in_chunks():
+    init_db()
+    create_default_admin()
+    _popular(25)
+    blocos = list(csv_chunks(parse_filters(DIA.isoformat()), linhas_por_bloco=10))
+    assert len(blocos) == 3  # 10 + 10 + 5 (o cabeçalho vai no primeiro)
+    linhas = list(csv.reader(io.StringIO(b"".join(blocos).decode("utf-8"))))
+    assert linhas[0][0] == "ID" and len(linhas) == 26
+    assert linhas[1][2] == "EX0000" and linhas[1][3] == "1.99"
+
+    comprimido = b"".join(gzip_chunks(blocos))
+    assert gzip.decompress(comprimido) == b"".join(blocos)
+
+
+def test_csv_route_uses_gzip_when_accepted():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    url = f"/relatorios/exportar/csv?data_inicio={DIA.isoformat()}"
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert "EX0000" in r.text  # o cliente descomprime
+
+    r = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert "EX0000" in r.text
+
+
+def test_pdf_is_paged_with_daily_subtotals():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 7, 10), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        # 15h UTC = 12h em Brasília: 5 vendas no dia 10 e 3 no dia 11
+        for dia, qtd in ((10, 5), (11, 3)):
+            session.add_all([
+                Sale(product_code="PDF", amount_cents=1000, payment_method=PaymentMethodEnum.PIX, operator_id=1,
+                     cash_session_id=caixa.id, created_at=datetime(2023, 7, dia, 15, 0))
+                for _ in range(qtd)
+            ])
+        session.commit()
+
+    filtros = parse_filters("2023-07-10")
+    subtotais = [linha for linha, destaque in _pdf_rows(filtros) if destaque]
+    assert [(s[1], s[2], s[3]) for s in subtotais] == [
+        ("Subtotal 10/07/2023", "5 venda(s)", "R$ 50.00"),
+        ("Subtotal 11/07/2023", "3 venda(s)", "R$ 30.00"),
+    ]
+
+    # 10 linhas (8 vendas + 2 subtotais) em páginas de 4 linhas + a página de resumo
+    arquivo = pdf_file(filtros, linhas_por_pagina=4)
+    conteudo = b"".join(file_chunks(arquivo))
+    assert conteudo.startswith(b"%PDF")
+    assert len(re.findall(rb"/Type /Page\b", conteudo)) == 1 + 3
+    assert arquivo.closed
+
+
+def test_pdf_accepts_non_latin_product_codes():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 7, 20), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        session.add_all([
+            Sale(product_code=codigo, amount_cents=100, payment_method=PaymentMethodEnum.PIX, operator_id=1,
+                 cash_session_id=caixa.id, created_at=datetime(2023, 7, 20, 15, 0))
+            for codigo in ("αβγ ✓", "中文😀")
+        ])
+        session.commit()
+
+    conteudo = b"".join(file_chunks(pdf_file(parse_filters("2023-07-20"))))
+    assert conteudo.startswith(b"%PDF") and conteudo.rstrip().endswith(b"%%EOF")
+    assert len(re.findall(rb"/Type /Page\b", conteudo)) == 2
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import date
+
+import anyio.to_thread
+from sqlmodel import Session
+
+from app import live_totals
+from app.db import create_default_admin, engine, init_db
+from app.live_totals import render_events, subscribe, subscriber_count
+from app.models import CashSession, PaymentMethodEnum, StatusEnum
+from app.routers.sales import _gravar_venda
+from app.totals import init_session_totals, session_totals_cents
+
+
+def _caixa() -> int:
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 5, 2), status=StatusEnum.closed, opening_amount_cents=1000)
+        session.add(caixa)
+        session.flush()
+        assert caixa.id is not None
+        init_session_totals(session, caixa.id)
+        session.commit()
+        return caixa.id
+
+
+def _vender(caixa_id: int, valor: int, confirmar: bool = True) -> None:
+    with Session(engine) as session:
+        _gravar_venda(session, product_code="SSE", amount_cents=valor, payment_method=PaymentMethodEnum.DINHEIRO,
+                      operator_id=1, cash_session_id=caixa_id)
+        if confirmar:
+            session.commit()
+        else:
+            session.rollback()
+
+
+def test_committed_sales_are_pushed_to_all_subscribers():
+    init_db()
+    create_default_admin()
+    caixa_id = _caixa()
+    leituras = 0
+
+    async def carregar() -> dict[str, int]:
+        nonlocal leituras
+        leituras += 1
+        with Session(engine) as session:
+            return {**session_totals_cents(session, caixa_id), "troco": 1000}
+
+    async def cenario() -> tuple[str, str, str]:
+        primeiro, segundo = subscribe(caixa_id, carregar), subscribe(caixa_id, carregar)
+        inicial = await anext(primeiro)
+        await anext(segundo)
+        assert subscriber_count(caixa_id) == 2
+        await anyio.to_thread.run_sync(_vender, caixa_id, 999, False)  # desfeita: não publica
+        await anyio.to_thread.run_sync(_vender, caixa_id, 250)
+        atualizacoes = await asyncio.wait_for(asyncio.gather(anext(primeiro), anext(segundo)), 2)
+        await primeiro.aclose()
+        await segundo.aclose()
+        return inicial, *atualizacoes
+
+    inicial, primeiro, segundo = asyncio.run(cenario())
+    assert leituras == 1
+    assert "event: totais" in inicial and "R$ 0.00" in inicial
+    assert primeiro == segundo
+    assert "R$ 2.50" in primeiro  # dinheiro
+    assert "R$ 12.50" in primeiro  # gaveta: troco + dinheiro
+    assert subscriber_count() == 0
+
+
+def test_sale_committed_during_first_load_is_not_lost():
+    init_db()
+    create_default_admin()
+    caixa_id = _caixa()
+    leituras = 0
+
+    async def carregar() -> dict[str, int]:
+        nonlocal leituras
+        leituras += 1
+        with Session(engine) as session:
+            totais = {**session_totals_cents(session, caixa_id), "troco": 1000}
+        if leituras == 1:
+            # Venda confirmada depois da leitura, antes de a cópia existir
+            await anyio.to_thread.run_sync(_vender, caixa_id, 400)
+            await asyncio.sleep(0)  # entrega do after_commit ao loop
+        return totais
+
+    async def cenario() -> str:
+        assinante = subscribe(caixa_id, carregar)
+        inicial = await anext(assinante)
+        await assinante.aclose()
+        return inicial
+
+    inicial = asyncio.run(cenario())
+    assert leituras == 2
+    assert "R$ 4.00" in inicial
+    assert subscriber_count() == 0
+
+
+def test_first_subscriber_leaving_mid_load_does_not_break_the_others():
+    init_db()
+    create_default_admin()
+    caixa_id = _caixa()
+    leituras = 0
+
+    async def cenario() -> str:
+        liberar = asyncio.Event()
+
+        async def carregar() -> dict[str, int]:
+            nonlocal leituras
+            leituras += 1
+            await liberar.wait()
+            return {"dinheiro": 300, "pix": 0, "debito": 0, "credito": 0, "troco": 0}
+
+        primeiro, segundo = subscribe(caixa_id, carregar), subscribe(caixa_id, carregar)
+        desistente = asyncio.create_task(anext(primeiro))
+        await asyncio.sleep(0.01)
+        esperando = asyncio.create_task(anext(segundo))
+        await asyncio.sleep(0.01)
+        desistente.cancel()  # o navegador fechou a aba durante a leitura
+        await asyncio.gather(desistente, return_exceptions=True)
+        assert subscriber_count(caixa_id) == 1
+        liberar.set()
+        inicial = await asyncio.wait_for(esperando, 2)
+        await segundo.aclose()
+        return inicial
+
+    assert "R$ 3.00" in asyncio.run(cenario())
+    assert leituras == 1
+    assert subscriber_count() == 0
+
+
+def test_resync_runs_even_with_queue_traffic(monkeypatch):
+    monkeypatch.setattr(live_totals, "LIVE_RESYNC_SECONDS", 0.05)
+    monkeypatch.setattr(live_totals, "LIVE_KEEPALIVE_SECONDS", 60)
+    init_db()
+    create_default_admin()
+    caixa_id = _caixa()
+    no_banco = {"dinheiro": 0, "pix": 0, "debito": 0, "credito": 0, "troco": 0}
+
+    async def carregar() -> dict[str, int]:
+        return dict(no_banco)
+
+    async def cenario() -> str:
+        assinante = subscribe(caixa_id, carregar)
+        await anext(assinante)
+        no_banco["pix"] = 700  # venda gravada por outro worker: só a ressincronização a vê
+        mensagem = await asyncio.wait_for(anext(assinante), 2)
+        await assinante.aclose()
+        return mensagem
+
+    assert "R$ 7.00" in asyncio.run(cenario())
+    assert subscriber_count() == 0
+
+
+def test_event_data_lines_are_prefixed():
+    mensagem = render_events({"dinheiro": 100, "pix": 0, "debito": 0, "credito": 0, "troco": 0})
+    for bloco in mensagem.strip().split("\n\n"):
+        linhas = bloco.split("\n")
+        assert linhas[0].startswith("event: ")
+        assert all(linha.startswith("data: ") for linha in linhas[1:])
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+
+from app import models  # noqa: F401
+from app.migrations import LATEST_VERSION, current_version, pending_migrations, run_migrations
+
+
+def test_versioned_migrations_add_hot_path_indexes_to_existing_database(tmp_path):
+    antigo = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with antigo.begin() as conn:
+        # Tabela de vendas como era antes do versionamento: sem índices além do created_at
+        conn.execute(text(
+            "CREATE TABLE sale (id INTEGER PRIMARY KEY, product_code VARCHAR NOT NULL, amount_cents BIGINT NOT NULL, "
+            "payment_method VARCHAR(8) NOT NULL, created_at DATETIME NOT NULL, operator_id INTEGER NOT NULL, "
+            "cash_session_id INTEGER NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_sale_created_at ON sale (created_at)"))
+        conn.execute(text("INSERT INTO sale VALUES (1, 'A', 1029, 'PIX', '2024-01-02 10:00:00', 1, 1)"))
+
+    assert [v for v, _nome in pending_migrations(antigo)] == list(range(1, LATEST_VERSION + 1))
+    aplicadas = run_migrations(antigo, alvo=3)
+    assert len(aplicadas) == 3 and current_version(antigo) == 3
+    assert run_migrations(antigo, alvo=4) == ["0004_hot_path_composite_indexes"]
+    assert len(run_migrations(antigo)) == LATEST_VERSION - 4
+    assert run_migrations(antigo) == []
+
+    indices = {i["name"]: i["column_names"] for i in inspect(antigo).get_indexes("sale")}
+    assert indices["ix_sale_session_method"] == ["cash_session_id", "payment_method"]
+    assert indices["ix_sale_operator_created"] == ["operator_id", "created_at"]
+    assert "ix_sale_idempotency_key" in indices and "ix_sale_cash_session_id" in indices
+
+    with antigo.connect() as conn:
+        plano = " ".join(str(r[-1]) for r in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT count(*) FROM sale WHERE operator_id = 1 AND created_at >= '2024-01-01'"
+        )))
+        assert "ix_sale_operator_created" in plano
+        assert conn.execute(text("SELECT amount_cents FROM sale")).scalar() == 1029
+
+
+def test_fresh_database_is_created_at_latest_version(tmp_path):
+    novo = create_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+    SQLModel.metadata.create_all(novo)
+    run_migrations(novo)
+    assert current_version(novo) == LATEST_VERSION
+    assert pending_migrations(novo) == []
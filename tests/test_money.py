@@ -0,0 +1,105 @@
+import re
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlmodel import Session, SQLModel, select
+
+from app import models  # noqa: F401
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.migrations import run_migrations
+from app.models import CashSession, StatusEnum
+from app.utils import parse_cents, today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def test_parse_cents():
+    assert parse_cents("10,50") == 1050
+    assert parse_cents(0.1) == 10
+    assert parse_cents("0.285") == 29
+    assert parse_cents("abc") is None
+    assert parse_cents("nan") is None
+    assert parse_cents("1e20") is None
+    assert parse_cents("99999999999999999999") is None
+    assert parse_cents("10000000000,00") == 10**12
+
+
+def test_float_columns_migrated_to_cents(tmp_path):
+    antigo = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with antigo.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE cashsession (id INTEGER PRIMARY KEY, opened_by_id INTEGER NOT NULL, data DATE NOT NULL, "
+            "opening_amount FLOAT NOT NULL, opened_at DATETIME NOT NULL, closed_at DATETIME, status VARCHAR(6) NOT NULL, "
+            "reported_cash_drawer FLOAT, reported_pix_total FLOAT, reported_debit_total FLOAT, reported_credit_total FLOAT, "
+            "diff_cash FLOAT, diff_pix FLOAT, diff_debit FLOAT, diff_credit FLOAT, diff_overall FLOAT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE sale (id INTEGER PRIMARY KEY, product_code VARCHAR NOT NULL, amount FLOAT NOT NULL, "
+            "payment_method VARCHAR(8) NOT NULL, created_at DATETIME NOT NULL, operator_id INTEGER NOT NULL, "
+            "cash_session_id INTEGER NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO cashsession VALUES (1, 1, '2024-01-02', 100.1, '2024-01-02 10:00:00', NULL, 'closed', "
+            "150.3, NULL, NULL, NULL, -0.2, NULL, NULL, NULL, NULL)"
+        ))
+        conn.execute(text("INSERT INTO sale VALUES (1, 'A', 10.29, 'PIX', '2024-01-02 10:00:00', 1, 1)"))
+    SQLModel.metadata.create_all(antigo)
+    run_migrations(antigo)
+    run_migrations(antigo)  # idempotente
+
+    with antigo.connect() as conn:
+        assert conn.execute(text("SELECT amount_cents FROM sale")).scalar() == 1029
+        linha = conn.execute(text(
+            "SELECT opening_amount_cents, reported_cash_drawer_cents, reported_pix_total_cents, diff_cash_cents FROM cashsession"
+        )).one()
+        assert tuple(linha) == (10010, 15030, None, -20)
+
+
+def test_close_cash_differences_are_exact():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    csrf = _csrf(client.get("/caixa/abrir").text)
+    # Troco negativo, inválido ou fora da faixa: erro no formulário, nenhum caixa aberto
+    for troco in ("-5", "abc", "1e20"):
+        r = client.post("/caixa/abrir", data={"troco_inicial": troco, "data": today_brt().isoformat(), "_csrf": csrf})
+        assert r.status_code == 400 and "Troco inicial inválido" in r.text
+    client.post("/caixa/abrir", data={"troco_inicial": "100.10", "data": today_brt().isoformat(), "_csrf": csrf}, follow_redirects=False)
+    # Fora da faixa: mesmo erro de valor inválido, nada é gravado
+    r = client.post("/vendas/nova", data={"product_code": "X", "amount": "1e20", "payment_method": "DINHEIRO", "_csrf": csrf})
+    assert r.status_code == 400 and "Valor inválido" in r.text
+    r = client.post("/vendas/lote", headers={"X-CSRF-Token": csrf}, json={"vendas": [
+        {"idempotency_key": "fora-da-faixa", "product_code": "X", "amount": "99999999999999999999", "payment_method": "PIX"},
+    ]})
+    assert r.status_code == 200 and r.json()["resultados"][0]["status"] == "invalida"
+    for valor in ("0,10", "0,20"):
+        client.post("/vendas/nova", data={"product_code": "X", "amount": valor, "payment_method": "DINHEIRO", "_csrf": csrf},
+                    follow_redirects=False)
+
+    assert "R$ 100.10" in client.get("/caixa/status").text
+    r = client.get("/caixa/fechar")
+    assert "R$ 100.40" in r.text
+    for invalido in ({"gaveta": "-1"}, {"pix": "abc"}, {"credito": "1e20"}):
+        dados = {"gaveta": "100.40", "pix": "0", "debito": "0", "credito": "0", "_csrf": csrf, **invalido}
+        r = client.post("/caixa/fechar", data=dados, follow_redirects=False)
+        assert r.status_code == 400 and "Valores apurados inválidos" in r.text
+    with Session(engine) as session:
+        assert session.exec(select(CashSession).where(CashSession.status == StatusEnum.open)).first() is not None
+    r = client.post("/caixa/fechar", data={"gaveta": "100.40", "pix": "0", "debito": "0", "credito": "0", "_csrf": csrf},
+                    follow_redirects=False)
+    assert r.status_code == 302
+    assert "R$ 0.00" in client.get(r.headers["location"]).text
+
+    with Session(engine) as session:
+        caixa = session.exec(select(CashSession).where(CashSession.status == StatusEnum.closed)
+                             .order_by(CashSession.id.desc())).first()  # type: ignore[union-attr]
+        assert caixa is not None
+        assert caixa.diff_cash_cents == 0
+        assert caixa.diff_overall_cents == 0
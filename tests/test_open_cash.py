@@ -0,0 +1,42 @@
+from sqlmodel import Session, select
+
+from app import open_cash
+from app.db import engine, init_db
+from app.models import CashSession, StatusEnum
+from app.open_cash import get_open_cash_session, invalidate_open_cash_session
+from app.utils import today_brt
+from app.versions import bump_version
+
+
+def test_open_cash_resolver_caches_and_follows_version_counter():
+    init_db()
+    with Session(engine) as session:
+        for aberto in session.exec(select(CashSession).where(CashSession.status == StatusEnum.open)).all():
+            aberto.status = StatusEnum.closed
+            session.add(aberto)
+        caixa = CashSession(opened_by_id=1, data=today_brt(), opening_amount_cents=1000)
+        session.add(caixa)
+        invalidate_open_cash_session(session)
+        session.commit()
+        caixa_id = caixa.id
+
+    with Session(engine) as session:
+        assert get_open_cash_session(session).id == caixa_id  # type: ignore[union-attr]
+    assert open_cash._cache is not None and open_cash._cache.caixa is not None
+
+    # Leitura seguinte vem do cache, já anexada à nova sessão
+    with Session(engine) as session:
+        cached = get_open_cash_session(session)
+        assert cached is not None and cached.id == caixa_id and cached in session
+
+    # Outro processo fecha o caixa: só o contador compartilhado muda
+    with Session(engine) as session:
+        fechado = session.get(CashSession, caixa_id)
+        assert fechado is not None
+        fechado.status = StatusEnum.closed
+        session.add(fechado)
+        bump_version(session, open_cash.VERSION_KEY)
+        session.commit()
+
+    with Session(engine) as session:
+        assert get_open_cash_session(session) is None
@@ -0,0 +1,80 @@
+import re
+
+from fastapi.testclient import TestClient
+from passlib.hash import pbkdf2_sha256
+from sqlmodel import Session, select
+
+from app import rate_limit
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import RoleEnum, User
+from app.passwords import PASSWORD_HASH_ROUNDS
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m
+    return m.group(1)
+
+
+def test_login_rehashes_password_with_current_rounds():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        session.add(User(username="antigo", full_name="Hash Antigo", role=RoleEnum.operator,
+                         password_hash=pbkdf2_sha256.using(rounds=1000).hash("segredo")))
+        session.commit()
+
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    r = client.post("/entrar", data={"username": "antigo", "password": "segredo", "_csrf": csrf}, follow_redirects=False)
+    assert r.status_code == 302
+
+    with Session(engine) as session:
+        usuario = session.exec(select(User).where(User.username == "antigo")).one()
+        assert f"${PASSWORD_HASH_ROUNDS}$" in usuario.password_hash
+        assert pbkdf2_sha256.verify("segredo", usuario.password_hash)
+
+
+def test_login_attempts_are_throttled_per_username():
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    try:
+        status = [
+            client.post("/entrar", data={"username": "alvo", "password": "errada", "_csrf": csrf}).status_code
+            for _ in range(int(rate_limit.por_usuario.capacidade) + 1)
+        ]
+        assert status[:-1] == [400] * int(rate_limit.por_usuario.capacidade)
+        assert status[-1] == 429
+
+        # Login correto não consome fichas; outro usuário no mesmo IP continua podendo entrar
+        for _ in range(int(rate_limit.por_usuario.capacidade) + 1):
+            r = client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+            assert r.status_code == 302
+    finally:
+        rate_limit.reset_limits()
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: agora[0])
+    limiter = rate_limit.TokenBucketLimiter(capacidade=2, por_minuto=6)
+    assert limiter.take("k") == 0.0
+    assert limiter.take("k") == 0.0
+    assert limiter.take("k") == 10.0  # sem ficha: não toma
+    assert limiter.retry_after("k") == 10.0
+    agora[0] += 10
+    assert limiter.retry_after("k") == 0.0
+
+
+def test_concurrent_attempts_take_tokens_before_hashing():
+    capacidade = int(rate_limit.por_usuario.capacidade)
+    try:
+        # Tentativas ainda em andamento (nenhuma terminou o hash) já ocupam as fichas
+        esperas = [rate_limit.password_attempt("concorrente", "10.0.0.1") for _ in range(capacidade + 1)]
+        assert esperas[:-1] == [0.0] * capacidade and esperas[-1] > 0
+        # Uma delas acertou a senha: a ficha volta e libera outra tentativa
+        rate_limit.password_succeeded("concorrente", "10.0.0.1")
+        assert rate_limit.password_attempt("concorrente", "10.0.0.1") == 0.0
+    finally:
+        rate_limit.reset_limits()
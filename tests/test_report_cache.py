@@ -0,0 +1,94 @@
+import re
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import report_cache
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum
+from app.report_cache import cache_stats, cached, clear_cache
+from app.routers.sales import _gravar_cancelamento
+from app.sales_query import cached_aggregate, parse_filters
+from app.totals import apply_sales, rebuild_daily_summary
+
+DIA = date(2023, 7, 11)
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _venda(caixa_id: int, codigo: str) -> Sale:
+    return Sale(product_code=codigo, amount_cents=400, payment_method=PaymentMethodEnum.PIX,
+                operator_id=1, cash_session_id=caixa_id)
+
+
+def test_closed_period_survives_new_sales_until_closed_data_changes():
+    init_db()
+    create_default_admin()
+    clear_cache()
+    with Session(engine) as session:
+        fechado = CashSession(opened_by_id=1, data=DIA, status=StatusEnum.closed)
+        aberto = CashSession(opened_by_id=1, data=date(2023, 7, 12), status=StatusEnum.open)
+        session.add_all([fechado, aberto])
+        session.flush()
+        vendas = [_venda(fechado.id, "CACHE1"), _venda(fechado.id, "CACHE2")]
+        session.add_all(vendas)
+        rebuild_daily_summary(session, DIA, DIA)
+        session.commit()
+        aberto_id, cancelar = aberto.id, vendas[0].id
+
+    filtros = parse_filters(DIA.isoformat(), cancelamento="validas")
+    with Session(engine) as session:
+        assert cached_aggregate(session, filtros)[PaymentMethodEnum.PIX] == (2, 800)
+        assert cached_aggregate(session, filtros)[PaymentMethodEnum.PIX] == (2, 800)
+    assert cache_stats()["hits"] == 1
+
+    # Venda em caixa aberto não invalida um período só de caixas fechados
+    with Session(engine) as session:
+        nova = _venda(aberto_id, "CACHE3")
+        session.add(nova)
+        session.flush()
+        apply_sales(session, [nova])
+        session.commit()
+        cached_aggregate(session, filtros)
+    assert cache_stats()["hits"] == 2
+
+    # Cancelar venda de caixa fechado invalida
+    with Session(engine) as session:
+        assert _gravar_cancelamento(session, cancelar, "teste", 1)
+        session.commit()
+        assert cached_aggregate(session, filtros)[PaymentMethodEnum.PIX] == (1, 400)
+        # Não deixa caixa aberto para os demais testes
+        caixa = session.get(CashSession, aberto_id)
+        caixa.status = StatusEnum.closed
+        session.commit()
+    assert cache_stats()["misses"] == 2
+
+
+def test_lru_bound(monkeypatch):
+    init_db()
+    monkeypatch.setattr(report_cache, "REPORT_CACHE_SIZE", 2)
+    clear_cache()
+    with Session(engine) as session:
+        for i in range(3):
+            cached(session, "teste", i, True, lambda i=i: i)
+        assert cache_stats()["entradas"] == 2
+        cached(session, "teste", 0, True, lambda: "recalculado")
+    assert cache_stats() == {"hits": 0, "misses": 4, "entradas": 2, "capacidade": 2}
+
+
+def test_metrics_route_is_admin_only():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    assert client.get("/administracao/metricas", follow_redirects=False).status_code in (302, 303, 401, 403)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    r = client.get("/administracao/metricas")
+    assert r.status_code == 200
+    assert set(r.json()["cache_relatorios"]) == {"hits", "misses", "entradas", "capacidade"}
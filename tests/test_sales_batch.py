@@ -0,0 +1,104 @@
+import re
+
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import PaymentMethodEnum, Sale
+from app.open_cash import get_open_cash_session
+from app.routers import sales
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def test_batch_ingestion_is_idempotent():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    csrf = _csrf(client.get("/caixa/abrir").text)
+    client.post("/caixa/abrir", data={"troco_inicial": "0", "data": today_brt().isoformat(), "_csrf": csrf}, follow_redirects=False)
+
+    lote = {
+        "vendas": [
+            {"idempotency_key": "term1-0001", "product_code": "A", "amount": "12,30", "payment_method": "PIX"},
+            {"idempotency_key": "term1-0002", "product_code": "B", "amount": 5, "payment_method": "DINHEIRO"},
+            {"idempotency_key": "term1-0002", "product_code": "B", "amount": 5, "payment_method": "DINHEIRO"},
+            {"idempotency_key": "term1-0003", "product_code": "C", "amount": "-1", "payment_method": "PIX"},
+        ]
+    }
+    r = client.post("/vendas/lote", json=lote, headers={"X-CSRF-Token": csrf})
+    assert r.status_code == 200
+    corpo = r.json()
+    assert [item["status"] for item in corpo["resultados"]] == ["criada", "criada", "duplicada", "invalida"]
+    assert corpo["resultados"][2]["sale_id"] == corpo["resultados"][1]["sale_id"]
+
+    # Reenvio do mesmo lote não duplica
+    r = client.post("/vendas/lote", json=lote, headers={"X-CSRF-Token": csrf})
+    corpo = r.json()
+    assert corpo["criadas"] == 0
+    assert corpo["duplicadas"] == 3
+
+    # Sem token CSRF é recusado
+    r = client.post("/vendas/lote", json=lote)
+    assert r.status_code == 400
+
+
+def test_batch_conflict_on_retry_is_reported_per_item(monkeypatch):
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    csrf = _csrf(client.get("/caixa/abrir").text)
+    client.post("/caixa/abrir", data={"troco_inicial": "0", "data": today_brt().isoformat(), "_csrf": csrf}, follow_redirects=False)
+    with Session(engine) as session:
+        caixa = get_open_cash_session(session)
+        assert caixa is not None and caixa.id is not None
+        caixa_id = caixa.id
+
+    # Gravação isolada: a chave gravada por outro reenvio vira "duplicada", a outra venda entra
+    with Session(engine) as session:
+        session.add(Sale(product_code="R", amount_cents=100, payment_method=PaymentMethodEnum.PIX, operator_id=1,
+                         cash_session_id=caixa_id, idempotency_key="corrida-1"))
+        session.commit()
+    novas = {
+        chave: Sale(product_code="R", amount_cents=100, payment_method=PaymentMethodEnum.PIX, operator_id=1,
+                    cash_session_id=caixa_id, idempotency_key=chave)
+        for chave in ("corrida-1", "corrida-2")
+    }
+    resultados: list[dict[str, object]] = [{"idempotency_key": chave, "status": "criada"} for chave in novas]
+    existentes: dict[str, int | None] = {}
+    with Session(engine) as session:
+        sales._gravar_um_a_um(session, novas, existentes, resultados)
+        session.commit()
+    assert [r["status"] for r in resultados] == ["duplicada", "criada"]
+    assert list(novas) == ["corrida-2"] and existentes["corrida-1"]
+
+    # Conflito no commit do lote: a nova tentativa grava item a item em vez de devolver 500
+    original = sales._ingerir_lote
+    chamadas: list[bool] = []
+
+    def conflito_na_primeira(session, caixa_id, operador_id, itens, por_item=False):
+        chamadas.append(por_item)
+        if not por_item:
+            raise IntegrityError("INSERT", {}, Exception("chave duplicada"))
+        return original(session, caixa_id, operador_id, itens, por_item)
+
+    monkeypatch.setattr(sales, "_ingerir_lote", conflito_na_primeira)
+    lote = {"vendas": [
+        {"idempotency_key": "corrida-2", "product_code": "R", "amount": "1", "payment_method": "PIX"},
+        {"idempotency_key": "corrida-3", "product_code": "R", "amount": "1", "payment_method": "PIX"},
+    ]}
+    r = client.post("/vendas/lote", json=lote, headers={"X-CSRF-Token": csrf})
+    assert r.status_code == 200
+    assert chamadas == [False, True]
+    assert [item["status"] for item in r.json()["resultados"]] == ["duplicada", "criada"]
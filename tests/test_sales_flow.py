@@ -6,7 +6,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 # Ensure test DB
-os.environ["DATABASE_URL"] = "sqlite:///./pdv_test.db"
+os.environ.setdefault("DATABASE_URL", "sqlite:///./pdv_test.db")
 
 from app.db import create_default_admin, init_db  # noqa: E402
 from app.main import app  # noqa: E402
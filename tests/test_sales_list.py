@@ -0,0 +1,64 @@
+import re
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, StatusEnum
+from app.routers.sales import PAGINA_VENDAS
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _login_com_caixa() -> TestClient:
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    csrf = _csrf(client.get("/caixa/abrir").text)
+    client.post("/caixa/abrir", data={"troco_inicial": "0", "data": today_brt().isoformat(), "_csrf": csrf}, follow_redirects=False)
+    return client
+
+
+def test_htmx_sale_returns_only_new_row():
+    client = _login_com_caixa()
+    csrf = _csrf(client.get("/vendas/nova").text)
+    r = client.post(
+        "/vendas/nova",
+        data={"product_code": "DELTA01", "amount": "3,00", "payment_method": "PIX", "_csrf": csrf},
+        headers={"HX-Request": "true"},
+    )
+    assert r.status_code == 200
+    assert 'hx-swap-oob="afterbegin:#vendas-dia-tbody"' in r.text
+    assert "<table" not in r.text  # nada sobra para o alvo #totais
+    assert r.text.count("<tr") == 1
+    assert "DELTA01" in r.text
+
+
+def test_day_list_is_paginated():
+    client = _login_com_caixa()
+    with Session(engine) as session:
+        caixa = session.exec(select(CashSession).where(CashSession.status == StatusEnum.open)).first()
+        assert caixa is not None and caixa.id is not None
+        for i in range(PAGINA_VENDAS + 5):
+            session.add(Sale(product_code=f"PAG{i:03d}", amount_cents=100, payment_method=PaymentMethodEnum.DINHEIRO,
+                             operator_id=1, cash_session_id=caixa.id))
+        session.commit()
+
+    r = client.get("/vendas/nova")
+    assert r.status_code == 200
+    assert "PAG054" in r.text  # mais recente primeiro
+    m = re.search(r'/vendas/lista\?antes_de=(\d+)', r.text)
+    assert m, "link de próxima página ausente"
+
+    r = client.get(f"/vendas/lista?antes_de={m.group(1)}")
+    assert r.status_code == 200
+    assert "PAG000" in r.text
+    assert "PAG054" not in r.text
@@ -0,0 +1,168 @@
+import re
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import export_jobs
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, PaymentMethodEnum, Sale, SaleCancellation, StatusEnum
+from app.sales_query import (
+    CANCELADAS,
+    PAGINA_RELATORIO,
+    TODAS,
+    VALIDAS,
+    aggregate,
+    parse_filters,
+    sales_query,
+)
+from app.totals import rebuild_daily_summary
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _popular(session: Session) -> None:
+    """Dois dias de 2023: um caixa fechado e um aberto, com uma venda cancelada."""
+    fechado = CashSession(opened_by_id=1, data=date(2023, 3, 10), status=StatusEnum.closed)
+    aberto = CashSession(opened_by_id=1, data=date(2023, 3, 11))
+    session.add(fechado)
+    session.add(aberto)
+    session.flush()
+    vendas = [
+        Sale(product_code="Q1", amount_cents=1000, payment_method=PaymentMethodEnum.PIX, operator_id=1, cash_session_id=fechado.id),
+        Sale(product_code="Q2", amount_cents=250, payment_method=PaymentMethodEnum.DINHEIRO, operator_id=1, cash_session_id=fechado.id),
+        Sale(product_code="Q3", amount_cents=700, payment_method=PaymentMethodEnum.PIX, operator_id=1, cash_session_id=aberto.id),
+    ]
+    session.add_all(vendas)
+    session.flush()
+    session.add(SaleCancellation(sale_id=vendas[1].id, reason="teste", canceled_by_id=1))
+    rebuild_daily_summary(session, fechado.data, fechado.data)  # como no fechamento
+    session.commit()
+
+
+def test_filters_compile_to_sql():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        _popular(session)
+
+        def codigos(**kwargs) -> list[str]:
+            filtros = parse_filters("2023-03-10", "2023-03-11", **kwargs)
+            return [v.product_code for v in session.exec(sales_query(filtros)).all()]
+
+        assert codigos() == ["Q1", "Q2", "Q3"]
+        assert codigos(cancelamento=VALIDAS) == ["Q1", "Q3"]
+        assert codigos(cancelamento=CANCELADAS) == ["Q2"]
+        assert codigos(forma_pagamento="PIX") == ["Q1", "Q3"]
+        assert codigos(status_caixa="open") == ["Q3"]
+        assert codigos(operador_id="999") == []
+        assert [v.product_code for v in session.exec(sales_query(parse_filters("2023-03-11"))).all()] == ["Q3"]
+
+        agregados = aggregate(session, parse_filters("2023-03-10", "2023-03-11", cancelamento=VALIDAS))
+        assert agregados == {PaymentMethodEnum.PIX: (2, 1700)}
+
+
+def test_parse_filters_ignores_invalid_values():
+    filtros = parse_filters("xx", None, "abc", "BITCOIN", "talvez", "??")
+    assert filtros.inicio == filtros.fim == today_brt()  # dia local, não o do servidor (UTC)
+    assert filtros.operador_id is None
+    assert parse_filters(operador_id="").operador_id is None and parse_filters(operador_id="7").operador_id == 7
+    assert filtros.forma is None and filtros.status_caixa is None
+    assert filtros.cancelamento == TODAS
+
+
+def test_advanced_report_and_exports_share_filters():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 4, 2), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        session.add(Sale(product_code="ADV1", amount_cents=1234, payment_method=PaymentMethodEnum.CREDITO,
+                         operator_id=1, cash_session_id=caixa.id))
+        session.add(Sale(product_code="ADV2", amount_cents=500, payment_method=PaymentMethodEnum.DEBITO,
+                         operator_id=1, cash_session_id=caixa.id))
+        session.commit()
+
+    params = "data_inicio=2023-04-02&data_fim=2023-04-02&forma_pagamento=CREDITO"
+    r = client.get(f"/relatorios/avancado?{params}")
+    assert r.status_code == 200
+    assert "ADV1" in r.text and "ADV2" not in r.text
+    assert "R$ 12.34" in r.text
+
+    r = client.get(f"/relatorios/exportar/csv?{params}")
+    assert r.status_code == 200
+    assert "ADV1" in r.text and "ADV2" not in r.text
+
+    r = client.get(f"/relatorios/exportar/pdf?{params}")
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF")
+
+
+def test_advanced_report_accepts_blank_selects(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    # Formulário enviado com "Todos" em todos os selects
+    vazios = {"operador_id": "", "forma_pagamento": "", "status_caixa": "", "cancelamento": ""}
+    params = urlencode({"data_inicio": "2023-04-02", "data_fim": "2023-04-02", **vazios})
+    r = client.get(f"/relatorios/avancado?{params}")
+    assert r.status_code == 200
+    csrf = _csrf(r.text)
+    for url in ("/relatorios/avancado/vendas", "/relatorios/exportar/csv", "/relatorios/exportar/pdf",
+                "/relatorios/exportar/parquet"):
+        assert client.get(f"{url}?{params}").status_code == 200, url
+
+    r = client.post("/relatorios/exportacoes",
+                    data={"formato": "csv", "data_inicio": "2023-04-02", "_csrf": csrf, **vazios})
+    assert r.status_code == 200
+
+
+def test_report_list_is_keyset_paginated_with_exact_totals():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+
+    total = PAGINA_RELATORIO + 5
+    instante = datetime(2023, 5, 6, 15, 0)
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2023, 5, 6), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        # Mesmo created_at para todas: o desempate pelo id não pode repetir nem pular vendas
+        session.add_all([
+            Sale(product_code=f"KS{i:03d}", amount_cents=100, payment_method=PaymentMethodEnum.PIX,
+                 operator_id=1, cash_session_id=caixa.id, created_at=instante)
+            for i in range(total)
+        ])
+        rebuild_daily_summary(session, caixa.data, caixa.data)
+        session.commit()
+
+    r = client.get("/relatorios?data_inicio=2023-05-06&data_fim=2023-05-06")
+    assert r.status_code == 200
+    assert r.text.count("KS") == PAGINA_RELATORIO
+    assert f"R$ {total:.2f}" in r.text and f">{total}<" in r.text  # KPIs do período inteiro
+    m = re.search(r'hx-get="(/relatorios/vendas\?[^"]+)"', r.text)
+    assert m, "link de próxima página ausente"
+
+    r = client.get(m.group(1).replace("&amp;", "&"))
+    assert r.status_code == 200
+    assert re.findall(r"KS\d+", r.text) == [f"KS{i:03d}" for i in range(PAGINA_RELATORIO, total)]
+    assert "relatorio-mais" not in r.text
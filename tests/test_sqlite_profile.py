@@ -0,0 +1,26 @@
+import anyio
+import pytest
+from sqlalchemy import text
+
+from app.db import IS_SQLITE, async_engine, engine
+from app.sqlite_profile import active_settings, optimize
+
+
+@pytest.mark.skipif(not IS_SQLITE, reason="perfil aplicado apenas ao SQLite")
+def test_pragmas_applied_on_every_connection():
+    ativos = active_settings(engine)
+    assert str(ativos["journal_mode"]).lower() == "wal"
+    assert ativos["busy_timeout"] == 5000
+    assert ativos["synchronous"] == 1  # NORMAL
+    assert ativos["cache_size"] == -20000
+    assert ativos["temp_store"] == 2  # MEMORY
+    optimize(engine)
+
+    async def ler_async() -> tuple[int, int]:
+        async with async_engine.connect() as conn:
+            timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+            temp_store = (await conn.execute(text("PRAGMA temp_store"))).scalar()
+        await async_engine.dispose()
+        return timeout, temp_store
+
+    assert anyio.run(ler_async) == (5000, 2)
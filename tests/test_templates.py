@@ -0,0 +1,44 @@
+import re
+
+from fastapi.testclient import TestClient
+
+from app import templating
+from app.db import create_default_admin, init_db
+from app.main import app
+from app.templating import TEMPLATES_DIR, precompile_templates
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m
+    return m.group(1)
+
+
+def test_all_templates_precompile():
+    assert precompile_templates() == len(list(TEMPLATES_DIR.rglob("*.html")))
+
+
+def test_pages_render_with_global_helpers_and_closed_receipt_is_cached():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    for url in ("/dashboard/", "/auditoria/", "/administracao/usuarios", "/caixa/status", "/relatorios/"):
+        assert client.get(url).status_code == 200, url
+
+    csrf = _csrf(client.get("/caixa/abrir").text)
+    client.post("/caixa/abrir", data={"troco_inicial": "10", "data": today_brt().isoformat(), "_csrf": csrf}, follow_redirects=False)
+    client.post("/vendas/nova", data={"product_code": "T", "amount": "5", "payment_method": "PIX", "_csrf": csrf},
+                follow_redirects=False)
+    r = client.post("/caixa/fechar", data={"gaveta": "10", "pix": "5", "debito": "0", "credito": "0", "_csrf": csrf},
+                    follow_redirects=False)
+    recibo = r.headers["location"]
+
+    templating._fragmentos.clear()
+    primeira = client.get(recibo).text
+    assert "COMPROVANTE DE FECHAMENTO" in primeira and "PIX: R$ 5.00" in primeira
+    assert len(templating._fragmentos) == 1
+    assert client.get(recibo).text == primeira
+    assert len(templating._fragmentos) == 1
@@ -0,0 +1,96 @@
+import re
+from datetime import date, datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import CashSession, HourlySales, PaymentMethodEnum, StatusEnum
+from app.routers.sales import _excluir_venda, _gravar_cancelamento, _gravar_venda
+from app.timeseries import comparisons, heatmap, hourly_rows, trailing_averages
+from app.totals import rebuild_hourly_sales
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m, "CSRF não encontrado no HTML"
+    return m.group(1)
+
+
+def _vender(session: Session, caixa_id: int, quando_utc: datetime, valor: int) -> int:
+    venda = _gravar_venda(session, product_code="SERIE", amount_cents=valor, payment_method=PaymentMethodEnum.PIX,
+                          operator_id=1, cash_session_id=caixa_id, created_at=quando_utc)
+    session.flush()
+    assert venda.id is not None
+    return venda.id
+
+
+def test_hourly_buckets_are_maintained_incrementally():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        caixa = CashSession(opened_by_id=1, data=date(2022, 3, 7), status=StatusEnum.closed)
+        session.add(caixa)
+        session.flush()
+        assert caixa.id is not None
+        # 13:10 e 13:50 UTC caem às 10h em São Paulo; 02:30 UTC do dia 8 ainda é dia 7 às 23h
+        ids = [
+            _vender(session, caixa.id, datetime(2022, 3, 7, 13, 10, tzinfo=timezone.utc), 1000),
+            _vender(session, caixa.id, datetime(2022, 3, 7, 13, 50, tzinfo=timezone.utc), 500),
+            _vender(session, caixa.id, datetime(2022, 3, 8, 2, 30, tzinfo=timezone.utc), 300),
+        ]
+        session.commit()
+        assert _gravar_cancelamento(session, ids[1], "teste", 1)
+        assert _excluir_venda(session, ids[2], 1)
+        session.commit()
+
+        dia = (datetime(2022, 3, 7), datetime(2022, 3, 8))
+        incrementais = hourly_rows(session, *dia)
+        assert incrementais[0] == (datetime(2022, 3, 7, 10), 1, 1000)
+        assert sum(total for _hora, _qtd, total in incrementais) == 1000
+
+        rebuild_hourly_sales(session, date(2022, 3, 7), date(2022, 3, 7))
+        session.commit()
+        assert hourly_rows(session, *dia) == [linha for linha in incrementais if linha[1]]
+        assert session.get(HourlySales, datetime(2022, 3, 7, 10)) is not None
+
+
+def test_period_comparisons_heatmap_and_trailing_averages():
+    init_db()
+    create_default_admin()
+    with Session(engine) as session:
+        for hora, valor in [
+            (datetime(2021, 6, 14, 9), 2000),   # segunda anterior
+            (datetime(2021, 6, 21, 9), 3000),   # segunda (semana corrente)
+            (datetime(2021, 6, 22, 9), 1000),   # terça
+            (datetime(2021, 6, 22, 15), 4000),  # terça, depois do "agora"
+        ]:
+            session.add(HourlySales(hora=hora, sale_count=1, total_cents=valor))
+        session.commit()
+
+        agora = datetime(2021, 6, 22, 10, 30)
+        por_periodo = {c["periodo"]: c for c in comparisons(session, agora)}
+        assert por_periodo["dia"]["total_cents"] == 1000
+        assert por_periodo["dia"]["total_anterior_cents"] == 3000
+        assert por_periodo["dia"]["variacao"] == -66.7
+        assert por_periodo["semana"]["total_cents"] == 4000
+        assert por_periodo["semana"]["total_anterior_cents"] == 2000
+
+        matriz = heatmap(session, date(2021, 6, 22), semanas=2)
+        assert matriz[0][9] == 5000 and matriz[1][15] == 4000
+
+        medias = trailing_averages(session, date(2021, 6, 22), dias=2, janelas=(7,))
+        assert [m["total_cents"] for m in medias] == [3000, 5000]
+        assert medias[-1]["media_7"] == 8000 // 7
+
+
+def test_executive_dashboard_route():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    r = client.get("/dashboard/executivo")
+    assert r.status_code == 200
+    assert "Mês × anterior" in r.text and "Média 28 dias" in r.text
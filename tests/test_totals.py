@@ -0,0 +1,71 @@
+from datetime import date
+
+from sqlmodel import Session
+
+from app.db import engine, init_db
+from app.models import CashSession, CashSessionTotal, PaymentMethodEnum, Sale, SaleCancellation
+from app.totals import (
+    apply_sale,
+    cancelled_ids,
+    init_session_totals,
+    session_totals,
+)
+
+
+def _novo_caixa(session: Session, com_totais: bool = True) -> int:
+    caixa = CashSession(opened_by_id=1, data=date(2024, 1, 2), opening_amount_cents=5000)
+    session.add(caixa)
+    session.flush()
+    assert caixa.id is not None
+    if com_totais:
+        init_session_totals(session, caixa.id)
+    session.commit()
+    return caixa.id
+
+
+def _venda(caixa_id: int, centavos: int, forma: PaymentMethodEnum) -> Sale:
+    return Sale(product_code="P", amount_cents=centavos, payment_method=forma, operator_id=1, cash_session_id=caixa_id)
+
+
+def test_running_totals_follow_sale_cancel_and_delete():
+    init_db()
+    with Session(engine) as session:
+        caixa_id = _novo_caixa(session)
+        vendas = [
+            _venda(caixa_id, 1050, PaymentMethodEnum.DINHEIRO),
+            _venda(caixa_id, 2000, PaymentMethodEnum.PIX),
+            _venda(caixa_id, 525, PaymentMethodEnum.DINHEIRO),
+        ]
+        for v in vendas:
+            session.add(v)
+            apply_sale(session, v)
+            session.commit()
+        assert session_totals(session, caixa_id) == {"dinheiro": 15.75, "pix": 20.0, "debito": 0.0, "credito": 0.0}
+
+        # Cancelamento
+        assert vendas[1].id is not None
+        session.add(SaleCancellation(sale_id=vendas[1].id, reason="teste", canceled_by_id=1))
+        apply_sale(session, vendas[1], sinal=-1)
+        session.commit()
+        assert session_totals(session, caixa_id)["pix"] == 0.0
+        assert cancelled_ids(session, vendas) == {vendas[1].id}
+
+        # Exclusão
+        excluida = session.get(Sale, vendas[2].id)
+        assert excluida is not None
+        session.delete(excluida)
+        apply_sale(session, excluida, sinal=-1)
+        session.commit()
+        assert session_totals(session, caixa_id)["dinheiro"] == 10.5
+        linha = session.get(CashSessionTotal, (caixa_id, PaymentMethodEnum.DINHEIRO))
+        assert linha is not None and linha.sale_count == 1
+
+
+def test_running_totals_rebuilt_for_legacy_session():
+    init_db()
+    with Session(engine) as session:
+        caixa_id = _novo_caixa(session, com_totais=False)
+        session.add(_venda(caixa_id, 700, PaymentMethodEnum.CREDITO))
+        session.add(_venda(caixa_id, 300, PaymentMethodEnum.DEBITO))
+        session.commit()
+        assert session_totals(session, caixa_id) == {"dinheiro": 0.0, "pix": 0.0, "debito": 3.0, "credito": 7.0}
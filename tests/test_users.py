@@ -0,0 +1,65 @@
+import re
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import users
+from app.db import async_engine, create_default_admin, engine, init_db
+from app.main import app
+from app.models import RoleEnum, User
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m
+    return m.group(1)
+
+
+def test_authenticated_requests_reuse_cached_identity():
+    init_db()
+    create_default_admin()
+    client = TestClient(app)
+    csrf = _csrf(client.get("/entrar").text)
+    client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": csrf}, follow_redirects=False)
+    users.invalidate_user()
+    client.get("/caixa/abrir")  # carrega o usuário no cache
+
+    consultas: list[str] = []
+
+    def contar(_conn, _cursor, statement, *_args):
+        consultas.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", contar)
+    try:
+        assert client.get("/caixa/abrir").status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", contar)
+    assert not [c for c in consultas if 'FROM "user"' in c or "FROM user" in c]
+
+
+def test_user_names_resolves_page_in_one_query():
+    init_db()
+    with Session(engine) as session:
+        novos = [User(username=f"nome{i}", full_name=f"Nome {i}", password_hash="x", role=RoleEnum.operator)
+                 for i in range(3)]
+        session.add_all(novos)
+        session.commit()
+        ids = [u.id for u in novos]
+    users.invalidate_user()
+
+    consultas: list[str] = []
+
+    def contar(_conn, _cursor, statement, *_args):
+        consultas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        with Session(engine) as session:
+            assert users.user_names(session, [*ids, ids[0], None]) == {i: f"Nome {n}" for n, i in enumerate(ids)}
+            assert len(consultas) == 1
+            # Segunda resolução vem do cache
+            users.user_names(session, ids)
+            assert len(consultas) == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
@@ -0,0 +1,86 @@
+import re
+
+import anyio
+import httpx
+from sqlmodel import Session, func, select
+
+from app import write_queue
+from app.db import create_default_admin, engine, init_db
+from app.main import app
+from app.models import Sale
+from app.utils import today_brt
+
+
+def _csrf(html: str) -> str:
+    m = re.search(r'name="_csrf"\s+value="([^"]+)"', html)
+    assert m
+    return m.group(1)
+
+
+def test_group_commit_batches_concurrent_sales():
+    init_db()
+    create_default_admin()
+
+    async def main() -> None:
+        writer = write_queue.start_group_commit(engine)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.get("/entrar")
+                await client.post("/entrar", data={"username": "admin", "password": "admin123", "_csrf": _csrf(r.text)})
+                r = await client.get("/caixa/abrir")
+                await client.post("/caixa/abrir", data={"troco_inicial": "0", "data": today_brt().isoformat(), "_csrf": _csrf(r.text)})
+                csrf = _csrf((await client.get("/vendas/nova")).text)
+
+                async def venda(i: int) -> None:
+                    resp = await client.post(
+                        "/vendas/nova",
+                        data={"product_code": f"GC{i}", "amount": "2,00", "payment_method": "DEBITO", "_csrf": csrf},
+                        headers={"HX-Request": "true"},
+                    )
+                    assert resp.status_code == 200
+                    # Resposta só chega depois do commit: a venda já está visível em outra conexão
+                    assert re.search(r"/vendas/recibo/\d+", resp.text)
+
+                async with anyio.create_task_group() as tg:
+                    for i in range(20):
+                        tg.start_soon(venda, i)
+
+                await client.get("/caixa/fechar")
+                await client.post("/caixa/fechar", data={"gaveta": "0", "pix": "0", "debito": "40", "credito": "0", "_csrf": csrf})
+        finally:
+            await write_queue.stop_group_commit()
+        assert writer.escritas == 20
+        assert writer.lotes < 20
+
+    anyio.run(main)
+    with Session(engine) as session:
+        assert session.exec(select(func.count(Sale.id)).where(Sale.product_code.like("GC%"))).one() == 20  # type: ignore[attr-defined]
+
+
+def test_failed_write_is_isolated_from_its_batch():
+    def ok(session: Session) -> str:
+        return "ok"
+
+    def falha(session: Session) -> str:
+        raise ValueError("erro")
+
+    async def main() -> None:
+        writer = write_queue.GroupCommitWriter(engine, janela_ms=50)
+        writer.start()
+        resultados = []
+
+        async def enviar(op) -> None:
+            try:
+                resultados.append(await writer.submit(op))
+            except ValueError:
+                resultados.append("falhou")
+
+        async with anyio.create_task_group() as tg:
+            for op in (ok, falha, ok):
+                tg.start_soon(enviar, op)
+        await writer.stop()
+        assert sorted(resultados) == ["falhou", "ok", "ok"]
+
+    anyio.run(main)
+    assert write_queue.group_commit_stats() == {"ativo": False}
@@ -4,7 +4,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from sqlmodel import Session, select
 from app.db import engine
-from app.models import Sale, SaleCancellation
+from app.models import CashSessionTotal, DailySummary, HourlySales, Sale, SaleCancellation
 
 if __name__ == "__main__":
     with Session(engine) as session:
@@ -18,4 +18,12 @@ if __name__ == "__main__":
         for v in vendas:
             session.delete(v)
         session.commit()
+        # Totais acumulados são recalculados sob demanda a partir das vendas restantes
+        for total in session.exec(select(CashSessionTotal)).all():
+            session.delete(total)
+        for resumo in session.exec(select(DailySummary)).all():
+            session.delete(resumo)
+        for hora in session.exec(select(HourlySales)).all():
+            session.delete(hora)
+        session.commit()
         print(f"Removidas {len(cancels)} cancelamentos e {len(vendas)} vendas.")
@@ -0,0 +1,38 @@
+"""Migrações de esquema.
+
+Uso:
+    python tools/migrate.py status
+    python tools/migrate.py upgrade [--to VERSAO]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import models  # noqa: E402,F401
+from app.db import engine  # noqa: E402
+from app.migrations import (  # noqa: E402
+    LATEST_VERSION,
+    current_version,
+    pending_migrations,
+    run_migrations,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrações de esquema do PDV")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("status", help="mostra a versão atual e as migrações pendentes")
+    upgrade = sub.add_parser("upgrade", help="aplica as migrações pendentes")
+    upgrade.add_argument("--to", type=int, default=None, help="para na versão informada")
+    args = parser.parse_args()
+
+    if args.comando == "status":
+        print(f"Versão do esquema: {current_version(engine)} (mais recente: {LATEST_VERSION})")
+        for versao, nome in pending_migrations(engine):
+            print(f"  pendente: {versao:04d}_{nome}")
+    else:
+        aplicadas = run_migrations(engine, alvo=args.to)
+        for nome in aplicadas:
+            print(f"  aplicada: {nome}")
+        print(f"Versão do esquema: {current_version(engine)}")
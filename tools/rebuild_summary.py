@@ -0,0 +1,28 @@
+"""Recalcula o resumo diário (DailySummary, caixas fechados) e as vendas por hora (HourlySales).
+
+Uso:
+    python tools/rebuild_summary.py [--de AAAA-MM-DD] [--ate AAAA-MM-DD]
+"""
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlmodel import Session  # noqa: E402
+
+from app.db import engine  # noqa: E402
+from app.totals import rebuild_daily_summary, rebuild_hourly_sales  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula os resumos de vendas do PDV")
+    parser.add_argument("--de", type=date.fromisoformat, default=None, help="primeira data (padrão: todo o histórico)")
+    parser.add_argument("--ate", type=date.fromisoformat, default=None, help="última data")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        linhas = rebuild_daily_summary(session, args.de, args.ate)
+        horas = rebuild_hourly_sales(session, args.de, args.ate)
+        session.commit()
+    print(f"Resumo diário recalculado: {linhas} linhas; vendas por hora: {horas} horas.")